@@ -2,14 +2,184 @@
 # !/usr/bin/env python3
 
 """
+peak (turning point) detection
 
+a peak is where the first difference changes its sign, zero differences (plateau) are skipped,
+the peak of a plateau is its first item, the first and the last items aren't peaks
+(as before, the first item is only the base of the first relative distance).
+numeric sequences go through NumPy, PeakStream feeds unbounded streams chunk by chunk
 """
 
+import heapq
 from collections import namedtuple
+from itertools import count as _count
 
 from .var import isiterable, get_typename_str
 
-__all__ = ['Peak']
+__all__ = ['Peak',
+           'PeakStream',
+           'PeakElem']
+
+PeakElem = namedtuple('peak_elem', ['index', 'value', 'relative_distance'])
+
+
+def _get_numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np
+
+
+def _as_numeric_array(iterable):
+    """:return: 1-D NumPy array, None if NumPy is missing or the data isn't numeric"""
+    np = _get_numpy()
+    if np is None or not isinstance(iterable, (np.ndarray, list, tuple, range)):
+        return None
+
+    array = np.asarray(iterable)
+    if array.ndim != 1 or array.dtype.kind not in 'biuf':
+        return None
+    if array.dtype.kind in 'bu':  # differences of unsigned ints wrap around
+        array = array.astype(np.int64)
+
+    return array
+
+
+class _PeakScanner:
+    """
+    incremental peak finder, the state between chunks is a few scalars
+
+    both scan methods return (indexes, values, relative_distances, is_highs) of the new peaks,
+    as NumPy arrays for scan_array, as lists for scan_iterable
+    """
+
+    def __init__(self):
+        self.n = 0  # items seen
+        self.first = None
+        self.last = None
+        self.last_sign = None  # sign of the last non-zero difference
+        self.plateau_start = None  # index right after the last non-zero difference
+        self.prev_value = None  # value of the last peak
+        self.start_type = None
+
+    def scan_iterable(self, iterable):
+        indexes, values, distances, is_highs = [], [], [], []
+        last, last_sign = self.last, self.last_sign
+
+        i = self.n - 1
+        for i, item in enumerate(iterable, self.n):
+            if i == 0:
+                self.first = last = item
+                continue
+
+            if item > last:
+                sign = 1
+            elif item < last:
+                sign = -1
+            else:
+                last = item
+                continue
+
+            if last_sign is None:
+                self.start_type = Peak.LOW if sign > 0 else Peak.HIGH
+                self.prev_value = self.first
+
+            elif sign != last_sign:
+                indexes.append(self.plateau_start)
+                values.append(last)
+                distances.append(abs(last - self.prev_value))
+                is_highs.append(last_sign > 0)
+                self.prev_value = last
+
+            last_sign = sign
+            self.plateau_start = i
+            last = item
+
+        self.n = i + 1
+        self.last, self.last_sign = last, last_sign
+        return indexes, values, distances, is_highs
+
+    def scan_array(self, x):
+        np = _get_numpy()
+        empty = (np.empty(0, np.int64), x[:0], x[:0], np.empty(0, bool))
+        if len(x) == 0:
+            return empty
+
+        if self.n == 0:
+            self.first = x[0]
+            y, ybase = x, 0
+        else:
+            y, ybase = np.concatenate(([self.last], x)), self.n - 1
+
+        s = (y[1:] > y[:-1]).astype(np.int8) - (y[1:] < y[:-1]).astype(np.int8)
+        nz = np.flatnonzero(s)
+        pos, signs = nz + ybase, s[nz]  # pos: index of the left item of the difference
+
+        self.n += len(x)
+        self.last = y[-1]
+        if len(nz) == 0:
+            return empty
+
+        with_start = self.last_sign is None
+        if not with_start:
+            pos = np.concatenate(([self.plateau_start - 1], pos))
+            signs = np.concatenate(([self.last_sign], signs))
+
+        m = np.flatnonzero(signs[1:] != signs[:-1]) + 1
+        indexes = pos[m - 1] + 1
+        values = y[pos[m] - ybase]
+        is_highs = signs[m - 1] > 0
+
+        if with_start:
+            self.start_type = Peak.LOW if signs[0] > 0 else Peak.HIGH
+            self.prev_value = self.first
+        prev = np.concatenate(([self.prev_value], values[:-1]))
+
+        self.last_sign = signs[-1]
+        self.plateau_start = pos[-1] + 1
+        if len(values):
+            self.prev_value = values[-1]
+
+        return indexes, values, np.abs(values - prev), is_highs
+
+
+def _top_k(keys, k):
+    """
+    :return: indexes of the k smallest keys, in the order of a stable sort (argpartition, no full sort)
+    """
+    np = _get_numpy()
+    if k is None or k >= len(keys):
+        return np.argsort(keys, kind='stable')
+    if k <= 0:
+        return np.empty(0, np.int64)
+
+    kth = np.partition(keys, k - 1)[k - 1]
+    less = np.flatnonzero(keys < kth)
+    selected = np.concatenate((less, np.flatnonzero(keys == kth)[:k - len(less)]))
+    selected.sort()
+
+    return selected[np.argsort(keys[selected], kind='stable')]
+
+
+def _select(peaks, sorted_type, max_num):
+    """top-k of a list of PeakElem, same order as a stable full sort"""
+    if sorted_type == Peak.SORTED_ABSOLUTE_VALUE:
+        if max_num is None:
+            return sorted(peaks, key=lambda x: x.value)
+        return heapq.nsmallest(max_num, peaks, key=lambda x: x.value)
+
+    elif sorted_type == Peak.SORTED_RELATIVE_DISTANCE:
+        if max_num is None:
+            return sorted(peaks, key=lambda x: x.relative_distance, reverse=True)
+        return heapq.nlargest(max_num, peaks, key=lambda x: x.relative_distance)
+
+    return peaks[slice(max_num)]
+
+
+def _check_peak_type(peak_type):
+    if peak_type not in (Peak.HIGH, Peak.LOW):
+        raise TypeError('{} is not valid prek_type'.format(peak_type))
 
 
 class Peak:
@@ -34,107 +204,121 @@ class Peak:
 
     @staticmethod
     def _compute_peaks(iterable):  # ignore the last item
-        peaks = []
-        peak_elem = namedtuple('peak_elem', ['index', 'value', 'relative_distance'])
-        state = 'start'
-        start_type = None
-        last = None
-        for i, item in enumerate(iterable):
-
-            if state == 'start':
-                state = 'start-next'
-
-            elif state == 'start-next':
-                if item > last:
-                    start_type = 'low'
-                    state = 'up'
-                elif item < last:
-                    start_type = 'high'
-                    state = 'down'
-
-                peaks.append(peak_elem(i - 1, last, 0))  # would be ignored then
-
-            elif state == 'up':
-                if item < last:
-                    peaks.append(peak_elem(i - 1, last, abs(last - peaks[-1].value)))
-                    state = 'down'
-
-                elif item == last:
-                    peaks.append(peak_elem(i - 1, last, abs(last - peaks[-1].value)))
-                    state = 'plane'
-
-            elif state == 'down':
-                if item > last:
-                    peaks.append(peak_elem(i - 1, last, abs(last - peaks[-1].value)))
-                    state = 'up'
-
-                elif item == last:
-                    peaks.append(peak_elem(i - 1, last, abs(last - peaks[-1].value)))
-                    state = 'plane'
-
-            elif state == 'plane':  # only recorde first item if item == last
-                if item < last:
-                    state = 'down'
-                elif item > last:
-                    state = 'up'
+        """
+        :return: ((indexes, values, relative_distances, is_highs), start_type),
+                 NumPy arrays for numeric sequences, else lists
+        """
+        scanner = _PeakScanner()
+        array = _as_numeric_array(iterable)
+        if array is not None:
+            return scanner.scan_array(array), scanner.start_type
 
-            last = item
+        return scanner.scan_iterable(iterable), scanner.start_type
 
-        return peaks[1:], start_type
+    def get_peak(self, peak_type, sorted_type=SORTED_RELATIVE_DISTANCE, max_num=None):
+        """
+        :param peak_type: Peak.HIGH or Peak.LOW
+        :param sorted_type: Peak.SORTED_*
+        :param max_num: top-k only, None for all
+        :return: [PeakElem, ...]
+        """
+        _check_peak_type(peak_type)
+        indexes, values, distances, is_highs = self._peaks
+        want_high = peak_type == Peak.HIGH
+
+        if isinstance(indexes, list):
+            peaks = [PeakElem(index, value, distance)
+                     for index, value, distance, is_high in zip(indexes, values, distances, is_highs)
+                     if is_high == want_high]
+            return _select(peaks, sorted_type, max_num)
+
+        np = _get_numpy()
+        selected = np.flatnonzero(is_highs == want_high)
+        if sorted_type == Peak.SORTED_ABSOLUTE_VALUE:
+            selected = selected[_top_k(values[selected], max_num)]
+        elif sorted_type == Peak.SORTED_RELATIVE_DISTANCE:
+            selected = selected[_top_k(-distances[selected], max_num)]
+        else:
+            selected = selected[slice(max_num)]
 
-    @classmethod
-    def _sorted(cls, peaks, start_type, key):
+        return [PeakElem(*peak) for peak in zip(indexes[selected].tolist(),
+                                                values[selected].tolist(),
+                                                distances[selected].tolist())]
 
-        if len(peaks) == 0:
-            return [], []
 
-        if start_type == Peak.LOW:
-            low_peaks = peaks[0::2]
-            if len(peaks) == 1:
-                high_peaks = []
-            else:
-                high_peaks = peaks[1::2]
+class PeakStream:
+    """
+    peak detection over an unbounded stream, memory is bounded by the chunk and top_k
+
+    >>> stream = PeakStream(top_k=1)
+    >>> stream.feed([0, 3, 1])
+    ([], [peak_elem(index=1, value=3, relative_distance=3)])
+    >>> stream.feed([1, 5, 2])
+    ([peak_elem(index=2, value=1, relative_distance=2)], [peak_elem(index=4, value=5, relative_distance=4)])
+    >>> stream.get_peak(Peak.HIGH)
+    [peak_elem(index=4, value=5, relative_distance=4)]
+    """
 
+    def __init__(self, top_k=None, sorted_type=Peak.SORTED_RELATIVE_DISTANCE):
+        """
+        :param top_k: keep the best top_k peaks of each type for get_peak, None keeps nothing
+        :param sorted_type: what "best" means, Peak.SORTED_*
+        """
+        self._scanner = _PeakScanner()
+        self._top_k = top_k
+        self._sorted_type = sorted_type
+        self._kept = {Peak.HIGH: [], Peak.LOW: []}  # heaps of (priority, -seq, PeakElem)
+        self._seq = _count()
+        self.count = 0
+
+    @property
+    def start_type(self):
+        return self._scanner.start_type
+
+    def feed(self, chunk):
+        """
+        :param chunk: NumPy array or list of numbers, or any iterable
+        :return: ([new low PeakElem, ...], [new high PeakElem, ...])
+        """
+        array = _as_numeric_array(chunk)
+        if array is not None:
+            peaks = self._scanner.scan_array(array)
+            peaks = zip(*(column.tolist() for column in peaks))
         else:
-            high_peaks = peaks[0::2]
-            if len(peaks) == 1:
-                low_peaks = []
-            else:
-                low_peaks = peaks[1::2]
+            peaks = zip(*self._scanner.scan_iterable(chunk))
 
-        if key == Peak.SORTED_ABSOLUTE_VALUE:
-            low_peaks = sorted(low_peaks, key=lambda x: x.value)
-            high_peaks = sorted(high_peaks, key=lambda x: x.value)
-
-        elif key == Peak.SORTED_RELATIVE_DISTANCE:
-            low_peaks = sorted(low_peaks, key=lambda x: x.relative_distance, reverse=True)
-            high_peaks = sorted(high_peaks, key=lambda x: x.relative_distance, reverse=True)
-
-        elif key == Peak.SORTED_NATIVE_INDEX:
-            pass
+        low_peaks, high_peaks = [], []
+        for index, value, distance, is_high in peaks:
+            peak = PeakElem(index, value, distance)
+            (high_peaks if is_high else low_peaks).append(peak)
+            self._keep(Peak.HIGH if is_high else Peak.LOW, peak)
 
+        self.count += len(low_peaks) + len(high_peaks)
         return low_peaks, high_peaks
 
-    def get_peak(self, peak_type, sorted_type=SORTED_RELATIVE_DISTANCE, max_num=None):
+    def _keep(self, peak_type, peak):
+        if self._top_k is None:
+            return
 
-        if len(self._peaks) < 1:
-            return []
-
-        if peak_type == peak_type:
-            res = self._peaks[0::2]
-        else:
-            if len(self._peaks) == 1:
-                return []
-            else:
-                res = self._peaks[1::2]
-
-        low_peaks, high_peaks = Peak._sorted(self._peaks, self._start_type, key=sorted_type)
-
-        if peak_type == Peak.HIGH:
-            res = high_peaks
-        elif peak_type == Peak.LOW:
-            res = low_peaks
+        if self._sorted_type == Peak.SORTED_ABSOLUTE_VALUE:
+            priority = -peak.value
+        elif self._sorted_type == Peak.SORTED_RELATIVE_DISTANCE:
+            priority = peak.relative_distance
         else:
-            raise TypeError('{} is not valid prek_type'.format(peak_type))
-
-        return res[slice(max_num)]
+            priority = -peak.index
+
+        # the worst kept peak is on the heap top, the later one is worse for the same priority
+        item = (priority, -next(self._seq), peak)
+        kept = self._kept[peak_type]
+        if len(kept) < self._top_k:
+            heapq.heappush(kept, item)
+        elif item[:2] > kept[0][:2]:
+            heapq.heapreplace(kept, item)
+
+    def get_peak(self, peak_type, max_num=None):
+        """
+        :return: the kept top_k peaks of the type, best first
+        """
+        _check_peak_type(peak_type)
+        kept = sorted(self._kept[peak_type], key=lambda x: x[:2], reverse=True)
+        return [item[2] for item in kept][slice(max_num)]
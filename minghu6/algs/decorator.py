@@ -6,8 +6,14 @@
 About decorator
 ################################################################################
 """
-from functools import partial
 import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import partial, wraps
 
 from minghu6.text.seq_enh import camelize
 
@@ -17,7 +23,14 @@ __all__ = ['LackMethodError', 'LackPropertyError',
            'ignore',
            'mock_func',
            'singleton',
-           'timer']
+           'timer',
+           'handle_exception',
+           'cli_handle_exception',
+           'benchmark_handle_exception',
+           'memoize',
+           'disk_memoize',
+           'DiskMemoizeStore',
+           'MemoizeInfo']
 
 
 class LackPropertyError(BaseException):
@@ -105,11 +118,44 @@ def exception_handler(*kwargs):
     return wrapper
 
 
-def handle_exception(exception_handler, exception_classes):
+class _ExceptionDispatcher:
+    """exception class -> handler, resolved along the MRO of the raised type and cached"""
+    __slots__ = ('classes', '_handlers', '_cache')
+
+    def __init__(self, exception_handler, exception_classes):
+        if exception_classes is None:
+            items = list(exception_handler.items())
+        else:
+            if inspect.isclass(exception_classes):
+                exception_classes = [exception_classes]
+            items = [(exception_class, exception_handler) for exception_class in exception_classes]
+
+        self._handlers = {}
+        for classes, handler in items:
+            for exception_class in (classes if isinstance(classes, tuple) else (classes,)):
+                self._handlers.setdefault(exception_class, handler)  # the first one listed wins
+
+        self.classes = tuple(self._handlers)
+        self._cache = {}
+
+    def lookup(self, exception_type):
+        try:
+            return self._cache[exception_type]
+        except KeyError:
+            handler = next(self._handlers[cls] for cls in exception_type.__mro__ if cls in self._handlers)
+            self._cache[exception_type] = handler
+            return handler
+
+
+def handle_exception(exception_handler, exception_classes=None):
     """
     An exception handling idiom using decorators
-    Specify exceptions in order, first one is handled first
-    last one last.
+    one try in one frame, the handler is resolved by the MRO of the raised exception
+    (cached per exception type), async functions are supported.
+
+    :param exception_handler: handler(ex) -> result of the call,
+                              or {exception class (or tuple of them): handler}, the most specific one is used
+    :param exception_classes: exception class or list of them, None when exception_handler is a dict
     >>> def handler(ex):
     ...     print(ex, type(ex))
     ...     return ex.args
@@ -129,36 +175,43 @@ def handle_exception(exception_handler, exception_classes):
     >>> f2()
     abc.txt <class 'FileNotFoundError'>
     ('abc.txt',)
+    >>> @handle_exception({LookupError: lambda ex: 'lookup', KeyError: lambda ex: 'key'})
+    ... def f3(d):
+    ...     return d['a']
+    >>> f3({}), f3.__name__
+    ('key', 'f3')
     """
 
-    def wrapper(f):
-        nonlocal exception_classes
-
-        if inspect.isclass(exception_classes):
-            exception_classes = [exception_classes]
-
-        exception_chain = list(exception_classes)
-        exception_chain.reverse()  # for recursive invokation
-
-        def newfunc(exception_chain, *args, **kwargs):  # recursion
-            exception_class = exception_chain[0]
+    dispatcher = _ExceptionDispatcher(exception_handler, exception_classes)
+    classes, lookup = dispatcher.classes, dispatcher.lookup
 
+    def wrapper(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_newfunc(*args, **kwargs):
+                try:
+                    return await f(*args, **kwargs)
+                except classes as ex:
+                    result = lookup(type(ex))(ex)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    return result
+
+            return async_newfunc
+
+        @wraps(f)
+        def newfunc(*args, **kwargs):
             try:
-                if len(exception_chain) == 1:
-                    result = f(*args, **kwargs)
-                else:
-                    result = newfunc(exception_chain[1:], *args, **kwargs)  # spread exception
-            except exception_class as ex:
-                return exception_handler(ex)
-            else:
-                return result
+                return f(*args, **kwargs)
+            except classes as ex:
+                return lookup(type(ex))(ex)
 
-        return partial(newfunc, exception_chain)
+        return newfunc
 
     return wrapper
 
 
-def cli_handle_exception(exception_handler, exception_classes):
+def cli_handle_exception(exception_handler, exception_classes=None):
     """
     deal with exception stack info, and then just throw the wrapper exception by cli
     >>> def cli_handler1(ex):
@@ -184,36 +237,71 @@ def cli_handle_exception(exception_handler, exception_classes):
 
     AssertionError: Need root permission
     """
-    import inspect
-    from functools import partial
+
+    dispatcher = _ExceptionDispatcher(exception_handler, exception_classes)
+    classes, lookup = dispatcher.classes, dispatcher.lookup
 
     def wrapper(f):
-        nonlocal exception_classes
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_newfunc(*args, **kwargs):
+                try:
+                    return await f(*args, **kwargs)
+                except classes as ex:
+                    raised_exception = ex  # handle it out of the except block to clean old exception stack.
+
+                result = lookup(type(raised_exception))(raised_exception)
+                if inspect.isawaitable(result):
+                    await result
+
+            return async_newfunc
+
+        @wraps(f)
+        def newfunc(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            except classes as ex:
+                raised_exception = ex  # handle it out of the except block to clean old exception stack.
 
-        if inspect.isclass(exception_classes):
-            exception_classes = [exception_classes]
+            lookup(type(raised_exception))(raised_exception)
 
-        exception_chain = list(exception_classes)
-        exception_chain.reverse()  # for recursive invokation
+        return newfunc
+
+    return wrapper
 
-        def newfunc(exception_chain, *args, **kwargs):  # recursion
-            exception_class = exception_chain[0]
-            raised_exception = None
-            try:
-                if len(exception_chain) == 1:
-                    result = f(*args, **kwargs)
-                else:
-                    result = newfunc(exception_chain[1:], *args, **kwargs)  # spread exception
-            except exception_class as ex:
-                raised_exception = ex  # goto next exception_handler to clean old exception stack.
-            else:
-                return result
 
-            exception_handler(raised_exception)
+def benchmark_handle_exception(n=1000000):
+    """
+    per-call overhead of handle_exception against the undecorated function,
+    on the normal path and on the exception path
+    """
+    from minghu6.algs.timeme import timeme
 
-        return partial(newfunc, exception_chain)
+    def f(x):
+        return x
 
-    return wrapper
+    def g(x):
+        raise KeyError(x)
+
+    def handler(ex):
+        return None
+
+    decorated_f = handle_exception(handler, [ValueError, KeyError])(f)
+    decorated_g = handle_exception(handler, [ValueError, KeyError])(g)
+
+    def g_caught(x):
+        try:
+            return g(x)
+        except (ValueError, KeyError) as ex:
+            return handler(ex)
+
+    for name, func in [('plain', f), ('handle_exception', decorated_f),
+                       ('plain try/except, raise', g_caught), ('handle_exception, raise', decorated_g)]:
+        with timeme() as t:
+            for i in range(n):
+                func(i)
+
+        print('{0:<28} {1:>10.1f} ns/call'.format(name, t.total * 1e9 / n))
 
 
 REQUIRED = 'required'
@@ -241,7 +329,7 @@ def ignore(func):
     def func_pass(ex):
         pass
 
-    return partial(handle_exception, func_pass, Exception)
+    return handle_exception(func_pass, Exception)(func)
 
 
 def assert_exception(exception):
@@ -308,26 +396,31 @@ def singleton(cls):
     return _singleton
 
 
+_UNIT_CONVERSION = {'ms': 1e3,
+                    's': 1,
+                    'min': 1 / 60,
+                    'h': 1 / (60 * 60)
+                    }
+
+
 def timer(label='', unit='ms', trace=True):  # On decorator args: retain args
-    import time
+    """
+    print CPU time (time.process_time) of each call,
+    for wall time and quantiles without printing use minghu6.algs.metrics.timed
+    """
+    unit_factor = _UNIT_CONVERSION[unit]
 
     def onDecorator(func):  # On @: retain decorated func
         def onCall(*args, **kargs):  # On calls: call original
-            start = time.process_time() # State is scopes + func attr
+            start = time.process_time()  # State is scopes + func attr
             result = func(*args, **kargs)
             elapsed = time.process_time() - start
             onCall.alltime += elapsed
             if trace:
-                unit_conversion = {'ms': 1e3,
-                                   's': 1,
-                                   'min': 1 / 60,
-                                   'h': 1 / (60 * 60)
-                                   }
-
                 format = '%s%s: %.5f, %.5f %s'
                 values = (label, func.__name__,
-                          elapsed * unit_conversion[unit],
-                          onCall.alltime * unit_conversion[unit],
+                          elapsed * unit_factor,
+                          onCall.alltime * unit_factor,
                           unit)
 
                 print(format % values)
@@ -340,6 +433,297 @@ def timer(label='', unit='ms', trace=True):  # On decorator args: retain args
     return onDecorator
 
 
+MemoizeInfo = namedtuple('MemoizeInfo', ['hits', 'misses', 'evictions', 'currsize', 'bytes', 'maxsize'])
+
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs, typed):
+    """like the key of functools.lru_cache, args and sorted kwargs (and their types)"""
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    if typed:
+        key += tuple(type(v) for v in args)
+        if kwargs:
+            key += tuple(type(v) for _, v in sorted(kwargs.items()))
+
+    return key
+
+
+def memoize(maxsize=128, ttl=None, typed=False, key=None):
+    """
+    thread-safe memoize with LRU and TTL eviction,
+    the wrapper has cache_info() and cache_clear() like functools.lru_cache
+
+    >>> @memoize(maxsize=2)
+    ... def square(x):
+    ...     return x * x
+    >>> square(2), square(2), square(3), square(4)
+    (4, 4, 9, 16)
+    >>> info = square.cache_info()
+    >>> info.hits, info.misses, info.evictions, info.currsize
+    (1, 3, 1, 2)
+
+    :param maxsize: max entries, None means unbounded, can be the function for bare @memoize
+    :param ttl: seconds an entry lives, None means forever
+    :param typed: f(3) and f(3.0) are cached separately
+    :param key: key(*args, **kwargs) -> hashable, instead of the args themselves
+    :return:
+    """
+    import sys
+
+    if callable(maxsize):  # @memoize without args
+        return memoize()(maxsize)
+
+    def wrapper(f):
+        cache = OrderedDict()  # key -> (result, expire time, size)
+        lock = threading.RLock()
+        stat = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+        def evict(k):
+            stat['bytes'] -= cache.pop(k)[2]
+            stat['evictions'] += 1
+
+        @wraps(f)
+        def newfunc(*args, **kwargs):
+            k = key(*args, **kwargs) if key is not None else _make_key(args, kwargs, typed)
+
+            with lock:
+                if k in cache:
+                    result, expire, _ = cache[k]
+                    if expire is None or time.monotonic() < expire:
+                        cache.move_to_end(k)
+                        stat['hits'] += 1
+                        return result
+                    evict(k)
+                stat['misses'] += 1
+
+            result = f(*args, **kwargs)  # not under the lock, other keys aren't blocked
+            if maxsize == 0:
+                return result
+
+            size = sys.getsizeof(result)  # shallow, an estimate
+            expire = None if ttl is None else time.monotonic() + ttl
+            with lock:
+                if k in cache:  # computed by another thread meanwhile
+                    stat['bytes'] -= cache.pop(k)[2]
+                cache[k] = (result, expire, size)
+                stat['bytes'] += size
+                while maxsize is not None and len(cache) > maxsize:
+                    evict(next(iter(cache)))
+
+            return result
+
+        def cache_info():
+            with lock:
+                return MemoizeInfo(stat['hits'], stat['misses'], stat['evictions'],
+                                   len(cache), stat['bytes'], maxsize)
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                stat.update(hits=0, misses=0, evictions=0, bytes=0)
+
+        newfunc.cache_info = cache_info
+        newfunc.cache_clear = cache_clear
+        return newfunc
+
+    return wrapper
+
+
+class DiskMemoizeStore:
+    """
+    pickled results in a SQLite table (WAL, shared by processes),
+    least recently used rows are evicted when the total size goes over max_bytes
+    (checked every EVICT_EVERY puts)
+    """
+    DB_NAME = 'memoize.db'
+    EVICT_EVERY = 64  # check the total size every N puts
+    # atime is only written back when older than this (like relatime, see CharsetCache),
+    # so a read-mostly store doesn't write the db on every hit
+    ATIME_REFRESH = 24 * 3600
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024):
+        if path is None:
+            from minghu6.etc.path import get_cache_dir
+            path = os.path.join(get_cache_dir(), DiskMemoizeStore.DB_NAME)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._puts = 0
+
+    def _connect(self):
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS memoize ('
+                     'func TEXT, key TEXT, value BLOB, size INTEGER, atime REAL, expire REAL, '
+                     'PRIMARY KEY (func, key))')
+        conn.execute('CREATE INDEX IF NOT EXISTS memoize_atime ON memoize(atime)')
+        conn.commit()
+
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    def get(self, func, key):
+        """:return: (found, result)"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT value, expire, atime FROM memoize WHERE func=? AND key=?',
+                               (func, key)).fetchone()
+            if row is None:
+                return False, None
+
+            value, expire, atime = row
+            now = time.time()
+            if expire is not None and expire <= now:
+                conn.execute('DELETE FROM memoize WHERE func=? AND key=?', (func, key))
+                conn.commit()
+                self.evictions += 1
+                return False, None
+
+            if atime is None or now - atime > DiskMemoizeStore.ATIME_REFRESH:
+                conn.execute('UPDATE memoize SET atime=? WHERE func=? AND key=?', (now, func, key))
+                conn.commit()
+
+        return True, pickle.loads(value)
+
+    def put(self, func, key, result, ttl=None):
+        value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO memoize VALUES (?, ?, ?, ?, ?, ?)',
+                         (func, key, value, len(value), now, None if ttl is None else now + ttl))
+            conn.commit()
+
+            self._puts += 1
+            if self._puts % DiskMemoizeStore.EVICT_EVERY == 0 or len(value) > self.max_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        total = self.bytes(conn)
+        if total <= self.max_bytes:
+            return
+
+        freed = 0
+        doomed = []
+        for func, key, size in conn.execute('SELECT func, key, size FROM memoize ORDER BY atime'):
+            doomed.append((func, key))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+
+        conn.executemany('DELETE FROM memoize WHERE func=? AND key=?', doomed)
+        conn.commit()
+        self.evictions += len(doomed)
+
+    def bytes(self, conn=None):
+        conn = self._connect() if conn is None else conn
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM memoize').fetchone()[0]
+
+    def count(self, func=None):
+        with self._lock:
+            conn = self._connect()
+            if func is None:
+                return conn.execute('SELECT COUNT(*) FROM memoize').fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM memoize WHERE func=?', (func,)).fetchone()[0]
+
+    def clear(self, func=None):
+        with self._lock:
+            conn = self._connect()
+            if func is None:
+                conn.execute('DELETE FROM memoize')
+            else:
+                conn.execute('DELETE FROM memoize WHERE func=?', (func,))
+            conn.commit()
+
+
+def _stable_key(obj):
+    """
+    set/frozenset (also inside tuple, list, dict) to a tuple sorted by the pickled items,
+    their iteration order, so their pickle, changes across processes (str hash randomization)
+    """
+    if isinstance(obj, (set, frozenset)):
+        items = [_stable_key(item) for item in obj]
+        items.sort(key=lambda item: pickle.dumps(item, protocol=4))
+        return type(obj), tuple(items)
+    if type(obj) in (tuple, list):
+        return type(obj)(_stable_key(item) for item in obj)
+    if type(obj) is dict:
+        return {k: _stable_key(v) for k, v in obj.items()}
+
+    return obj
+
+
+def disk_memoize(path=None, max_bytes=256 * 1024 * 1024, ttl=None, typed=False, key=None):
+    """
+    like memoize, but the results are pickled into SQLite, so they survive process restarts.
+    for expensive calls like ffprobe, charset detection and OCR,
+    args (or key(...)) and results should be picklable, the key is the sha1 of the pickled args,
+    so args should pickle the same in every process: sets are normalized,
+    but objects holding sets or other hash-ordered state still miss across processes.
+    env MINGHU6_NO_CACHE disables it
+
+    :param path: SQLite file, default memoize.db in the user cache dir
+    :param max_bytes: bound of the whole store, least recently used rows are evicted
+    :param ttl: seconds an entry lives, None means forever
+    :return:
+    """
+    import hashlib
+
+    store = DiskMemoizeStore(path, max_bytes)
+
+    def wrapper(f):
+        func_name = '{0}.{1}'.format(f.__module__, f.__qualname__)
+        stat = {'hits': 0, 'misses': 0}
+        stat_lock = threading.Lock()
+
+        @wraps(f)
+        def newfunc(*args, **kwargs):
+            if os.environ.get('MINGHU6_NO_CACHE') is not None:
+                return f(*args, **kwargs)
+
+            k = key(*args, **kwargs) if key is not None else _make_key(args, kwargs, typed)
+            digest = hashlib.sha1(pickle.dumps(_stable_key(k), protocol=4)).hexdigest()
+
+            found, result = store.get(func_name, digest)
+            with stat_lock:
+                stat['hits' if found else 'misses'] += 1
+            if found:
+                return result
+
+            result = f(*args, **kwargs)
+            store.put(func_name, digest, result, ttl)
+            return result
+
+        def cache_info():
+            with stat_lock:
+                return MemoizeInfo(stat['hits'], stat['misses'], store.evictions,
+                                   store.count(func_name), store.bytes(), max_bytes)
+
+        def cache_clear():
+            store.clear(func_name)
+            with stat_lock:
+                stat.update(hits=0, misses=0)
+
+        newfunc.cache_info = cache_info
+        newfunc.cache_clear = cache_clear
+        newfunc.store = store
+        return newfunc
+
+    return wrapper
+
+
 def to_class(return_func_name='get_result'):
     def wrapper(func):
         def __init__(self, *args, **kwargs):
@@ -0,0 +1,291 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+################################################################################
+Low-overhead timing metrics
+
+@timed(name) and `with timing(name):` record wall and CPU time (ns) of each call
+into per-name log-linear (HDR-style) histograms, quantiles p50/p95/p99 come from them.
+disabled by default, then a timed call costs one attribute check.
+
+set env MINGHU6_METRICS=<path.json|path.prom> to enable the registry and write it at exit,
+*.prom is the Prometheus textfile format, others are JSON.
+only the parent process writes, code timed in worker processes should send
+registry.drain() back with its result and the parent merge() it.
+################################################################################
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from minghu6.algs.timeme import timeme
+
+__all__ = ['Histogram',
+           'Registry',
+           'registry',
+           'timed',
+           'timing',
+           'enable',
+           'disable']
+
+
+class Histogram:
+    """
+    log-linear buckets over non-negative ints, 2 ** sub_bucket_bits buckets per power of 2,
+    so a reported value is at most about 1 / 2 ** sub_bucket_bits (~3%) above the real one
+    """
+    __slots__ = ('sub_bucket_bits', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, sub_bucket_bits=5):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}  # bucket key -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return (shift << (self.sub_bucket_bits + 1)) | (value >> shift)
+
+    def _highest_value(self, key):
+        shift = key >> (self.sub_bucket_bits + 1)
+        mantissa = key & ((1 << (self.sub_bucket_bits + 1)) - 1)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError('can not merge histograms of different precision')
+
+        for key, n in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, p):
+        """
+        :param p: 0 ~ 100
+        :return: the highest value of the bucket holding the p-th percentile, None if empty
+        """
+        if self.count == 0:
+            return None
+
+        rank = max(1, -(-self.count * p // 100))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self._highest_value(key), self.max)
+
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class _Timing:
+    __slots__ = ('wall', 'cpu')
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.cpu = Histogram()
+
+
+class Registry:
+    """name -> wall and CPU time histograms"""
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall_ns, cpu_ns):
+        with self._lock:
+            t = self._timings.get(name)
+            if t is None:
+                t = self._timings[name] = _Timing()
+            t.wall.record(wall_ns)
+            t.cpu.record(cpu_ns)
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+
+    def drain(self):
+        """
+        take the recorded timings out of the registry (e.g. in a worker process)
+
+        :return: picklable {name: timings}, for merge() of another Registry
+        """
+        with self._lock:
+            timings, self._timings = self._timings, {}
+
+        return timings
+
+    def merge(self, timings):
+        """add timings returned by drain() of another registry"""
+        with self._lock:
+            for name, other in timings.items():
+                t = self._timings.get(name)
+                if t is None:
+                    t = self._timings[name] = _Timing()
+                t.wall.merge(other.wall)
+                t.cpu.merge(other.cpu)
+
+    def names(self):
+        with self._lock:
+            return sorted(self._timings)
+
+    def timed(self, name=None):
+        """
+        decorator, record wall and CPU (of the calling thread) time of each call
+
+        :param name: metric name, default module.qualname, can be the function for bare @timed
+        """
+        if callable(name):
+            return self.timed()(name)
+
+        def wrapper(f):
+            metric_name = name if name is not None else '{0}.{1}'.format(f.__module__, f.__qualname__)
+
+            @wraps(f)
+            def newfunc(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                wall, cpu = time.perf_counter_ns(), time.thread_time_ns()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.record(metric_name, time.perf_counter_ns() - wall, time.thread_time_ns() - cpu)
+
+            return newfunc
+
+        return wrapper
+
+    def timing(self, name, unit='s', precision=4):
+        return timing(name, unit, precision, registry=self)
+
+    @staticmethod
+    def _summary(hist):
+        summary = {'count': hist.count,
+                   'sum': hist.total / 1e9,
+                   'min': hist.min / 1e9,
+                   'max': hist.max / 1e9,
+                   'mean': hist.mean / 1e9}
+        for q in Registry.QUANTILES:
+            summary['p{0}'.format(q)] = hist.percentile(q) / 1e9
+
+        return summary
+
+    def to_dict(self):
+        """:return: {name: {'wall': summary, 'cpu': summary}}, in seconds"""
+        with self._lock:
+            return {name: {'wall': Registry._summary(t.wall), 'cpu': Registry._summary(t.cpu)}
+                    for name, t in sorted(self._timings.items())}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self, prefix='minghu6'):
+        """Prometheus text exposition format, one summary per clock"""
+        data = self.to_dict()
+        lines = []
+        for clock in ('wall', 'cpu'):
+            metric = '{0}_{1}_seconds'.format(prefix, clock)
+            lines.append('# HELP {0} {1} time of timed calls'.format(metric, clock))
+            lines.append('# TYPE {0} summary'.format(metric))
+            for name, timings in data.items():
+                label = name.replace('\\', '\\\\').replace('"', '\\"')
+                summary = timings[clock]
+                for q in Registry.QUANTILES:
+                    lines.append('{0}{{name="{1}",quantile="{2}"}} {3!r}'.format(
+                        metric, label, q / 100, summary['p{0}'.format(q)]))
+                lines.append('{0}_sum{{name="{1}"}} {2!r}'.format(metric, label, summary['sum']))
+                lines.append('{0}_count{{name="{1}"}} {2}'.format(metric, label, summary['count']))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """*.prom as Prometheus textfile, else JSON, replaced atomically"""
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = self.to_json(indent=2)
+
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class timing(timeme):
+    """
+    timeme that also records into a Registry (when it's enabled)
+
+    >>> with timing('block') as t:
+    ...     pass
+    >>> t.total >= 0
+    True
+    """
+
+    def __init__(self, name, unit='s', precision=4, registry=None):
+        super().__init__(unit, precision)
+        self.name = name
+        self.registry = registry
+        self._wall = self._cpu = None
+
+    def __enter__(self):
+        super().__enter__()
+        self._wall, self._cpu = time.perf_counter_ns(), time.thread_time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        wall, cpu = time.perf_counter_ns() - self._wall, time.thread_time_ns() - self._cpu
+        super().__exit__(exc_type, exc_val, exc_tb)
+
+        reg = self.registry if self.registry is not None else registry
+        if reg.enabled:
+            reg.record(self.name, wall, cpu)
+
+
+registry = Registry()
+timed = registry.timed
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
+
+
+def _enable_from_env():
+    path = os.environ.get('MINGHU6_METRICS')
+    if path:
+        enable()
+        atexit.register(registry.write, path)
+
+
+_enable_from_env()
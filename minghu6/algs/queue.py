@@ -1,66 +1,231 @@
 #! /usr/bin/env python3
 # -*- coding:utf-8 -*-
 
-import heapq
+__all__ = ['IndexedHeap',
+           'PriorityQueue']
 
-__all__ = ['PriorityQueue']
+
+class IndexedHeap:
+    """
+    binary min heap with an item -> position map,
+    items are unique and hashable, priorities are any comparable values
+
+    contains O(1), push/pop/delete/change O(log n), push_many O(n)
+    """
+    __slots__ = ('_items', '_priorities', '_pos')
+
+    def __init__(self, pairs=None):
+        """
+        :param pairs: iterable of (item, priority)
+        """
+        self._items = []
+        self._priorities = []
+        self._pos = {}
+        if pairs is not None:
+            self.push_many(pairs)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._pos
+
+    def contains(self, item):
+        return item in self._pos
+
+    def is_empty(self):
+        return len(self._items) == 0
+
+    def priority(self, item):
+        return self._priorities[self._pos[item]]
+
+    def peek(self):
+        """:return: (item, priority) with the smallest priority"""
+        if not self._items:
+            raise IndexError('peek from empty heap')
+        return self._items[0], self._priorities[0]
+
+    def push(self, item, priority):
+        if item in self._pos:
+            raise KeyError('item already exist!', item)
+
+        self._items.append(item)
+        self._priorities.append(priority)
+        self._pos[item] = len(self._items) - 1
+        self._sift_up(len(self._items) - 1)
+
+    def push_many(self, pairs):
+        """bulk load, heapify the whole array once, nothing is pushed on a duplicate item"""
+        pairs = list(pairs)
+        new_items = set()
+        for item, _ in pairs:
+            if item in self._pos or item in new_items:
+                raise KeyError('item already exist!', item)
+            new_items.add(item)
+
+        for item, priority in pairs:
+            self._pos[item] = len(self._items)
+            self._items.append(item)
+            self._priorities.append(priority)
+
+        for i in reversed(range(len(self._items) // 2)):
+            self._sift_down(i)
+
+    def pop(self):
+        """:return: (item, priority) with the smallest priority"""
+        if not self._items:
+            raise IndexError('pop from empty heap')
+
+        item, priority = self._items[0], self._priorities[0]
+        self._remove_at(0)
+        return item, priority
+
+    def delete(self, item):
+        """:return: priority of the deleted item"""
+        i = self._pos[item]
+        priority = self._priorities[i]
+        self._remove_at(i)
+        return priority
+
+    def change(self, item, priority):
+        """set a new priority, both increase and decrease"""
+        i = self._pos[item]
+        old = self._priorities[i]
+        self._priorities[i] = priority
+        if priority < old:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def decrease_key(self, item, priority):
+        if self._priorities[self._pos[item]] < priority:
+            raise ValueError('new priority is greater than the current one')
+        self.change(item, priority)
+
+    def _remove_at(self, i):
+        items, priorities = self._items, self._priorities
+        del self._pos[items[i]]
+        last_item, last_priority = items.pop(), priorities.pop()
+        if i == len(items):
+            return
+
+        items[i], priorities[i] = last_item, last_priority
+        self._pos[last_item] = i
+        if i > 0 and last_priority < priorities[(i - 1) >> 1]:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def _sift_up(self, i):
+        items, priorities, pos = self._items, self._priorities, self._pos
+        item, priority = items[i], priorities[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not priority < priorities[parent]:
+                break
+            items[i], priorities[i] = items[parent], priorities[parent]
+            pos[items[i]] = i
+            i = parent
+
+        items[i], priorities[i] = item, priority
+        pos[item] = i
+
+    def _sift_down(self, i):
+        items, priorities, pos = self._items, self._priorities, self._pos
+        n = len(items)
+        item, priority = items[i], priorities[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and priorities[child + 1] < priorities[child]:
+                child += 1
+            if not priorities[child] < priority:
+                break
+            items[i], priorities[i] = items[child], priorities[child]
+            pos[items[i]] = i
+            i = child
+
+        items[i], priorities[i] = item, priority
+        pos[item] = i
 
 
 class PriorityQueue:
+    """
+    greater priority first, FIFO for the same priority,
+    an item can be pushed more than once (items should be hashable)
+    """
+
     def __init__(self):
-        self.__queue = list()
+        self.__heap = IndexedHeap()  # entry index -> (-priority, index)
+        self.__items = dict()  # entry index -> item
+        self.__entries = dict()  # item -> {entry index, ...}
         self.__index = 0
 
+    def __len__(self):
+        return len(self.__heap)
+
     def push(self, item, priority):
-        heapq.heappush(self.__queue, (-priority, self.__index, item))
-        self.__index += 1
+        index = self.__new_entry(item)
+        self.__heap.push(index, (-priority, index))
+
+    def push_many(self, pairs):
+        """
+        :param pairs: iterable of (item, priority)
+        """
+        self.__heap.push_many((index, (-priority, index))
+                              for index, priority in ((self.__new_entry(item), priority)
+                                                      for item, priority in pairs))
 
     def pop(self):
-        return heapq.heappop(self.__queue)[-1]
+        index, _ = self.__heap.pop()
+        return self.__remove_entry(index)
 
     def contains(self, item):
-        return item in map(lambda x: x[-1], self.__queue)
+        return item in self.__entries
 
     def is_empty(self):
-        return len(self.__queue) == 0
+        return self.__heap.is_empty()
 
     def delete(self, item):
-        tmp_list = list()
-        target_list = list()
+        """
+        delete all entries of the item
+        :return: [(-priority, index, item), ...] in pop order
+        """
         if not self.contains(item):
-            raise Exception('item not exist!')
-
-        # item be contained
-        target_tmp = heapq.heappop(self.__queue)
-        while target_tmp[-1] != item:
-            tmp_list.append(target_tmp)
-            target_tmp = heapq.heappop(self.__queue)
-
-        if self.is_empty():
-            target_list.append(target_tmp)
-
-        else:
-            while target_tmp[-1] == item and not self.is_empty():
-                target_list.append(target_tmp)
-                target_tmp = heapq.heappop(self.__queue)
+            raise KeyError('item not exist!')
 
-            if target_tmp[-1] == item:
-                target_list.append(target_tmp)
-            else:
-                tmp_list.append(target_tmp)
+        target_list = []
+        for index in list(self.__entries[item]):
+            neg_priority, _ = self.__heap.delete(index)
+            target_list.append((neg_priority, index, self.__remove_entry(index)))
 
-        [heapq.heappush(self.__queue, target_tmp) for target_tmp in tmp_list]
+        target_list.sort(key=lambda x: x[:2])
         return target_list
 
     def change(self, item, priority):
-        """change the priority Not Suggested use!!"""
+        """change the priority of all entries of the item"""
         if not self.contains(item):
-            raise Exception('item not exist!')
+            raise KeyError('item not exist!')
 
-        else:
-            target_list = self.delete(item)
-            [heapq.heappush(self.__queue,
-                            (-priority, each[1], each[2])) for each in target_list]
+        for index in self.__entries[item]:
+            self.__heap.change(index, (-priority, index))
+
+    def __new_entry(self, item):
+        index = self.__index
+        self.__index += 1
+        self.__items[index] = item
+        self.__entries.setdefault(item, set()).add(index)
+        return index
+
+    def __remove_entry(self, index):
+        item = self.__items.pop(index)
+        entries = self.__entries[item]
+        entries.discard(index)
+        if not entries:
+            del self.__entries[item]
+
+        return item
 
 
 if __name__ == '__main__':
@@ -1,63 +1,552 @@
 # -*- Coding:utf-8 -*-
 """
+STL-like sorted containers
 
+SortedList keeps the values in a list of bounded-size sorted chunks
+(with the max key of each chunk, and a Fenwick tree over the chunk lengths for ranks),
+so add/remove/rank/range queries are O(log n) even for millions of items.
 """
+import bisect
+from collections.abc import MutableMapping
+from itertools import chain, islice
 
 __all__ = ['lower_bound',
-           'upper_bound']
+           'upper_bound',
+           'SortedList',
+           'SortedDict',
+           'benchmark']
 
 
-def lower_bound(l, k):
+def lower_bound(l, k, key=None):
     """
     >>> lower_bound([1, 2, 2, 3, 4], 2)
     1
     >>> lower_bound([1, 2, 2, 3, 4], 5)
-    -1
+    5
 
-    :param l:
-    :param k:
-    :return:
+    :param l: sorted sequence
+    :param k: key
+    :param key: key function of the items
+    :return: first index i that key(l[i]) >= k, len(l) if there is none
     """
-    if l[-1] < k:
-        return -1
+    start, end = 0, len(l)
 
-    i = len(l) // 2
-    start, end = 0, len(l) - 1
-    
     while start < end:
-        if l[i] >= k:
-            end = i
-        else:
+        i = (start + end) // 2
+        if (l[i] if key is None else key(l[i])) < k:
             start = i + 1
-        
-        i = start + (end - start) // 2
+        else:
+            end = i
 
-    return i
+    return start
 
 
-def upper_bound(l, k):
+def upper_bound(l, k, key=None):
     """
     >>> upper_bound([1, 2, 2, 3, 4], 2)
     3
     >>> upper_bound([1, 2, 2, 3, 4], 5)
-    -1
+    5
 
-    :param l:
-    :param k:
-    :return:
+    :param l: sorted sequence
+    :param k: key
+    :param key: key function of the items
+    :return: first index i that key(l[i]) > k, len(l) if there is none
     """
-    if l[-1] <= k:
-        return -1
-
-    i = len(l) // 2
-    start, end = 0, len(l) - 1
+    start, end = 0, len(l)
 
     while start < end:
-        if l[i] > k:
+        i = (start + end) // 2
+        if k < (l[i] if key is None else key(l[i])):
             end = i
         else:
             start = i + 1
-    
-        i = start + (end - start) // 2
 
-    return i
+    return start
+
+
+class SortedList:
+    """
+    >>> sl = SortedList([5, 1, 3])
+    >>> sl.add(2)
+    >>> list(sl), sl.bisect_left(3), sl[-1]
+    ([1, 2, 3, 5], 2, 5)
+    """
+    DEFAULT_LOAD = 1000
+
+    def __init__(self, iterable=None, key=None, load=DEFAULT_LOAD):
+        """
+        :param iterable: initial values
+        :param key: key function, values with the same key keep the insertion order
+        :param load: chunk size, a chunk is split at 2 * load and merged below load // 2
+        """
+        self._key = key
+        self._load = load
+        self._lists = []  # sorted chunks of values
+        self._keys = []  # chunks of keys, the same lists as _lists when key is None
+        self._maxes = []  # the last key of each chunk
+        self._len = 0
+        self._tree = None  # Fenwick tree over the chunk lengths, built lazily
+        self._array = None  # cached NumPy array of keys for searchsorted, False for not numeric
+
+        if iterable is not None:
+            self.update(iterable)
+
+    @property
+    def key(self):
+        return self._key
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._lists)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(chunk) for chunk in reversed(self._lists))
+
+    def __contains__(self, value):
+        return self._locate(value) is not None
+
+    def __repr__(self):
+        if self._key is None:
+            return '{0}({1!r})'.format(type(self).__name__, list(self))
+        return '{0}({1!r}, key={2!r})'.format(type(self).__name__, list(self), self._key)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1:
+                return list(self._islice(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+
+        i, j = self._pos(index)
+        return self._lists[i][j]
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(self._len)), reverse=True):
+                self._delete(*self._pos(i))
+        else:
+            self._delete(*self._pos(index))
+
+    def clear(self):
+        self._lists, self._keys, self._maxes = [], [], []
+        self._len = 0
+        self._tree = None
+        self._array = None
+
+    def add(self, value):
+        k = value if self._key is None else self._key(value)
+        self._array = None
+
+        if not self._maxes:
+            self._lists.append([value])
+            if self._key is not None:
+                self._keys.append([k])
+            else:
+                self._keys = self._lists
+            self._maxes.append(k)
+            self._len = 1
+            self._tree = None
+            return
+
+        i = bisect.bisect_right(self._maxes, k)
+        if i == len(self._maxes):
+            i -= 1
+            self._lists[i].append(value)
+            if self._key is not None:
+                self._keys[i].append(k)
+            self._maxes[i] = k
+        else:
+            j = bisect.bisect_right(self._keys[i], k)
+            self._lists[i].insert(j, value)
+            if self._key is not None:
+                self._keys[i].insert(j, k)
+
+        self._len += 1
+        if len(self._lists[i]) > 2 * self._load:
+            self._split(i)
+        elif self._tree is not None:
+            self._tree_add(i, 1)
+
+    def update(self, iterable):
+        """bulk add, rebuild all chunks from one sort when the input is large"""
+        values = list(iterable)
+        if len(values) * 8 < self._len:
+            for value in values:
+                self.add(value)
+            return
+
+        values[:0] = self  # existing values first, the stable sort keeps them ahead of equal keys
+        values.sort(key=self._key)
+        self.clear()
+        load = self._load
+        self._lists = [values[i:i + load] for i in range(0, len(values), load)]
+        if self._key is None:
+            self._keys = self._lists
+        else:
+            self._keys = [list(map(self._key, chunk)) for chunk in self._lists]
+        self._maxes = [chunk[-1] for chunk in self._keys]
+        self._len = len(values)
+
+    def remove(self, value):
+        loc = self._locate(value)
+        if loc is None:
+            raise ValueError('{0!r} not in list'.format(value))
+        self._delete(*loc)
+
+    def discard(self, value):
+        loc = self._locate(value)
+        if loc is not None:
+            self._delete(*loc)
+
+    def pop(self, index=-1):
+        i, j = self._pos(index)
+        value = self._lists[i][j]
+        self._delete(i, j)
+        return value
+
+    def index(self, value):
+        loc = self._locate(value)
+        if loc is None:
+            raise ValueError('{0!r} not in list'.format(value))
+        return self._loc(*loc)
+
+    def count(self, value):
+        k = value if self._key is None else self._key(value)
+        start, stop = self.bisect_key_left(k), self.bisect_key_right(k)
+        return sum(1 for v in self._islice(start, stop) if v == value)
+
+    def bisect_left(self, value):
+        return self.bisect_key_left(value if self._key is None else self._key(value))
+
+    def bisect_right(self, value):
+        return self.bisect_key_right(value if self._key is None else self._key(value))
+
+    rank = bisect_left
+
+    def bisect_key_left(self, k):
+        i = bisect.bisect_left(self._maxes, k)
+        if i == len(self._maxes):
+            return self._len
+        return self._loc(i, bisect.bisect_left(self._keys[i], k))
+
+    def bisect_key_right(self, k):
+        i = bisect.bisect_right(self._maxes, k)
+        if i == len(self._maxes):
+            return self._len
+        return self._loc(i, bisect.bisect_right(self._keys[i], k))
+
+    def irange(self, min_key=None, max_key=None, inclusive=(True, True), reverse=False):
+        """
+        :param min_key: None means no lower bound
+        :param max_key: None means no upper bound
+        :param inclusive: (include min_key, include max_key)
+        :return: iterator of values whose key is in the range
+        """
+        if min_key is None:
+            start = 0
+        else:
+            start = self.bisect_key_left(min_key) if inclusive[0] else self.bisect_key_right(min_key)
+
+        if max_key is None:
+            stop = self._len
+        else:
+            stop = self.bisect_key_right(max_key) if inclusive[1] else self.bisect_key_left(max_key)
+
+        if reverse:
+            return (self[i] for i in range(stop - 1, start - 1, -1))
+        return self._islice(start, stop)
+
+    def searchsorted(self, many_keys, side='left'):
+        """
+        batched bisect, by NumPy when all the keys are numeric
+
+        :param many_keys: iterable of key
+        :param side: 'left' like bisect_key_left, 'right' like bisect_key_right
+        :return: numpy.ndarray of positions when NumPy is used, else list
+        """
+        if side not in ('left', 'right'):
+            raise ValueError("side should be 'left' or 'right'")
+
+        many_keys = list(many_keys)
+        array = self._numeric_keys()
+        if array is not None:
+            import numpy as np
+
+            query = np.asarray(many_keys)
+            if query.dtype.kind in 'iuf':
+                return np.searchsorted(array, query, side=side)
+
+        bisect_key = self.bisect_key_left if side == 'left' else self.bisect_key_right
+        return [bisect_key(k) for k in many_keys]
+
+    def _numeric_keys(self):
+        """:return: NumPy array of all keys, None if NumPy is missing or the keys aren't int/float"""
+        if self._array is None:
+            self._array = False
+            if self._len > 0 and all(isinstance(k, (int, float))
+                                     for chunk in self._keys for k in (chunk[0], chunk[-1])):
+                try:
+                    import numpy as np
+                except ImportError:
+                    return None
+
+                array = np.array(list(chain.from_iterable(self._keys)))
+                if array.dtype.kind in 'iuf':  # big ints end up as object
+                    self._array = array
+
+        return None if self._array is False else self._array
+
+    def _islice(self, start, stop):
+        if start >= stop:
+            return iter(())
+        i, j = self._pos(start)
+        return islice(chain(islice(self._lists[i], j, None),
+                            chain.from_iterable(self._lists[i + 1:])), stop - start)
+
+    def _locate(self, value):
+        """:return: (chunk, offset) of the value, None if not found"""
+        if not self._maxes:
+            return None
+
+        k = value if self._key is None else self._key(value)
+        i = bisect.bisect_left(self._maxes, k)
+        if i == len(self._maxes):
+            return None
+
+        j = bisect.bisect_left(self._keys[i], k)
+        while i < len(self._lists):
+            keys, values = self._keys[i], self._lists[i]
+            while j < len(keys):
+                if keys[j] != k:
+                    return None
+                if values[j] == value:
+                    return i, j
+                j += 1
+            i, j = i + 1, 0
+
+        return None
+
+    def _delete(self, i, j):
+        del self._lists[i][j]
+        if self._key is not None:
+            del self._keys[i][j]
+        self._len -= 1
+        self._array = None
+
+        if not self._lists[i]:
+            del self._lists[i]
+            if self._key is not None:
+                del self._keys[i]
+            del self._maxes[i]
+            self._tree = None
+            return
+
+        self._maxes[i] = self._keys[i][-1]
+        if len(self._lists[i]) < self._load // 2 and len(self._lists) > 1:
+            self._merge(i)
+        elif self._tree is not None:
+            self._tree_add(i, -1)
+
+    def _split(self, i):
+        load = self._load
+        self._lists.insert(i + 1, self._lists[i][load:])
+        del self._lists[i][load:]
+        if self._key is not None:
+            self._keys.insert(i + 1, self._keys[i][load:])
+            del self._keys[i][load:]
+        self._maxes[i] = self._keys[i][-1]
+        self._maxes.insert(i + 1, self._keys[i + 1][-1])
+        self._tree = None
+
+    def _merge(self, i):
+        """merge the small chunk i with a neighbour, split again if too large"""
+        if i == len(self._lists) - 1:
+            i -= 1
+        self._lists[i].extend(self._lists.pop(i + 1))
+        if self._key is not None:
+            self._keys[i].extend(self._keys.pop(i + 1))
+        self._maxes[i] = self._maxes.pop(i + 1)
+        self._tree = None
+
+        if len(self._lists[i]) > 2 * self._load:
+            self._split(i)
+
+    def _build_tree(self):
+        tree = [len(chunk) for chunk in self._lists]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, i, delta):
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i |= i + 1
+
+    def _loc(self, i, j):
+        """:return: global index of the offset j in chunk i"""
+        if self._tree is None:
+            self._build_tree()
+
+        tree = self._tree
+        total = j
+        while i > 0:
+            total += tree[i - 1]
+            i &= i - 1
+        return total
+
+    def _pos(self, index):
+        """:return: (chunk, offset) of the global index"""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('list index out of range')
+
+        if self._tree is None:
+            self._build_tree()
+
+        tree = self._tree
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:  # Fenwick binary lifting, i ends as the number of whole chunks before index
+            if i + step <= len(tree) and tree[i + step - 1] <= index:
+                index -= tree[i + step - 1]
+                i += step
+            step >>= 1
+
+        return i, index
+
+
+class SortedDict(MutableMapping):
+    """
+    dict iterated in key order
+
+    >>> d = SortedDict({'b': 2, 'a': 1})
+    >>> d['c'] = 3
+    >>> list(d.items()), d.peekitem(0)
+    ([('a', 1), ('b', 2), ('c', 3)], ('a', 1))
+    """
+
+    def __init__(self, *args, key=None, load=SortedList.DEFAULT_LOAD, **kwargs):
+        """
+        :param key: key function of the dict keys
+        """
+        self._dict = dict(*args, **kwargs)
+        self._list = SortedList(self._dict, key=key, load=load)
+
+    def __getitem__(self, k):
+        return self._dict[k]
+
+    def __setitem__(self, k, value):
+        if k not in self._dict:
+            self._list.add(k)
+        self._dict[k] = value
+
+    def __delitem__(self, k):
+        del self._dict[k]
+        self._list.remove(k)
+
+    def __iter__(self):
+        return iter(self._list)
+
+    def __reversed__(self):
+        return reversed(self._list)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __contains__(self, k):
+        return k in self._dict
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, dict(self.items()))
+
+    def clear(self):
+        self._dict.clear()
+        self._list.clear()
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        new_keys = [k for k in other if k not in self._dict]
+        self._dict.update(other)
+        self._list.update(new_keys)
+
+    def peekitem(self, index=-1):
+        k = self._list[index]
+        return k, self._dict[k]
+
+    def popitem(self, index=-1):
+        k = self._list.pop(index)
+        return k, self._dict.pop(k)
+
+    def index(self, k):
+        return self._list.index(k)
+
+    def bisect_left(self, k):
+        return self._list.bisect_left(k)
+
+    def bisect_right(self, k):
+        return self._list.bisect_right(k)
+
+    def irange(self, min_key=None, max_key=None, inclusive=(True, True), reverse=False):
+        """:return: iterator of dict keys in the range"""
+        return self._list.irange(min_key, max_key, inclusive, reverse)
+
+    def searchsorted(self, many_keys, side='left'):
+        return self._list.searchsorted(many_keys, side)
+
+
+def benchmark(n=200000, load=SortedList.DEFAULT_LOAD, seed=0):
+    """
+    random add/rank/remove of n ints, SortedList vs a plain list with bisect.insort
+    """
+    import random
+    from minghu6.algs.timeme import timeme
+
+    rand = random.Random(seed)
+    values = [rand.randrange(n * 10) for _ in range(n)]
+    queries = [rand.randrange(n * 10) for _ in range(n)]
+
+    naive = []
+    with timeme() as t:
+        for v in values:
+            bisect.insort(naive, v)
+    print('{0:<24} {1:>10.4f}s'.format('insort add', t.total))
+
+    sl = SortedList(load=load)
+    with timeme() as t:
+        for v in values:
+            sl.add(v)
+    print('{0:<24} {1:>10.4f}s'.format('SortedList add', t.total))
+
+    with timeme() as t:
+        naive_ranks = [bisect.bisect_left(naive, q) for q in queries]
+    print('{0:<24} {1:>10.4f}s'.format('bisect rank', t.total))
+
+    with timeme() as t:
+        ranks = [sl.bisect_left(q) for q in queries]
+    print('{0:<24} {1:>10.4f}s'.format('SortedList rank', t.total))
+
+    with timeme() as t:
+        many_ranks = sl.searchsorted(queries)
+    print('{0:<24} {1:>10.4f}s'.format('SortedList searchsorted', t.total))
+    assert naive_ranks == ranks == list(many_ranks)
+
+    with timeme() as t:
+        for v in values:
+            del naive[bisect.bisect_left(naive, v)]
+    print('{0:<24} {1:>10.4f}s'.format('list remove', t.total))
+
+    with timeme() as t:
+        for v in values:
+            sl.remove(v)
+    print('{0:<24} {1:>10.4f}s'.format('SortedList remove', t.total))
+
+
+if __name__ == '__main__':
+    benchmark()
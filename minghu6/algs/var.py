@@ -3,8 +3,6 @@
 # python3
 
 import functools
-from types import MethodType
-import abc
 import re
 import collections
 
@@ -33,7 +31,7 @@ def isiterable(obj, but_str_bytes=True):
     :param but_str_bytes: most of time, we don't need str and bytes
     :return:
     """
-    from collections import Iterable
+    from collections.abc import Iterable
     if but_str_bytes and isinstance(obj, (str, bytes, bytearray)):
         return False
     else:
@@ -119,54 +117,74 @@ def _wrap_replace_s(method):
     return newmethod
 
 
+def _wrap_custom_result(method):
+    """
+    str/bytes result of method is converted back to CustomStr/CustomBytes,
+    sharing extra_attrs of self
+    """
+
+    @functools.wraps(method)
+    def newmethod(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if isinstance(result, str):
+            result = CustomStr(result)
+            result.__dict__['extra_attrs'] = self.extra_attrs
+        elif isinstance(result, bytes):
+            result = CustomBytes(result)
+            result.__dict__['extra_attrs'] = self.extra_attrs
+
+        return result
+
+    return newmethod
+
+
 # def custom_str(*args, **kwargs):
 #     pass
 
-class CustomStrBytesCommon(abc.ABC):
+class CustomStrBytesCommon:
+    """
+    str/bytes carrying an extra_attrs dict
 
-    @property
-    @abc.abstractmethod
-    def _custom_class(self):
-        raise NotImplementedError
+    the methods are forwarded once at class level when subclassing,
+    instance is just the value (and a dict, created on first use of extra_attrs).
+    str/bytes results of the public methods and of +, *, % and [] come back as the custom type
+    sharing extra_attrs ('x' + custom, int indexing of bytes, len, in ... are plain)
+    """
+    __slots__ = ()
+
+    _custom_class = None
+    _allowed_magic_method = ('__add__', '__mul__', '__rmul__', '__mod__', '__getitem__')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        base = cls._custom_class
+        for attrname in dir(base):
+            if not attrname.startswith('_') or attrname in cls._allowed_magic_method:
+                attrvalue = getattr(base, attrname)
+                # maketrans/fromhex are static/class methods, nothing to rebind
+                if callable(attrvalue) and attrname not in ('maketrans', 'fromhex'):
+                    setattr(cls, attrname, _wrap_custom_result(attrvalue))
 
     def __init__(self, *args, **kwargs):
-        self._s = self._custom_class(*args, **kwargs)
-        allowed_magic_method = ['__str__',
-                                '__repr',
-                                '__add__',
-                                '__contains__',
-                                '__format__',
-                                '__iter__',
-                                '__len__']
-
-        def _wrap_callable(self, method):
-    
-            def newmethod(self, *args, **kwargs):
-                result = method(*args, **kwargs)
-                if isinstance(result, str):
-                    result = CustomStr(result)
-                    setattr(result, 'extra_attrs', self.extra_attrs)
-                elif isinstance(result, bytes):
-                    result = CustomBytes(result)
-                    setattr(result, 'extra_attrs', self.extra_attrs)
-
-                return result
-    
-            return MethodType(newmethod, self)
-
-        for attrname in dir(self._custom_class):
-            if not attrname.startswith('__') or attrname in allowed_magic_method:
-                attrvalue = getattr(self._s, attrname)
-                if callable(attrvalue):
-                    setattr(self, attrname, _wrap_callable(self, attrvalue))
-        
-        if len(args) == 0 or not hasattr(args[0], 'extra_attrs'):
-            self.extra_attrs = {}
+        if len(args) != 0 and hasattr(args[0], 'extra_attrs'):
+            self.__dict__['extra_attrs'] = args[0].extra_attrs
+
+    @property
+    def extra_attrs(self):
+        try:
+            return self.__dict__['extra_attrs']
+        except KeyError:
+            extra_attrs = self.__dict__['extra_attrs'] = {}
+            return extra_attrs
+
+    @extra_attrs.setter
+    def extra_attrs(self, value):
+        self.__dict__['extra_attrs'] = value
 
     def __eq__(self, s):
-        if self._s != s:
+        if self._custom_class.__ne__(self, s):
             return False
-        
+
         if self.extra_attrs != getattr(s, 'extra_attrs', {}):
             return False
 
@@ -181,15 +199,11 @@ class CustomStrBytesCommon(abc.ABC):
 
 
 class CustomBytes(CustomStrBytesCommon, bytes):
-    @property
-    def _custom_class(self):
-        return bytes
+    _custom_class = bytes
 
 
 class CustomStr(CustomStrBytesCommon, str):
-    @property
-    def _custom_class(self):
-        return str
+    _custom_class = str
 
 
 def findall_attr(obj, pattern):
@@ -11,9 +11,10 @@ import os
 import sys
 import re
 import threading
+import time
+from collections import namedtuple
 from contextlib import contextmanager
 from distutils.version import LooseVersion
-from threading import Thread
 from subprocess import Popen, PIPE
 import enum
 import logging
@@ -21,7 +22,6 @@ import logging.handlers
 import tempfile
 import platform
 
-from minghu6.algs.var import CustomStr, CustomBytes
 from minghu6.text.encoding import get_locale_codec
 
 __all__ = ['exec_cmd',
@@ -34,7 +34,13 @@ __all__ = ['exec_cmd',
            'has_proper_tesseract',
            'auto_resume',
            'env_sep',
-           'CommandRunner']
+           'ProcessEvent',
+           'CommandMux',
+           'CommandRunner',
+           'CommandResult',
+           'RunManyStat',
+           'run_many',
+           'benchmark_command_runner']
 
 
 @contextmanager
@@ -67,6 +73,10 @@ def exec_cmd(cmd, shell=True):
 
     stdout_data, stderr_data = p.communicate()
 
+    return _split_output(stdout_data, stderr_data)
+
+
+def _split_output(stdout_data, stderr_data):
     codec = get_locale_codec()
 
     try:
@@ -83,63 +93,514 @@ def exec_cmd(cmd, shell=True):
     return info, err
 
 
-try:
-    from Queue import Queue, Empty
-except ImportError:
-    from queue import Queue, Empty  # python 3.x
+ProcessEvent = namedtuple('ProcessEvent', ['key', 'tag', 'data'])
+ProcessEvent.__doc__ = """
+tag:
+'stdout'/'stderr': data is bytes, a line (keep the b'\\n') or a raw chunk
+'timeout': data is None, the child is killed, its 'exit' event follows
+'exit': data is the returncode
+"""
 
+# selectors can't wait on pipes on Windows, drive the asyncio engine there
+_SELECTABLE_PIPES = os.name == 'posix'
 
-class CommandRunner(object):
-    """Inspired by https://stackoverflow.com/questions/375427/non-blocking-read-on-a-subprocess-pipe-in-python"""
-    ON_POSIX = 'posix' in sys.builtin_module_names
 
+class _Child:
+    __slots__ = ('key', 'proc', 'buffers', 'open_pipes', 'deadline', 'killed')
 
-    @classmethod
-    def _enqueue_output(cls, process, out, queue):
-        for line in iter(out.readline, b''):
-            if out is process.stdout:
-                tag = 'stdout'
-            elif out is process.stderr:
-                tag = 'stderr'
-            else:
-                tag = 'stdout'
-
-            line = CustomBytes(line)
-            line.extra_attrs['tag'] = tag
-            queue.put(line)
-
-        while True:
-            if process.poll() is not None:
-                process.terminate()
-                break
+    def __init__(self, key, proc, timeout):
+        self.key = key
+        self.proc = proc
+        self.buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+        self.open_pipes = 2
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.killed = False
+
+
+class CommandMux:
+    """
+    run many commands concurrently, multiplex their stdout/stderr in one thread
+
+    ``for event in mux`` yields ProcessEvent (selectors based),
+    ``async for event in mux`` does the same on asyncio.
+    a pipe is read only when the consumer asks for more events,
+    so a slow consumer blocks the children on a full pipe (backpressure).
+
+    i.e.
+    mux = CommandMux()
+    mux.add('ffmpeg -i a.mp4 a.mkv', timeout=3600)
+    mux.add(['ls', '-l'], key='ls')
+    for key, tag, data in mux:
+        ...
+    """
+
+    def __init__(self, lines=True, chunk_size=65536, max_line=1 << 20, queue_size=256):
+        """
+        :param lines: deliver lines, else raw chunks as read from the pipe
+        :param chunk_size: bytes read from a pipe at once
+        :param max_line: longer line without newline is delivered in pieces
+        :param queue_size: events buffered ahead of the consumer (asyncio only)
+        """
+        self.lines = lines
+        self.chunk_size = chunk_size
+        self.max_line = max_line
+        self.queue_size = queue_size
+
+        self.returncodes = {}  # key -> returncode, filled at 'exit'
+        self._pending = []  # [(key, cmd, timeout, popen_kwargs), ...]
+        self._children = {}  # key -> _Child, or asyncio.Task
+        self._selector = None
+        self._count = 0
+
+    def add(self, cmd, key=None, timeout=None, **popen_kwargs):
+        """
+        :param cmd: str (run by shell) or list
+        :param key: identify the command in events, default the index of add
+        :param timeout: seconds, kill the command after that
+        :param popen_kwargs: cwd, env, stdin, ...
+        :return: key
+        """
+        if key is None:
+            key = self._count
+        self._count += 1
+
+        popen_kwargs.setdefault('shell', isinstance(cmd, str))
+        self._pending.append((key, cmd, timeout, popen_kwargs))
+
+        return key
+
+    def cancel(self, key=None):
+        """
+        kill the command (all if key is None), its remaining output is discarded
+        """
+        if key is None:
+            keys = list(self._children)
+            self._pending = []
+        else:
+            keys = [key]
+            self._pending = [item for item in self._pending if item[0] != key]
+
+        for key in keys:
+            child = self._children.get(key)
+            if isinstance(child, _Child):
+                self._kill(child)
+            elif child is not None:  # asyncio.Task
+                child.cancel()
+
+    def __iter__(self):
+        if _SELECTABLE_PIPES:
+            return self._events()
+        else:
+            return self._events_over_async()
+
+    def __aiter__(self):
+        return self._aevents()
+
+    def _emit(self, key, tag, buf, data):
+        """
+        :return: events for data just read into buf
+        """
+        if not self.lines:
+            return [ProcessEvent(key, tag, data)]
+
+        buf += data
+        end = buf.rfind(b'\n') + 1
+        # only b'\n' ends a line, ffmpeg progress uses b'\r' inside one
+        events = [ProcessEvent(key, tag, line + b'\n')
+                  for line in bytes(buf[:end - 1]).split(b'\n')] if end else []
+        del buf[:end]
+
+        if len(buf) >= self.max_line:
+            events.append(ProcessEvent(key, tag, bytes(buf)))
+            buf.clear()
+
+        return events
+
+    def _kill(self, child):
+        if child.killed:
+            return
+
+        child.killed = True
+        if child.proc.poll() is None:
+            child.proc.kill()
+
+        # a grandchild may hold the pipes open, don't wait for their EOF
+        for pipe in (child.proc.stdout, child.proc.stderr):
+            if not pipe.closed:
+                if self._selector is not None:
+                    self._selector.unregister(pipe)
+                pipe.close()
+        child.open_pipes = 0
+
+    def _events(self):
+        import selectors
+
+        self._selector = selector = selectors.DefaultSelector()
+        children = self._children
+        try:
+            while self._pending or children:
+                for key, cmd, timeout, popen_kwargs in self._pending:
+                    proc = Popen(cmd, stdout=PIPE, stderr=PIPE, bufsize=0,
+                                 close_fds=CommandRunner.ON_POSIX, **popen_kwargs)
+                    children[key] = child = _Child(key, proc, timeout)
+                    for tag, pipe in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+                        os.set_blocking(pipe.fileno(), False)
+                        selector.register(pipe, selectors.EVENT_READ, (child, tag))
+                self._pending = []
+
+                now = time.monotonic()
+                deadlines = [child.deadline for child in children.values()
+                             if child.deadline is not None and not child.killed]
+                wait = max(min(deadlines) - now, 0) if deadlines else None
+                if any(child.open_pipes == 0 for child in children.values()):
+                    # pipes closed, the exit is imminent but can't be selected
+                    wait = .005 if wait is None else min(wait, .005)
+
+                if selector.get_map():
+                    ready = selector.select(wait)
+                else:
+                    time.sleep(wait)
+                    ready = []
+
+                for selector_key, _ in ready:
+                    child, tag = selector_key.data
+                    pipe = selector_key.fileobj
+                    try:
+                        data = os.read(pipe.fileno(), self.chunk_size)
+                    except BlockingIOError:
+                        continue
+
+                    buf = child.buffers[tag]
+                    if data:
+                        yield from self._emit(child.key, tag, buf, data)
+                        continue
+
+                    selector.unregister(pipe)
+                    pipe.close()
+                    child.open_pipes -= 1
+                    if buf:
+                        yield ProcessEvent(child.key, tag, bytes(buf))
+                        buf.clear()
+
+                now = time.monotonic()
+                for child in list(children.values()):
+                    if child.deadline is not None and now >= child.deadline and not child.killed:
+                        self._kill(child)
+                        yield ProcessEvent(child.key, 'timeout', None)
+
+                    if child.open_pipes == 0 and child.proc.poll() is not None:
+                        del children[child.key]
+                        self.returncodes[child.key] = child.proc.returncode
+                        yield ProcessEvent(child.key, 'exit', child.proc.returncode)
+
+        finally:  # consumer stopped early or raised
+            for child in children.values():
+                self._kill(child)
+                child.proc.wait()
+            children.clear()
+            selector.close()
+            self._selector = None
+
+    def _events_over_async(self):
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        aevents = self._aevents()
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(aevents.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(aevents.aclose())
+            loop.close()
+
+    async def _aevents(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        paused = []  # pipe transports paused until the consumer catches up
+        children = self._children
+        mux = self
+
+        class ChildProtocol(asyncio.SubprocessProtocol):
+            def __init__(self, key):
+                self.key = key
+                self.buffers = {1: bytearray(), 2: bytearray()}
+                self.exited = loop.create_future()  # process exited
+                self.done = loop.create_future()  # and all pipes closed
+                self.transport = None
+
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def pipe_data_received(self, fd, data):
+                tag = 'stdout' if fd == 1 else 'stderr'
+                for event in mux._emit(self.key, tag, self.buffers[fd], data):
+                    queue.put_nowait(event)
+
+                if queue.qsize() >= mux.queue_size:
+                    pipe = self.transport.get_pipe_transport(fd)
+                    pipe.pause_reading()
+                    paused.append(pipe)
+
+            def pipe_connection_lost(self, fd, exc):
+                buf = self.buffers.get(fd)  # stdin is fd 0
+                if buf:
+                    queue.put_nowait(ProcessEvent(self.key, 'stdout' if fd == 1 else 'stderr', bytes(buf)))
+                    buf.clear()
+
+            def process_exited(self):
+                self.exited.set_result(self.transport.get_returncode())
+
+            def connection_lost(self, exc):
+                self.done.set_result(None)
+
+        async def run(key, cmd, timeout, popen_kwargs):
+            transport = None
+            try:
+                popen_kwargs.setdefault('stdin', None)  # inherit, same as Popen
+                if popen_kwargs.pop('shell'):
+                    transport, protocol = await loop.subprocess_shell(
+                        lambda: ChildProtocol(key), cmd, stdout=PIPE, stderr=PIPE, **popen_kwargs)
+                else:
+                    transport, protocol = await loop.subprocess_exec(
+                        lambda: ChildProtocol(key), *cmd, stdout=PIPE, stderr=PIPE, **popen_kwargs)
+
+                try:
+                    finished, _ = await asyncio.wait([protocol.done], timeout=timeout)
+                except asyncio.CancelledError:  # cancel(key), or the consumer is gone
+                    if closing:
+                        raise
+                    finished = None
+
+                if not finished:
+                    if finished is not None:
+                        queue.put_nowait(ProcessEvent(key, 'timeout', None))
+                    if transport.get_returncode() is None:
+                        transport.kill()
+                    # a grandchild may hold the pipes open, don't wait for their EOF
+                    await protocol.exited
+
+                queue.put_nowait(ProcessEvent(key, 'exit', transport.get_returncode()))
+
+            except Exception as ex:
+                queue.put_nowait(ProcessEvent(key, None, ex))
+
+            finally:
+                if transport is not None:
+                    transport.close()  # kill it if still running
+
+        closing = False
+        running = 0
+        try:
+            while self._pending or running:
+                for key, cmd, timeout, popen_kwargs in self._pending:
+                    children[key] = asyncio.ensure_future(run(key, cmd, timeout, dict(popen_kwargs)))
+                    running += 1
+                self._pending = []
+
+                event = await queue.get()
+                if paused and queue.qsize() <= self.queue_size // 2:
+                    for pipe in paused:
+                        pipe.resume_reading()
+                    paused.clear()
+
+                if event.tag is None:
+                    raise event.data
+                if event.tag == 'exit':
+                    running -= 1
+                    children.pop(event.key, None)
+                    self.returncodes[event.key] = event.data
+
+                yield event
+
+        finally:
+            closing = True
+            tasks = list(children.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            children.clear()
+
+
+class CommandRunner(object):
+    """run one command, yield (tag, line) of its stdout/stderr"""
+    ON_POSIX = 'posix' in sys.builtin_module_names
 
     @classmethod
-    def run(cls, cmd):
+    def run(cls, cmd, timeout=None):
+        """
+        :param cmd: str or [str, ...] joined by ' ', run by shell
+        :param timeout: seconds, kill the command after that
+        :return: generator of ('stdout'|'stderr', decoded and stripped line)
+        """
         if isinstance(cmd, list):
             cmd = ' '.join(cmd)
 
-        p = Popen('{cmd} && exit'.format(cmd=cmd), stdout=PIPE, stderr=PIPE,
-                  close_fds=CommandRunner.ON_POSIX, shell=True)
-        q = Queue()
-        t_stdout = Thread(target=CommandRunner._enqueue_output, name='{cmd} fetch stdout'.format(cmd=cmd),
-                          args=(p, p.stdout, q), daemon=True)
-        t_stderr = Thread(target=CommandRunner._enqueue_output, name='{cmd} fetch stderr'.format(cmd=cmd),
-                          args=(p, p.stderr, q), daemon=True)
+        codec = get_locale_codec()
+        mux = CommandMux()
+        mux.add(cmd, timeout=timeout)
+        for _, status, line in mux:
+            if status == 'stdout' or status == 'stderr':
+                yield status, line.strip().decode(codec, errors='ignore')
 
-        t_stdout.start()
-        t_stderr.start()
 
-        # read line without blocking
-        codec = get_locale_codec()
-        while p.returncode is None:
-            try:
-                line = q.get(timeout=.1)
-                line = line.strip().decode(codec, errors='ignore')
-            except Empty:
-                pass
-            else:  # got line
-                status = line.extra_attrs['tag']
-                yield status, line
+class CommandResult:
+    """
+    one finished command of run_many,
+    output larger than spill_size lives in a temp file instead of memory
+    """
+    __slots__ = ('index', 'cmd', 'returncode', 'timed_out', '_files')
+
+    def __init__(self, index, cmd, spill_size):
+        self.index = index
+        self.cmd = cmd
+        self.returncode = None
+        self.timed_out = False
+        self._files = {'stdout': tempfile.SpooledTemporaryFile(spill_size),
+                       'stderr': tempfile.SpooledTemporaryFile(spill_size)}
+
+    def _write(self, tag, data):
+        self._files[tag].write(data)
+
+    def open(self, tag='stdout'):
+        """
+        :return: binary file of the output, rewound, for output too large to read at once
+        """
+        fp = self._files[tag]
+        fp.seek(0)
+
+        return fp
+
+    @property
+    def stdout(self):
+        return self.open('stdout').read()
+
+    @property
+    def stderr(self):
+        return self.open('stderr').read()
+
+    def decode(self):
+        """
+        :return: ([str1, str2, ...], [str1, str2, ...]), same as exec_cmd
+        """
+        return _split_output(self.stdout, self.stderr)
+
+    def close(self):
+        for fp in self._files.values():
+            fp.close()
+
+    def __repr__(self):
+        return 'CommandResult({0!r}, returncode={1!r})'.format(self.cmd, self.returncode)
+
+
+class RunManyStat:
+    """exit statuses of run_many, returncode is the xargs convention"""
+
+    def __init__(self):
+        self.total = 0
+        self.failed = []  # [CommandResult, ...]
+        self.timed_out = []
+
+    def update(self, result):
+        self.total += 1
+        if result.timed_out:
+            self.timed_out.append(result)
+        if result.returncode != 0:
+            self.failed.append(result)
+
+    @property
+    def returncode(self):
+        """
+        :return: 0 if every command succeeded, 124 if one was killed by timeout, else 123
+        """
+        if self.timed_out:
+            return 124
+        return 123 if self.failed else 0
+
+    def __str__(self):
+        return '{0} commands, {1} failed, {2} timed out'.format(
+            self.total, len(self.failed), len(self.timed_out))
+
+
+def run_many(cmds, jobs=None, ordered=False, timeout=None, spill_size=1 << 20, stat=None,
+             **popen_kwargs):
+    """
+    run commands concurrently, at most jobs at a time
+
+    :param cmds: iterable of command, str (run by shell) or list, consumed lazily
+    :param jobs: max concurrent commands, default os.cpu_count()
+    :param ordered: yield in the order of cmds, else as they complete
+    :param timeout: seconds for each command
+    :param spill_size: output of a command beyond that many bytes spills to a temp file
+    :param stat: RunManyStat, updated while running
+    :param popen_kwargs: cwd, env, ...
+    :return: generator of CommandResult
+    """
+    if jobs is None or jobs < 1:
+        jobs = os.cpu_count() or 1
+
+    cmds = iter(cmds)
+    mux = CommandMux(lines=False)
+    running = {}  # index -> CommandResult
+    finished = {}  # index -> CommandResult, waiting for their turn if ordered
+    next_index = 0  # index of next cmd
+    next_yield = 0  # index of next result to yield if ordered
+
+    def submit():
+        nonlocal next_index
+        for cmd in cmds:
+            running[next_index] = CommandResult(next_index, cmd, spill_size)
+            mux.add(cmd, key=next_index, timeout=timeout, **popen_kwargs)
+            next_index += 1
+            if len(running) >= jobs:
+                break
+
+    submit()
+    try:
+        for index, tag, data in mux:
+            result = running[index]
+            if tag == 'stdout' or tag == 'stderr':
+                result._write(tag, data)
+                continue
+            elif tag == 'timeout':
+                result.timed_out = True
+                continue
+
+            result.returncode = data
+            del running[index]
+            if stat is not None:
+                stat.update(result)
+            submit()  # picked up by mux on the next event
+
+            if not ordered:
+                yield result
+                continue
+
+            finished[index] = result
+            while next_yield in finished:
+                yield finished.pop(next_yield)
+                next_yield += 1
+
+    finally:  # consumer stopped early
+        for result in list(running.values()) + list(finished.values()):
+            result.close()
+
+
+def benchmark_command_runner(n=100000):
+    """
+    lines/sec through CommandRunner.run, a child prints n lines to stdout
+    """
+    from minghu6.algs.timeme import timeme
+
+    cmd = '"{0}" -c "for i in range({1}): print(i)"'.format(sys.executable, n)
+    with timeme() as t:
+        count = sum(1 for _ in CommandRunner.run(cmd))
+
+    print('{0} lines in {1:.3f}s, {2:.0f} lines/s'.format(count, t.total, count / t.total))
 
 
 # def daemon(cmd, name=None, logger=None, logpath='test.log'):
@@ -216,19 +677,18 @@ def auto_resume(cmd, logdir=os.curdir, name=None, logger=None, debug=True):
     if isinstance(cmd, list):
         cmd = ' '.join(cmd)
 
+    codec = get_locale_codec()
     while True:
-        is_first_line = True
-        for status, line in CommandRunner.run(cmd):
-            if is_first_line:
-                is_first_line = False
-                logger.info('start `%s`'%cmd)
-
+        logger.info('start `%s`'%cmd)
+        mux = CommandMux()
+        mux.add(cmd)
+        for _, status, data in mux:
             if status == 'stderr':
-                logger.debug(line)
-            else:
-                logger.warning(line)
-
-        logger.error('found %s exit...'%cmd)
+                logger.debug(data.strip().decode(codec, errors='ignore'))
+            elif status == 'stdout':
+                logger.warning(data.strip().decode(codec, errors='ignore'))
+            elif status == 'exit':
+                logger.error('found %s exit %s...'%(cmd, data))
 
 
 ################################################################################
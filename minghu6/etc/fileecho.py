@@ -6,11 +6,14 @@
 """
 import _io
 import os
-from collections import deque
+import sqlite3
+import threading
+import time
+from collections import deque, OrderedDict
 
 import cchardet as chardet
 
-__all__ = ['head', 'tail', 'guess_charset']
+__all__ = ['head', 'tail', 'guess_charset', 'CharsetCache', 'charset_cache']
 
 
 def head(fp: [_io.BufferedReader, _io.FileIO], n=5):
@@ -65,7 +68,7 @@ def tail(fp: [_io.BufferedReader, _io.FileIO], n=5):
     return list(n_lines)[-n:]
 
 
-def guess_charset(fp: [_io.BufferedReader, _io.FileIO]):
+def _detect_charset(fp: [_io.BufferedReader, _io.FileIO]):
     if 'b' in fp.mode:
         cr = b'\n'
     else:
@@ -87,3 +90,176 @@ def guess_charset(fp: [_io.BufferedReader, _io.FileIO]):
         return None  # means unknown
     else:
         return detect_tail_result
+
+
+class CharsetCache:
+    """
+    charset detection result cache, keyed by (path, inode, size, mtime)
+    two layers: in-process LRU memo, then a SQLite table in the user cache dir
+    (shared by processes, evict the least recently used rows over `maxsize`).
+    """
+    DB_NAME = 'charset.db'
+    # atime is only written back when older than this (like relatime),
+    # so a read-mostly cache doesn't write the db on every hit
+    ATIME_REFRESH = 24 * 3600
+
+    def __init__(self, path=None, maxsize=100000, memo_size=4096):
+        self.path = path
+        self.maxsize = maxsize
+        self.memo_size = memo_size
+        self.enabled = os.environ.get('MINGHU6_NO_CACHE') is None
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._db_broken = False
+        self._puts = 0
+
+    @staticmethod
+    def make_key(fp):
+        """None if fp isn't a regular file opened by path"""
+        if not isinstance(getattr(fp, 'name', None), str):
+            return None
+
+        try:
+            st = os.fstat(fp.fileno())
+        except (OSError, AttributeError, ValueError):
+            return None
+
+        return os.path.abspath(fp.name), st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _connect(self):
+        if self._db_broken:
+            return None
+
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        try:
+            if self.path is None:
+                from minghu6.etc.path import get_cache_dir
+                self.path = os.path.join(get_cache_dir(), CharsetCache.DB_NAME)
+
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS charset ('
+                         'path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime INTEGER, '
+                         'known INTEGER, encoding TEXT, confidence REAL, language TEXT, '
+                         'atime REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS charset_atime ON charset(atime)')
+            conn.commit()
+        except (sqlite3.Error, OSError):
+            self._db_broken = True  # read-only home etc. keep the memo layer only
+            return None
+
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    def _memo_put(self, key, value):
+        self._memo[key] = value
+        self._memo.move_to_end(key)
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def get(self, key):
+        """:return: (found, result)"""
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return True, self._memo[key]
+
+            conn = self._connect()
+            row = None
+            if conn is not None:
+                try:
+                    row = conn.execute('SELECT known, encoding, confidence, language, atime FROM charset '
+                                       'WHERE path=? AND inode=? AND size=? AND mtime=?', key).fetchone()
+                    now = time.time()
+                    if row is not None and (row[4] is None or now - row[4] > self.ATIME_REFRESH):
+                        conn.execute('UPDATE charset SET atime=? WHERE path=?', (now, key[0]))
+                        conn.commit()
+                except sqlite3.Error:
+                    row = None
+
+            if row is None:
+                self.misses += 1
+                return False, None
+
+            known, encoding, confidence, language, _ = row
+            result = {'encoding': encoding, 'confidence': confidence, 'language': language} if known else None
+            self._memo_put(key, result)
+            self.hits += 1
+            return True, result
+
+    def put(self, key, result):
+        with self._lock:
+            self._memo_put(key, result)
+
+            conn = self._connect()
+            if conn is None:
+                return
+
+            if result is None:
+                values = (0, None, None, None)
+            else:
+                values = (1, result.get('encoding'), result.get('confidence'), result.get('language'))
+
+            try:
+                conn.execute('INSERT OR REPLACE INTO charset VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             key + values + (time.time(),))
+                self._puts += 1
+                if self._puts % 1024 == 0:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, conn):
+        (count,) = conn.execute('SELECT COUNT(*) FROM charset').fetchone()
+        if count > self.maxsize:
+            conn.execute('DELETE FROM charset WHERE path IN '
+                         '(SELECT path FROM charset ORDER BY atime LIMIT ?)', (count - self.maxsize,))
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+            conn = self._connect()
+            if conn is not None:
+                conn.execute('DELETE FROM charset')
+                conn.commit()
+
+    def stat(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+charset_cache = CharsetCache()
+
+
+def guess_charset(fp: [_io.BufferedReader, _io.FileIO], use_cache=True):
+    """
+    detect the charset by 100 head lines and 100 tail lines
+    :param fp:
+    :param use_cache: lookup/store `charset_cache`, set False for `--no-cache`
+    :return: chardet result dict or None (head and tail disagree, means unknown)
+    """
+    key = None
+    if use_cache and charset_cache.enabled:
+        key = CharsetCache.make_key(fp)
+
+    if key is not None:
+        found, result = charset_cache.get(key)
+        if found:
+            return result
+
+    result = _detect_charset(fp)
+
+    if key is not None:
+        charset_cache.put(key, result)
+
+    return result
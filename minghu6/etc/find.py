@@ -7,50 +7,49 @@ Return all files matching a filename pattern at and below a root directory;
 
 custom version of the now deprecated find module in the standard library:
 
-find() is a generator that uses the os.walk() generator to yield just
+find() is a generator that uses the minghu6.etc.walk walker to yield just
 matching filenames: use findlist() to force results list generation;
 ################################################################################
 """
 
-import fnmatch
 import os
-import re
 
 from minghu6.algs.var import isiterable
 from minghu6.etc.version import iswin
 from minghu6.etc.cmd import CommandRunner
+from minghu6.etc.walk import walk_paths
 
 __all__ = ['find', 'findlist']
 
 
-def find(pattern, startdir=os.curdir, regex_match=False):
-    def ismatch(filename, pattern, regex_match):
-        if regex_match and re.fullmatch(string=filename, pattern=pattern) is not None:
-            return True
-        elif fnmatch.fnmatch(name, pattern):
-            return True
-        else:
-            return False
-
-    for (thisDir, subsHere, filesHere) in os.walk(startdir):
-        for name in subsHere + filesHere:
-            match_success = False
-            if isiterable(pattern):
-                for each_pattern in pattern:
-                    if ismatch(name, each_pattern, regex_match):
-                        match_success = True
-                        break
-            else:
-                if ismatch(name, pattern, regex_match):
-                    match_success = True
-
-            if match_success:
-                fullpath = os.path.join(thisDir, name)
-                yield fullpath
-
-
-def findlist(pattern, startdir=os.curdir, dosort=False, regex_match=False):
-    matches = list(find(pattern, startdir, regex_match=regex_match))
+def find(pattern, startdir=os.curdir, regex_match=False, exclude_dirs=None, gitignore=False, threads=1,
+         indexed=False):
+    """
+    :param pattern: glob str or [glob, ...], matched on the name of files and dirs
+    :param startdir:
+    :param regex_match: pattern may also be a regex (re.fullmatch)
+    :param exclude_dirs: glob str or [glob, ...], such dirs are not entered
+    :param gitignore: skip what .gitignore files in the tree ignore
+    :param threads: scan directories on that many threads, results come unordered
+    :param indexed: answer from minghu6.etc.fsindex, updated incrementally first (no gitignore)
+    :return: generator of path
+    """
+    if indexed:
+        if gitignore:
+            raise ValueError('gitignore is not supported by the index')
+
+        from minghu6.etc.fsindex import fs_index
+        prefix_len = len(os.path.abspath(startdir).rstrip(os.sep)) + 1
+        # same path form as walk, relative to startdir if it is
+        return (os.path.join(startdir, path[prefix_len:]) for path in
+                fs_index.paths(startdir, pattern, regex_match, exclude_dirs, dirs=True))
+
+    return walk_paths(startdir, pattern, regex=regex_match, exclude_dirs=exclude_dirs,
+                      gitignore=gitignore, dirs=True, threads=threads)
+
+
+def findlist(pattern, startdir=os.curdir, dosort=False, regex_match=False, **kwargs):
+    matches = list(find(pattern, startdir, regex_match=regex_match, **kwargs))
     if dosort:
         matches.sort()
 
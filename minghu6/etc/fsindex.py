@@ -0,0 +1,379 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+################################################################################
+Filesystem Metadata Index
+
+a SQLite (WAL) table of path/size/mtime/inode/ext/line count in the user cache
+dir, for the tools walking the same trees again and again.
+update() lists again only the directories whose mtime changed (an entry was
+added, removed or renamed), the others are taken from the table as they were.
+a file rewritten in place doesn't touch its directory, use check_files=True
+to re-stat the files of unchanged directories too.
+################################################################################
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from minghu6.etc.walk import compile_patterns
+
+__all__ = ['IndexEntry',
+           'UpdateStat',
+           'FsIndex',
+           'fs_index']
+
+# IndexEntry.kind
+FILE = 'f'
+DIR = 'd'
+OTHER = 'o'
+
+_IndexStat = namedtuple('_IndexStat', ['st_size', 'st_mtime_ns'])
+
+
+class IndexEntry(namedtuple('IndexEntry', ['path', 'name', 'ext', 'kind', 'size', 'mtime', 'lines'])):
+    """
+    kind: 'f' regular file, 'd' dir (or symlink to dir), 'o' others (fifo, socket, broken link...)
+    lines: None until count_lines counted it
+
+    is_dir/is_file/stat are the os.DirEntry ones, code written for minghu6.etc.walk takes it as well
+    """
+    __slots__ = ()
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self.kind == DIR
+
+    def is_file(self, *, follow_symlinks=True):
+        return self.kind == FILE
+
+    def stat(self, *, follow_symlinks=True):
+        return _IndexStat(self.size, self.mtime)
+
+
+UpdateStat = namedtuple('UpdateStat', ['dirs', 'rescanned'])
+
+# a dir changed within this many ns before the scan may change again in the same
+# mtime tick, don't trust its mtime next time (same as git's racy index entries)
+_RACY_NS = 2 * 10 ** 9
+
+_COLUMNS = 'path, name, ext, kind, size, mtime, lines'
+
+
+def _count_lines(path):
+    """
+    :return: (lines, non blank lines), same count as lc
+    """
+    lines = nonblank = 0
+    with open(path, 'rb') as fp:
+        for line in fp:
+            lines += 1
+            if line.strip() != b'':
+                nonblank += 1
+
+    return lines, nonblank
+
+
+def _subtree_range(path):
+    """
+    :return: (low, high), path < p < high for every p below path, a range scan on the primary key
+    """
+    prefix = path.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class FsIndex:
+    """
+    i.e.
+    fs_index.update('/data')
+    fs_index.largest('/data', 10)
+    fs_index.paths('/data', '*.mp4')
+    fs_index.count_lines('/data/src', ['.py', '.c'])
+    """
+    DB_NAME = 'fsindex.db'
+
+    def __init__(self, path=None):
+        """
+        :param path: the db file, default fsindex.db in the user cache dir
+        """
+        self.path = path
+
+        self._lock = threading.RLock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connect(self):
+        if self._conn is not None and self._conn_pid == os.getpid():
+            return self._conn
+
+        if self.path is None:
+            from minghu6.etc.path import get_cache_dir
+            self.path = os.path.join(get_cache_dir(), FsIndex.DB_NAME)
+
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS dirs ('
+                     'path TEXT PRIMARY KEY, parent TEXT, mtime INTEGER)')
+        conn.execute('CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent)')
+        conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                     'path TEXT PRIMARY KEY, dir TEXT, name TEXT, ext TEXT, kind TEXT, '
+                     'size INTEGER, mtime INTEGER, inode INTEGER, lines INTEGER, nonblank_lines INTEGER)')
+        conn.execute('CREATE INDEX IF NOT EXISTS files_dir ON files(dir)')
+        conn.commit()
+
+        self._conn = conn
+        self._conn_pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _remove_subtree(conn, path, itself=True):
+        low, high = _subtree_range(path)
+        for table in ('files', 'dirs'):
+            conn.execute('DELETE FROM {0} WHERE (path=? AND ?) OR (path>? AND path<?)'.format(table),
+                         (path, itself, low, high))
+
+    def _mark_unlisted(self, conn, dirpath, parent):
+        """
+        a dir that can't be listed (permission, race) has no known contents,
+        its row stays with a NULL (stale) mtime, so the next update tries it again
+        """
+        self._remove_subtree(conn, dirpath, itself=False)
+        conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, NULL)', (dirpath, parent))
+
+    @staticmethod
+    def _entry_row(entry, dirpath):
+        try:
+            is_dir = entry.is_dir()
+            st = entry.stat()
+            kind = DIR if is_dir else FILE if entry.is_file() else OTHER
+        except OSError:  # broken link
+            is_dir = False
+            st = entry.stat(follow_symlinks=False)
+            kind = OTHER
+
+        name = entry.name
+        ext = '' if is_dir else os.path.splitext(name)[1]
+        return is_dir, (entry.path, dirpath, name, ext, kind, st.st_size, st.st_mtime_ns, st.st_ino)
+
+    _UPSERT = ('INSERT INTO files (path, dir, name, ext, kind, size, mtime, inode) '
+               'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+               'ON CONFLICT(path) DO UPDATE SET '
+               'ext=excluded.ext, kind=excluded.kind, size=excluded.size, mtime=excluded.mtime, '
+               'inode=excluded.inode, '
+               # line count of an unchanged file is kept
+               'lines=CASE WHEN (files.size, files.mtime, files.inode) = '
+               '(excluded.size, excluded.mtime, excluded.inode) THEN files.lines END, '
+               'nonblank_lines=CASE WHEN (files.size, files.mtime, files.inode) = '
+               '(excluded.size, excluded.mtime, excluded.inode) THEN files.nonblank_lines END')
+
+    def _rescan(self, conn, dirpath, parent, st, start_ns):
+        """
+        :return: subdirs to visit
+        """
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError):
+            self._remove_subtree(conn, dirpath)
+            return []
+        except OSError:
+            self._mark_unlisted(conn, dirpath, parent)
+            return []
+
+        rows = []
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir, row = self._entry_row(entry, dirpath)
+            except OSError:  # vanished
+                continue
+
+            rows.append(row)
+            if is_dir and not entry.is_symlink():
+                subdirs.append(entry.path)
+
+        current = set(row[0] for row in rows)
+        for (path,) in conn.execute('SELECT path FROM files WHERE dir=?', (dirpath,)).fetchall():
+            if path not in current:
+                self._remove_subtree(conn, path)
+
+        conn.executemany(FsIndex._UPSERT, rows)
+
+        mtime = st.st_mtime_ns if st.st_mtime_ns < start_ns - _RACY_NS else None
+        conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)', (dirpath, parent, mtime))
+
+        return subdirs
+
+    def _restat(self, conn, dirpath):
+        rows = []
+        for path, size, mtime, inode in conn.execute(
+                'SELECT path, size, mtime, inode FROM files WHERE dir=?', (dirpath,)).fetchall():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # removed, then the dir mtime changed too
+
+            if (st.st_size, st.st_mtime_ns, st.st_ino) != (size, mtime, inode):
+                rows.append((st.st_size, st.st_mtime_ns, st.st_ino, path))
+
+        conn.executemany('UPDATE files SET size=?, mtime=?, inode=?, lines=NULL, nonblank_lines=NULL '
+                         'WHERE path=?', rows)
+
+    def update(self, root, check_files=False):
+        """
+        bring the index of the tree under root up to date
+
+        :param root: dir
+        :param check_files: re-stat files in unchanged dirs, catch files rewritten in place
+        :return: UpdateStat(dirs visited, dirs listed again)
+        """
+        root = os.path.abspath(root)
+        start_ns = time.time_ns()
+        visited = rescanned = 0
+
+        with self._lock:
+            conn = self._connect()
+            with conn:  # one transaction
+                stack = [(root, os.path.dirname(root))]
+                while stack:
+                    dirpath, parent = stack.pop()
+                    visited += 1
+                    try:
+                        st = os.stat(dirpath)
+                    except (FileNotFoundError, NotADirectoryError):
+                        self._remove_subtree(conn, dirpath)
+                        continue
+                    except OSError:
+                        self._mark_unlisted(conn, dirpath, parent)
+                        continue
+
+                    row = conn.execute('SELECT mtime FROM dirs WHERE path=?', (dirpath,)).fetchone()
+                    if row is not None and row[0] == st.st_mtime_ns:
+                        if check_files:
+                            self._restat(conn, dirpath)
+                        subdirs = [path for (path,) in
+                                   conn.execute('SELECT path FROM dirs WHERE parent=?', (dirpath,))]
+                    else:
+                        rescanned += 1
+                        subdirs = self._rescan(conn, dirpath, parent, st, start_ns)
+
+                    stack.extend((subdir, dirpath) for subdir in subdirs)
+
+        return UpdateStat(visited, rescanned)
+
+    def _query(self, root, kinds, patterns=None, regex=False, exclude_dirs=None, ext=None,
+               columns=_COLUMNS, tail='', params=()):
+        root = os.path.abspath(root)
+        low, high = _subtree_range(root)
+        conn = self._connect()
+
+        sql = ['SELECT {0} FROM files WHERE path>? AND path<? AND kind IN ({1})'.format(
+            columns, ','.join('?' * len(kinds)))]
+        args = [low, high] + kinds
+
+        if ext is not None:
+            sql.append('AND ext IN ({0})'.format(','.join('?' * len(ext))))
+            args.extend(ext)
+
+        match = compile_patterns(patterns, regex)
+        if match is not None:
+            conn.create_function('minghu6_match', 1, lambda name: match(name) is not None,
+                                 deterministic=True)
+            sql.append('AND minghu6_match(name)')
+
+        exclude_dir = compile_patterns(exclude_dirs)
+        if exclude_dir is not None:
+            # same as walk: an excluded dir isn't entered nor yielded
+            def kept(path, kind):
+                parts = path[len(low):].split(os.sep)
+                if kind != DIR:
+                    parts.pop()
+                return not any(exclude_dir(part) for part in parts)
+
+            conn.create_function('minghu6_kept', 2, kept, deterministic=True)
+            sql.append('AND minghu6_kept(path, kind)')
+
+        sql.append(tail)
+        return conn.execute(' '.join(sql), args + list(params))
+
+    def entries(self, root, patterns=None, regex=False, exclude_dirs=None, files=True, dirs=False,
+                update=True, check_files=False):
+        """
+        :param root: dir, not included itself
+        :param patterns: glob str or [glob, ...] on the name, see minghu6.etc.walk.walk
+        :param regex: patterns may also be regex
+        :param exclude_dirs: glob str or [glob, ...]
+        :param files: include files (anything not a dir, see IndexEntry.kind)
+        :param dirs: include dirs
+        :param update: update the index of root first
+        :param check_files: see update, needed for fresh sizes of files grown in place (logs)
+        :return: [IndexEntry, ...] ordered by path
+        """
+        with self._lock:
+            if update:
+                self.update(root, check_files)
+            kinds = ([FILE, OTHER] if files else []) + ([DIR] if dirs else [])
+            return [IndexEntry(*row) for row in
+                    self._query(root, kinds, patterns, regex, exclude_dirs, tail='ORDER BY path')]
+
+    def paths(self, root, patterns=None, regex=False, exclude_dirs=None, files=True, dirs=False,
+              update=True):
+        """
+        same as entries, but path str only
+        """
+        return [entry.path for entry in
+                self.entries(root, patterns, regex, exclude_dirs, files, dirs, update)]
+
+    def largest(self, root, n=10, patterns=None, regex=False, exclude_dirs=None, update=True):
+        """
+        :return: [IndexEntry, ...] of the n largest regular files, largest first
+        """
+        with self._lock:
+            if update:
+                # a file grown in place keeps its dir mtime
+                self.update(root, check_files=True)
+            return [IndexEntry(*row) for row in
+                    self._query(root, [FILE], patterns, regex, exclude_dirs,
+                                tail='ORDER BY size DESC, path LIMIT ?', params=(n,))]
+
+    def count_lines(self, root, ext=None, ignore_blank=False, exclude_dirs=None, update=True):
+        """
+        line count regular files missing it, then sum by ext
+
+        :param ext: [ext, ...] such as ['.py', '.c'], None means all
+        :param ignore_blank: don't count blank lines
+        :return: {ext: lines}
+        """
+        with self._lock:
+            if update:
+                # a file rewritten in place keeps its dir mtime
+                self.update(root, check_files=True)
+
+            conn = self._connect()
+            missing = [path for (path,) in self._query(root, [FILE], exclude_dirs=exclude_dirs, ext=ext,
+                                                       columns='path', tail='AND lines IS NULL')]
+            counted = []
+            for path in missing:
+                try:
+                    counted.append(_count_lines(path) + (path,))
+                except OSError:
+                    counted.append((0, 0, path))
+            with conn:
+                conn.executemany('UPDATE files SET lines=?, nonblank_lines=? WHERE path=?', counted)
+
+            column = 'nonblank_lines' if ignore_blank else 'lines'
+            return dict(self._query(root, [FILE], exclude_dirs=exclude_dirs, ext=ext,
+                                    columns='ext, SUM({0})'.format(column), tail='GROUP BY ext'))
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM files')
+                conn.execute('DELETE FROM dirs')
+
+
+fs_index = FsIndex()
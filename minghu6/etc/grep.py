@@ -0,0 +1,286 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+################################################################################
+Grep Engine
+
+compile the pattern once (per file encoding), memory-map each file and search
+the whole buffer, then map the match offsets back to line numbers.
+files can be fanned out across a process pool, results come back in order.
+################################################################################
+"""
+import mmap
+import os
+import re
+import time
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from minghu6.algs.metrics import registry, timed
+from minghu6.etc.fileecho import guess_charset, charset_cache
+from minghu6.etc.walk import walk
+
+__all__ = ['GrepResultTuple',
+           'GrepStat',
+           'grep_file',
+           'grep_files',
+           'walk_files']
+
+GrepResultTuple = namedtuple('GrepResultTuple', ['content', 'path', 'line'])
+
+# encodings whose newline isn't a single b'\n' byte, search decoded text instead
+_WIDE_CODEC_PREFIX = ('utf-16', 'utf_16', 'utf-32', 'utf_32')
+
+
+class GrepStat:
+    """files and bytes scanned, for throughput report"""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.start = time.time()
+        self.end = None
+
+    def update(self, size, cache_hits=0, cache_misses=0):
+        self.files += 1
+        self.bytes += size
+        self.cache_hits += cache_hits
+        self.cache_misses += cache_misses
+
+    def stop(self):
+        self.end = time.time()
+
+    @property
+    def elapsed(self):
+        end = self.end if self.end is not None else time.time()
+        return max(end - self.start, 1e-9)
+
+    @property
+    def files_per_sec(self):
+        return self.files / self.elapsed
+
+    @property
+    def bytes_per_sec(self):
+        return self.bytes / self.elapsed
+
+    def __str__(self):
+        return ('{0} files, {1} bytes in {2:.3f}s ({3:.1f} files/s, {4:.1f} bytes/s), '
+                'charset cache {5} hits {6} misses').format(
+            self.files, self.bytes, self.elapsed, self.files_per_sec, self.bytes_per_sec,
+            self.cache_hits, self.cache_misses)
+
+
+def _is_plain_ascii(pattern):
+    """
+    ascii literals, anchors, groups, alternation and quantifiers only,
+    nothing whose meaning on bytes differs from on non-ascii text (\\w, ., [...], (?i) ...)
+    """
+    if not pattern.isascii():
+        return False
+
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            if i + 1 < n and pattern[i + 1].isalnum():  # \w \d \s \b \1 ...
+                return False
+            i += 2
+            continue
+        if c in '.[':
+            return False
+        if c == '(' and pattern.startswith('?', i + 1) and not pattern.startswith('?:', i + 1):
+            return False
+        i += 1
+
+    return True
+
+
+@lru_cache(maxsize=64)
+def _compile(pattern, encoding):
+    """
+    :return: (bytes regex over the raw buffer, str regex for one line)
+             bytes regex is None if pattern can't be searched on the raw bytes as is
+    """
+    line_regex = re.compile(pattern)
+    if encoding.lower().startswith(_WIDE_CODEC_PREFIX) or not _is_plain_ascii(pattern):
+        return None, line_regex
+
+    try:
+        buffer_regex = re.compile(pattern.encode(encoding), re.MULTILINE)
+    except (UnicodeEncodeError, LookupError, re.error):
+        buffer_regex = None
+
+    return buffer_regex, line_regex
+
+
+def _guess_encoding(fp, use_cache=True):
+    result = guess_charset(fp, use_cache=use_cache)
+    if result is None:
+        return None
+
+    encoding = result['encoding']
+    if encoding is None:
+        encoding = 'latin-1'
+
+    return encoding
+
+
+def _grep_text(text, line_regex, name):
+    # lines end at '\n' only, as _grep_buffer counts them (str.splitlines also splits at '\r', '\x0c' ...)
+    lines = text.split('\n')
+    last = lines.pop()
+    for i, line in enumerate(lines):
+        line += '\n'
+        if line_regex.search(line) is not None:
+            yield GrepResultTuple(line, name, i + 1)
+
+    if last and line_regex.search(last) is not None:
+        yield GrepResultTuple(last, name, len(lines) + 1)
+
+
+def _grep_buffer(buf, buffer_regex, line_regex, encoding, name):
+    """
+    candidate matches come from the whole-buffer regex,
+    each one is verified on its own line so the result is the same as line-by-line search
+    """
+    size = len(buf)
+    lineno = 1
+    counted_to = 0  # newlines have been counted in buf[:counted_to]
+    pos = 0
+
+    while pos < size:
+        m = buffer_regex.search(buf, pos)
+        if m is None:
+            break
+
+        line_start = buf.rfind(b'\n', 0, m.start()) + 1
+        line_end = buf.find(b'\n', m.start())
+        line_end = size if line_end == -1 else line_end + 1
+
+        lineno += buf[counted_to:line_start].count(b'\n')
+        counted_to = line_start
+
+        line = buf[line_start:line_end].decode(encoding, 'ignore')
+        if line_regex.search(line) is not None:
+            yield GrepResultTuple(line, name, lineno)
+
+        pos = line_end
+
+
+@timed('grep.grep_file')
+def grep_file(pattern, path, use_cache=True):
+    """
+    :param pattern: regex str
+    :param path: file path
+    :param use_cache: use the charset detection cache
+    :return: ([GrepResultTuple, ...], scanned bytes, (charset cache hits, misses))
+    """
+    name = os.path.basename(path)
+    hits, misses = charset_cache.hits, charset_cache.misses
+    results, size = _grep_file(pattern, path, name, use_cache)
+
+    return results, size, (charset_cache.hits - hits, charset_cache.misses - misses)
+
+
+def _grep_file(pattern, path, name, use_cache):
+    try:
+        with open(path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                return [], 0
+
+            encoding = _guess_encoding(fp, use_cache)
+            if encoding is None:
+                return [], size
+
+            buffer_regex, line_regex = _compile(pattern, encoding)
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if buffer_regex is None:
+                    text = buf[:].decode(encoding, 'ignore')
+                    results = list(_grep_text(text, line_regex, name))
+                else:
+                    results = list(_grep_buffer(buf, buffer_regex, line_regex, encoding, name))
+
+    except (OSError, ValueError):  # permission denied, file vanished, can't be mapped
+        return [], 0
+
+    return results, size
+
+
+def walk_files(file_patterns, startdir=os.curdir, exclude_dirs=None, gitignore=False, threads=1,
+               indexed=False):
+    """
+    :param indexed: list files from minghu6.etc.fsindex, updated incrementally first (no gitignore)
+    :return: generator of regular file path (no fifo, socket, broken link) matching file_patterns
+    """
+    if indexed:
+        if gitignore:
+            raise ValueError('gitignore is not supported by the index')
+
+        from minghu6.etc.fsindex import fs_index
+        entries = fs_index.entries(startdir, file_patterns, exclude_dirs=exclude_dirs)
+    else:
+        entries = walk(startdir, file_patterns, exclude_dirs=exclude_dirs, gitignore=gitignore,
+                       threads=threads)
+
+    for entry in entries:
+        if entry.is_file():
+            yield entry.path
+
+
+def _grep_file_worker(pattern, path, use_cache, metrics_enabled):
+    """grep_file in a worker process, its metrics are sent back to be merged by the parent"""
+    registry.enabled = metrics_enabled
+    registry.drain()  # drop whatever a forked worker inherited from the parent
+    result = grep_file(pattern, path, use_cache)
+
+    return result, registry.drain()
+
+
+def grep_files(pattern, paths, jobs=1, stat=None, use_cache=True):
+    """
+    :param pattern: regex str
+    :param paths: iterable of file path
+    :param jobs: number of worker processes, 1 means search in current process
+    :param stat: GrepStat, updated while searching
+    :param use_cache: use the charset detection cache
+    :return: generator of GrepResultTuple, in the order of paths
+    """
+    re.compile(pattern)  # fail fast on bad pattern, in the caller's process
+
+    if jobs is None or jobs <= 1:
+        for path in paths:
+            results, size, cache_stat = grep_file(pattern, path, use_cache)
+            if stat is not None:
+                stat.update(size, *cache_stat)
+            yield from results
+
+    else:
+        window = jobs * 4  # bound the number of in-flight files
+        pending = deque()
+
+        def collect(future):
+            (results, size, cache_stat), timings = future.result()
+            registry.merge(timings)
+            if stat is not None:
+                stat.update(size, *cache_stat)
+            return results
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for path in paths:
+                pending.append(executor.submit(_grep_file_worker, pattern, path, use_cache,
+                                               registry.enabled))
+                if len(pending) < window:
+                    continue
+
+                yield from collect(pending.popleft())
+
+            while pending:
+                yield from collect(pending.popleft())
+
+    if stat is not None:
+        stat.stop()
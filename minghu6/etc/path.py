@@ -18,7 +18,8 @@ __all__ = ['get_cwd_pre_dir',
            'add_parent_path',
            'isempty_dir',
            'isempty_file',
-           'add_postfix']
+           'add_postfix',
+           'get_cache_dir']
 
 
 ################################################################################
@@ -92,6 +93,22 @@ def get_home_dir():
     return os.path.expanduser('~')
 
 
+def get_cache_dir(name='minghu6'):
+    """
+    per-user cache directory, created if not exists
+    Windows: %LOCALAPPDATA%\\<name>, others: $XDG_CACHE_HOME/<name> (default ~/.cache/<name>)
+    """
+    if iswin():
+        base = os.environ.get('LOCALAPPDATA', os.path.join(os.path.expanduser('~'), 'AppData', 'Local'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+
+    path = os.path.join(base, name)
+    ensure_dir_exists(path)
+
+    return path
+
+
 def get_drivers():
     if not iswin():
         raise OSError('only support in Windows')
@@ -6,11 +6,9 @@
 """
 import os
 import re
-from collections import namedtuple
-from fnmatch import fnmatch
 
-from minghu6.etc.fileecho import guess_charset
 from minghu6.etc.find import find
+from minghu6.etc.grep import GrepResultTuple, grep_files, walk_files
 
 __all__ = ['find',
            'cut',
@@ -39,20 +37,19 @@ def sed(stream, cmd):
     return stream
 
 
-GrepResultTuple = namedtuple('GrepResultTuple', ['content', 'path', 'line'])
-
-
-def grep(pattern, file_patterns, startdir=os.curdir):
-    for (thisDir, subsHere, filesHere) in os.walk(startdir):
-        for name in filesHere:
-            fullpath = os.path.join(thisDir, name)
-            if os.path.isfile(fullpath) and any([fnmatch(name, file_pattern) for file_pattern in file_patterns]):
-                result = guess_charset(open(fullpath, 'rb'))
-                if result is None: continue
-                encoding = result['encoding']
-                if encoding is None:
-                    encoding = 'latin-1'
-                for i, line in enumerate(open(fullpath, 'rb')):
-                    line = line.decode(encoding, 'ignore')
-                    if re.search(pattern, line) is not None:
-                        yield GrepResultTuple(line, name, i + 1)
+def grep(pattern, file_patterns, startdir=os.curdir, jobs=1, stat=None, use_cache=True,
+         exclude_dirs=None, gitignore=False, indexed=False):
+    """
+    :param pattern: regex str, matched line by line
+    :param file_patterns: [fnmatch pattern, ...]
+    :param startdir:
+    :param jobs: number of worker processes
+    :param stat: minghu6.etc.grep.GrepStat, collect files/bytes throughput
+    :param use_cache: use the charset detection cache
+    :param exclude_dirs: [fnmatch pattern, ...], such dirs are not entered
+    :param gitignore: skip what .gitignore files in the tree ignore
+    :param indexed: list files from minghu6.etc.fsindex (no gitignore)
+    :return: generator of GrepResultTuple
+    """
+    paths = walk_files(file_patterns, startdir, exclude_dirs, gitignore, indexed=indexed)
+    return grep_files(pattern, paths, jobs=jobs, stat=stat, use_cache=use_cache)
@@ -0,0 +1,308 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+################################################################################
+Directory Walker
+
+os.scandir based, the DirEntry (and its cached type/stat) is what comes out.
+all glob/regex name patterns are folded into one compiled alternation,
+whole subtrees are pruned by --exclude-dir globs and .gitignore rules,
+directories can be scanned concurrently on a thread pool (network filesystems).
+################################################################################
+"""
+import fnmatch
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+
+from minghu6.algs.var import isiterable
+
+__all__ = ['compile_patterns',
+           'GitIgnore',
+           'walk',
+           'walk_paths',
+           'benchmark']
+
+# fnmatch.fnmatch compares os.path.normcase-d names
+_CASE_INSENSITIVE = os.path.normcase('A') == 'a'
+
+
+@lru_cache(maxsize=64)
+def _compile_patterns(patterns, regex):
+    # globs translate to plain regex, safe to fold into one alternation
+    globs = []
+    for pattern in patterns:
+        glob = fnmatch.translate(pattern)
+        globs.append('(?i:{0})'.format(glob) if _CASE_INSENSITIVE else glob)
+    glob_match = re.compile('|'.join(globs), re.DOTALL).fullmatch
+
+    if not regex:
+        return glob_match
+
+    # user regexes keep their own inline flags, group numbers and names, so compiled one by one
+    regex_matches = [re.compile(pattern).fullmatch for pattern in patterns]
+
+    def match(name):
+        # regex_match of etc.find: a regex, or else a glob
+        for regex_match in regex_matches:
+            m = regex_match(name)
+            if m is not None:
+                return m
+
+        return glob_match(name)
+
+    return match
+
+
+def compile_patterns(patterns, regex=False):
+    """
+    :param patterns: glob (or regex if regex is True) str, or list of them, None means all
+    :param regex: each pattern is tried as a regex (re.fullmatch) before as a glob
+    :return: match(name) -> match object or None, None if patterns is None
+    """
+    if patterns is None:
+        return None
+    if not isiterable(patterns):
+        patterns = [patterns]
+
+    return _compile_patterns(tuple(patterns), bool(regex))
+
+
+def _gitignore_regex(pattern):
+    """
+    one .gitignore line (no '!', no trailing '/') to a regex on the '/' separated relative path
+    """
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    i, n = 0, len(pattern)
+    res = [] if anchored else ['(?:.*/)?']
+    while i < n:
+        if pattern.startswith('**/', i):
+            res.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            res.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            res.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            res.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and pattern.find(']', i + 2) != -1:
+            j = pattern.find(']', i + 2)
+            body = pattern[i + 1:j]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            res.append('[{0}]'.format(body.replace('\\', '\\\\')))
+            i = j + 1
+        else:
+            if pattern[i] == '\\' and i + 1 < n:
+                i += 1
+            res.append(re.escape(pattern[i]))
+            i += 1
+
+    return re.compile(''.join(res), re.DOTALL)
+
+
+class GitIgnore:
+    """
+    the .gitignore rules in effect for one directory, itself and its ancestors' ones
+
+    a later rule wins over an earlier one, a child dir's rules come after its parent's
+    """
+
+    def __init__(self, lines=(), base='', parent=None):
+        """
+        :param lines: lines of a .gitignore
+        :param base: '/' separated path of its directory, relative to the walk root
+        :param parent: GitIgnore of the parent directory
+        """
+        self.parent = parent
+        self.base = base
+        self.rules = []  # [(regex, negate, dir_only), ...]
+
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if not line.endswith('\\ '):
+                line = line.rstrip(' ')
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            if dir_only:
+                line = line.rstrip('/')
+            if line:
+                self.rules.append((_gitignore_regex(line), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path, base='', parent=None):
+        try:
+            with open(path, encoding='utf-8', errors='ignore') as fp:
+                return cls(fp, base, parent)
+        except OSError:
+            return parent
+
+    def ignored(self, relpath, is_dir):
+        """
+        :param relpath: '/' separated path relative to the walk root
+        :param is_dir:
+        :return: bool
+        """
+        decision = None
+        node = self
+        while node is not None and decision is None:
+            if node.base:
+                if not relpath.startswith(node.base + '/'):
+                    node = node.parent
+                    continue
+                path = relpath[len(node.base) + 1:]
+            else:
+                path = relpath
+
+            for regex, negate, dir_only in reversed(node.rules):
+                # files below an ignored dir are never reached, the walk prunes the dir
+                if (is_dir or not dir_only) and regex.fullmatch(path) is not None:
+                    decision = not negate
+                    break
+
+            node = node.parent
+
+        return bool(decision)
+
+
+def _scan_dir(path, relpath, ignore, options):
+    """
+    :return: ([matched DirEntry, ...], [(subdir path, relpath, GitIgnore), ...])
+    """
+    match, exclude_dir, files, dirs, gitignore, follow_symlinks, onerror = options
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError as ex:
+        if onerror is not None:
+            onerror(ex)
+        return [], []
+
+    if gitignore and any(entry.name == '.gitignore' for entry in entries):
+        ignore = GitIgnore.from_file(os.path.join(path, '.gitignore'), relpath, ignore)
+
+    matches = []
+    subdirs = []
+    for entry in entries:
+        name = entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if gitignore:
+            if is_dir and name == '.git':
+                continue
+            entry_relpath = relpath + '/' + name if relpath else name
+            if ignore is not None and ignore.ignored(entry_relpath, is_dir):
+                continue
+        else:
+            entry_relpath = None
+
+        if is_dir:
+            if exclude_dir is not None and exclude_dir(name):
+                continue
+            if follow_symlinks or not entry.is_symlink():
+                subdirs.append((entry.path, entry_relpath, ignore))
+            if dirs and (match is None or match(name)):
+                matches.append(entry)
+
+        elif files and (match is None or match(name)):
+            matches.append(entry)
+
+    return matches, subdirs
+
+
+def walk(startdir=os.curdir, patterns=None, regex=False, exclude_dirs=None, gitignore=False,
+         files=True, dirs=False, threads=1, follow_symlinks=False, onerror=None):
+    """
+    :param startdir: not yielded itself
+    :param patterns: glob str or [glob, ...] on the name, None means all
+    :param regex: patterns may also be regex, see compile_patterns
+    :param exclude_dirs: glob str or [glob, ...], matched dirs are not entered (nor yielded)
+    :param gitignore: honour .gitignore files found in the tree, and skip .git
+    :param files: yield files (anything not a dir)
+    :param dirs: yield dirs
+    :param threads: > 1 scan directories concurrently, results come in completion order
+    :param follow_symlinks: enter symlinked dirs
+    :param onerror: called with the OSError of a dir can't be listed
+    :return: generator of os.DirEntry, pre-order, dir contents before its subdirs
+    """
+    options = (compile_patterns(patterns, regex),
+               compile_patterns(exclude_dirs),
+               files, dirs, gitignore, follow_symlinks, onerror)
+    root = (startdir, '', None)
+
+    if threads is None or threads <= 1:
+        stack = [root]
+        while stack:
+            matches, subdirs = _scan_dir(*stack.pop(), options)
+            yield from matches
+            stack.extend(reversed(subdirs))
+
+        return
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    pending = set()
+    try:
+        pending = {executor.submit(_scan_dir, *root, options)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(executor.submit(_scan_dir, *subdir, options))
+
+                yield from matches
+
+    finally:  # consumer stopped early
+        # no shutdown(cancel_futures=True) before python 3.9
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def walk_paths(*args, **kwargs):
+    """
+    same as walk, but yield the path str
+    """
+    for entry in walk(*args, **kwargs):
+        yield entry.path
+
+
+def benchmark(startdir=os.curdir, patterns=('*.py', '*.txt', '*.md'), threads=4):
+    """
+    the old os.walk + fnmatch per pattern loop against walk
+    """
+    from minghu6.algs.timeme import timeme
+
+    def os_walk():
+        for this_dir, subs_here, files_here in os.walk(startdir):
+            for name in subs_here + files_here:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                    yield os.path.join(this_dir, name)
+
+    for name, func in [('os.walk + fnmatch', os_walk),
+                       ('walk', lambda: walk_paths(startdir, patterns, dirs=True)),
+                       ('walk, {0} threads'.format(threads),
+                        lambda: walk_paths(startdir, patterns, dirs=True, threads=threads))]:
+        with timeme() as t:
+            n = sum(1 for _ in func())
+
+        print('{0:<20} {1} matches in {2:.3f}s'.format(name, n, t.total))
+
+
+if __name__ == '__main__':
+    benchmark()
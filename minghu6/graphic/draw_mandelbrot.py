@@ -9,63 +9,177 @@ global 1.g_size:graphic size
        3.draw_func: which graphic func will gonna be called
 ################################################################################
 """
-from math import log
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from math import log, log2, floor
+from multiprocessing import shared_memory
 
 import numpy as np
-import pylab as pl
-from matplotlib import cm
 
 from minghu6.algs.timeme import timeme
 from minghu6.etc.importer import check_module
 
 check_module('matplotlib')
 check_module('numpy')
-check_module('mpi4py')
 
-__all__ = ['draw_mandelbrot', 'draw_mandelbrot_2',
-           'draw_mandelbrot_mpich', 'draw_MandelbrotSet']
+__all__ = ['escape_time', 'mandelbrot_tile', 'mandelbrot_array',
+           'mandelbrot_array_pool', 'mandelbrot_array_cached', 'render_progressive',
+           'TileCache', 'tile_cache', 'zoom_level',
+           'iter_tiles', 'tile_bounds',
+           'show_mandelbrot', 'benchmark',
+           'draw_mandelbrot', 'draw_mandelbrot_2',
+           'draw_mandelbrot_mpich', 'draw_mandelbrot_pool', 'draw_mandelbrot_progressive',
+           'draw_MandelbrotSet']
 
 
+################################################################################
+# Vectorized Escape-time Engine (no pylab, can be benchmarked headless)
+################################################################################
 
+def escape_time(z0, C=0, power=2, escape_radius=2, iter_num=100):
+    """
+    z_k+1 = z_k^power + C, z_0 = z0
+    each step only iterate the points which haven't escaped.
 
+    :param z0: complex ndarray
+    :param C: complex constant, or None means C = z0 (the classic Mandelbrot set)
+    :return: float ndarray same shape as z0, smooth (normalized) escape iteration,
+             `iter_num` for the points never escaped
+    """
+    shape = np.shape(z0)
+    z = np.array(z0, dtype=np.complex128).ravel()
+    if C is None:
+        c = z.copy()
+    else:
+        c = np.complex128(C)
 
-def draw_mandelbrot(C=0, power=1 + 5j, N=800,
-                    cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100):
+    smooth_iter = np.full(z.size, iter_num, dtype=np.float64)
+    index = np.arange(z.size)
+    escape_radius2 = escape_radius * escape_radius
+    # base of the normalization, log(log|z|)/log|power| makes the iteration continuous
+    log_base = log(abs(power)) if abs(power) > 1 else log(2)
+
+    with np.errstate(all='ignore'):
+        for i in range(1, iter_num):
+            abs2 = z.real * z.real + z.imag * z.imag
+            escaped = ~(abs2 <= escape_radius2)  # overflow to nan counts as escaped
+            if escaped.any():
+                absz = np.sqrt(abs2[escaped])
+                mu = np.full(absz.size, float(i))
+                normalize = np.isfinite(absz) & (absz > 2.0)
+                mu[normalize] -= np.log(np.log(absz[normalize]) / log(2)) / log_base
+                smooth_iter[index[escaped]] = mu
+
+                alive = ~escaped
+                z, index = z[alive], index[alive]
+                if C is None:
+                    c = c[alive]
+
+                if z.size == 0:
+                    break
+
+            z = z ** power + c
+
+    return smooth_iter.reshape(shape)
+
+
+def mandelbrot_tile(x0, x1, y0, y1, width, height, C=0, power=2,
+                    escape_radius=2, iter_num=100):
     """
-    绘制点(cx, cy)附近正负d的范围的Mandelbrot
+    compute only by the tile bounds, x0, x1 (y0, y1) are the first and last sample coordinates.
+    :return: float ndarray shape (height, width)
     """
+    y, x = np.ogrid[y0:y1:height * 1j, x0:x1:width * 1j]
+    z0 = x + y * 1j
 
-    with timeme() as t:
-        x0, x1, y0, y1 = cx - d, cx + d, cy - d, cy + d
-        y, x = np.ogrid[y0:y1:N * 1j, x0:x1:N * 1j]
-        z0 = x + y * 1j
+    return escape_time(z0, C=C, power=power, escape_radius=escape_radius, iter_num=iter_num)
 
-        def smooth_iter_point(z0, c):
 
-            z = z0  # 赋初值
+def iter_tiles(N, tile_size=256):
+    """
+    split N*N plane into tiles
+    :return: generator of (row_start, row_end, col_start, col_end)
+    """
+    for row_start in range(0, N, tile_size):
+        for col_start in range(0, N, tile_size):
+            yield (row_start, min(row_start + tile_size, N),
+                   col_start, min(col_start + tile_size, N))
 
-            for i in range(1, iter_num):
-                if abs(z) > escape_radius: break
-                z = z ** power + c  # **运算符是幂运算
-            # 下面是重新计算迭代次数，可以获取连续的迭代次数（即正规化）
 
-            absz = abs(z)  # 复数的模
-            if absz > 2.0:
-                mu = iter_num - log(log(abs(z), 2), 2)
-            else:
-                mu = iter_num
+def tile_bounds(tile, N, x0, x1, y0, y1):
+    """coordinate bounds of the tile on the N*N sample grid of [x0, x1] * [y0, y1]"""
+    row_start, row_end, col_start, col_end = tile
+    step_x = (x1 - x0) / (N - 1) if N > 1 else 0
+    step_y = (y1 - y0) / (N - 1) if N > 1 else 0
 
-            return mu  # 返回正规化的迭代次数
+    return (x0 + col_start * step_x, x0 + (col_end - 1) * step_x,
+            y0 + row_start * step_y, y0 + (row_end - 1) * step_y)
 
-        smooth_mand = np.frompyfunc(smooth_iter_point, 2, 1)(z0, C).astype(np.float)
 
-    print(t)
-    pl.gca().set_axis_off()
-    pl.imshow(smooth_mand, extent=[x0, x1, y1, y0])
+def mandelbrot_array(C=0, power=2, N=800,
+                     cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100, tile_size=256):
+    """
+    compute Mandelbrot near the point(cx, cy) +-d tile by tile,
+    working set is bounded by tile_size * tile_size
+
+    :return: (smooth_mand: N*N float ndarray, extent: [x0, x1, y1, y0] for imshow)
+    """
+    x0, x1, y0, y1 = cx - d, cx + d, cy - d, cy + d
+    smooth_mand = np.empty((N, N), dtype=np.float64)
 
+    for tile in iter_tiles(N, tile_size):
+        row_start, row_end, col_start, col_end = tile
+        smooth_mand[row_start:row_end, col_start:col_end] = mandelbrot_tile(
+            *tile_bounds(tile, N, x0, x1, y0, y1),
+            width=col_end - col_start, height=row_end - row_start,
+            C=C, power=power, escape_radius=escape_radius, iter_num=iter_num)
+
+    return smooth_mand, [x0, x1, y1, y0]
+
+
+def benchmark(N_list=(200, 400, 800, 1600), C=1 + 5j, power=2, iter_num=100, jobs=None):
+    """
+    time mandelbrot_array headless, print pixels/s for each N
+    jobs is not None means benchmark mandelbrot_array_pool too
+    """
+    for N in N_list:
+        with timeme() as t:
+            mandelbrot_array(C=C, power=power, N=N, iter_num=iter_num)
+
+        print('N={0:<6d} {1:>10.4f}s {2:>14.1f} pixels/s'.format(N, t.total, N * N / max(t.total, 1e-9)))
+
+        if jobs is not None:
+            with timeme() as t:
+                mandelbrot_array_pool(C=C, power=power, N=N, iter_num=iter_num, jobs=jobs)
+
+            print('N={0:<6d} {1:>10.4f}s {2:>14.1f} pixels/s (pool, {3} jobs)'.format(
+                N, t.total, N * N / max(t.total, 1e-9), jobs))
+
+
+def show_mandelbrot(smooth_mand, extent, cmap=None):
+    import pylab as pl
+
+    pl.gca().set_axis_off()
+    pl.imshow(smooth_mand, cmap=cmap, extent=extent)
     pl.show()
 
 
+def draw_mandelbrot(C=0, power=1 + 5j, N=800,
+                    cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100):
+    """
+    绘制点(cx, cy)附近正负d的范围的Mandelbrot
+    """
+
+    with timeme() as t:
+        smooth_mand, extent = mandelbrot_array(C=C, power=power, N=N, cx=cx, cy=cy, d=d,
+                                               escape_radius=escape_radius, iter_num=iter_num)
+
+    print(t)
+    show_mandelbrot(smooth_mand, extent)
+
+
 def draw_mandelbrot_2(cx, cy, d, degree=2, N=800):
     """
     与draw_mandelbrot相比，是不同的实现方法，搞不太懂，也能绘图，但不好定制
@@ -121,6 +235,9 @@ def draw_mandelbrot_2(cx, cy, d, degree=2, N=800):
             if len_z == 0: break
 
     with timeme() as  t2:
+        import pylab as pl
+        from matplotlib import cm
+
         print("time=", timeme.clock() - start)
 
         pl.imshow(mandelbrot, cmap=cm.Blues_r, extent=[x0, x1, y1, y0])
@@ -179,38 +296,269 @@ def draw_mandelbrot_mpich(C=0, power=1 + 5j, N=800,
             end = start + slice_size
             z0_self = z0[start:end]
 
-        def smooth_iter_point(z0, c):
+        smooth_mand_self = escape_time(z0_self, C=C, power=power,
+                                       escape_radius=escape_radius, iter_num=iter_num)
+
+        smooth_mand_list = comm.allgather(smooth_mand_self)
+
+        # print(type(smooth_mand_list),comm_rank)
+        smooth_mand = np.vstack(smooth_mand_list)
+
+    if comm_rank == 0:
+        print(t)
+        show_mandelbrot(smooth_mand, [x0, x1, y1, y0])
+
+    pass
+
+
+################################################################################
+# Use Local Process Pool
+################################################################################
+pool_jobs = None  # worker number of the pool, None means os.cpu_count()
+_executor = None
+
+
+def _get_executor(jobs=None):
+    """keep the pool alive between zooms, only new tile jobs are dispatched"""
+    global _executor
+    if jobs is None:
+        jobs = pool_jobs if pool_jobs is not None else os.cpu_count()
 
-            z = z0  # 赋初值
+    if _executor is None or _executor._max_workers != jobs:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = ProcessPoolExecutor(max_workers=jobs)
 
-            for i in range(1, iter_num):
-                if abs(z) > escape_radius: break
-                z = z ** power + c  # **运算符是幂运算
-            # 下面是重新计算迭代次数，可以获取连续的迭代次数（即正规化）
+    return _executor
 
 
-            absz = abs(z)  # 复数的模
-            if absz > 2.0:
-                mu = i - log(log(abs(z), 2), 2)
+def _render_tile_shm(shm_name, N, tile, bounds, params):
+    """worker: compute one tile from its bounds, write into the shared N*N array"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        smooth_mand = np.ndarray((N, N), dtype=np.float64, buffer=shm.buf)
+        row_start, row_end, col_start, col_end = tile
+        smooth_mand[row_start:row_end, col_start:col_end] = mandelbrot_tile(
+            *bounds, width=col_end - col_start, height=row_end - row_start, **params)
+        del smooth_mand
+    finally:
+        shm.close()
+
+
+def mandelbrot_array_pool(C=0, power=2, N=800,
+                          cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100,
+                          tile_size=128, jobs=None):
+    """
+    same as mandelbrot_array, but tiles are computed by a process pool,
+    each worker get only the tile bounds and write result into a shared memory array
+
+    :return: (smooth_mand: N*N float ndarray, extent: [x0, x1, y1, y0] for imshow)
+    """
+    x0, x1, y0, y1 = cx - d, cx + d, cy - d, cy + d
+    params = dict(C=C, power=power, escape_radius=escape_radius, iter_num=iter_num)
+
+    executor = _get_executor(jobs)
+    shm = shared_memory.SharedMemory(create=True, size=N * N * np.dtype(np.float64).itemsize)
+    try:
+        futures = [executor.submit(_render_tile_shm, shm.name, N, tile,
+                                   tile_bounds(tile, N, x0, x1, y0, y1), params)
+                   for tile in iter_tiles(N, tile_size)]
+        wait(futures)
+        [future.result() for future in futures]  # raise the worker exception if any
+
+        smooth_mand = np.ndarray((N, N), dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return smooth_mand, [x0, x1, y1, y0]
+
+
+def draw_mandelbrot_pool(C=0, power=1 + 5j, N=800,
+                         cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100):
+    """
+    Use local process pool (all cores by default, see `pool_jobs`)
+    """
+    with timeme() as t:
+        smooth_mand, extent = mandelbrot_array_pool(C=C, power=power, N=N, cx=cx, cy=cy, d=d,
+                                                    escape_radius=escape_radius, iter_num=iter_num)
+
+    print(t)
+    show_mandelbrot(smooth_mand, extent)
+
+
+################################################################################
+# Tile Cache and Progressive Rendering
+################################################################################
+class TileCache:
+    """
+    LRU cache of rendered tiles, capped by the total bytes of the tile arrays
+    key: (zoom level, tile_x, tile_y, tile_size, iter_num, power, C, escape_radius)
+    """
+
+    def __init__(self, maxbytes=256 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
             else:
-                mu = i
+                self._tiles.move_to_end(key)
+                self.hits += 1
 
-            return mu  # 返回正规化的迭代次数
+            return tile
 
-        smooth_mand_self = np.frompyfunc(smooth_iter_point, 2, 1)(z0_self, C).astype(np.float)
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._tiles:
+                self.nbytes -= self._tiles.pop(key).nbytes
 
-        smooth_mand_list = comm.allgather(smooth_mand_self)
+            self._tiles[key] = tile
+            self.nbytes += tile.nbytes
+            while self.nbytes > self.maxbytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self.nbytes -= evicted.nbytes
 
-        # print(type(smooth_mand_list),comm_rank)
-        smooth_mand = np.vstack(smooth_mand_list)
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.nbytes = 0
 
-    if comm_rank == 0:
-        pl.gca().set_axis_off()
-        print(t)
-        pl.imshow(smooth_mand, extent=[x0, x1, y1, y0])
-        pl.show()
+    def __len__(self):
+        return len(self._tiles)
+
+
+tile_cache = TileCache()
+
+# pixel step of zoom level 0, level k is BASE_STEP / 2**k (exact in float)
+BASE_STEP = 2.0 ** -8
 
-    pass
+
+def zoom_level(step):
+    """the zoom level whose pixel step is the nearest to step"""
+    return round(log2(BASE_STEP / step))
+
+
+def _grid_range(low, high, step):
+    """[first, last] indexes of the step grid covering [low, high]"""
+    first = floor(low / step + 0.5)
+    return first, max(floor(high / step + 0.5), first + 1)
+
+
+def mandelbrot_array_cached(C=0, power=2, N=800,
+                            cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100,
+                            tile_size=128, cache=None, jobs=None):
+    """
+    same as mandelbrot_array, but sampled on the fixed grid of the zoom level nearest to
+    the requested pixel step, tile by tile, so that overlapping views share their tiles.
+    only the tiles missing from the cache are computed (by the process pool if jobs is given)
+
+    :return: (smooth_mand: about N*N float ndarray, extent: [x0, x1, y1, y0] for imshow)
+    """
+    if cache is None:
+        cache = tile_cache
+
+    level = zoom_level(2 * d / max(N - 1, 1))
+    step = BASE_STEP / 2.0 ** level
+    params = dict(C=C, power=power, escape_radius=escape_radius, iter_num=iter_num,
+                  width=tile_size, height=tile_size)
+
+    # view in grid indexes, tile (tx, ty) holds indexes [tx * tile_size, (tx + 1) * tile_size)
+    col_first, col_last = _grid_range(cx - d, cx + d, step)
+    row_first, row_last = _grid_range(cy - d, cy + d, step)
+    smooth_mand = np.empty((row_last - row_first + 1, col_last - col_first + 1), dtype=np.float64)
+
+    tiles = [(tx, ty) for ty in range(row_first // tile_size, row_last // tile_size + 1)
+             for tx in range(col_first // tile_size, col_last // tile_size + 1)]
+
+    def tile_bounds_of(tx, ty):
+        col, row = tx * tile_size, ty * tile_size
+        return (col * step, (col + tile_size - 1) * step,
+                row * step, (row + tile_size - 1) * step)
+
+    results = {}
+    missing = []
+    for tx, ty in tiles:
+        key = (level, tx, ty, tile_size, iter_num, power, C, escape_radius)
+        cached = cache.get(key)
+        if cached is None:
+            missing.append((key, (tx, ty)))
+        else:
+            results[tx, ty] = cached
+
+    if jobs is not None and len(missing) > 1:
+        executor = _get_executor(jobs)
+        futures = [executor.submit(mandelbrot_tile, *tile_bounds_of(*tile), **params)
+                   for key, tile in missing]
+        computed = [future.result() for future in futures]
+    else:
+        computed = [mandelbrot_tile(*tile_bounds_of(*tile), **params) for key, tile in missing]
+
+    for (key, tile), result in zip(missing, computed):
+        cache.put(key, result)
+        results[tile] = result
+
+    # copy the part of each tile inside the view
+    for (tx, ty), result in results.items():
+        col, row = tx * tile_size, ty * tile_size
+        col_start, col_end = max(col, col_first), min(col + tile_size, col_last + 1)
+        row_start, row_end = max(row, row_first), min(row + tile_size, row_last + 1)
+        smooth_mand[row_start - row_first:row_end - row_first, col_start - col_first:col_end - col_first] = \
+            result[row_start - row:row_end - row, col_start - col:col_end - col]
+
+    return smooth_mand, [col_first * step, col_last * step, row_last * step, row_first * step]
+
+
+def render_progressive(C=0, power=2, N=800,
+                       cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100,
+                       levels=(4, 1), cache=None, jobs=None):
+    """
+    coarse first, then refine: yield (smooth_mand, extent) rendered at N // level for each level
+    """
+    for level in levels:
+        yield mandelbrot_array_cached(C=C, power=power, N=max(N // level, 2),
+                                      cx=cx, cy=cy, d=d, escape_radius=escape_radius,
+                                      iter_num=iter_num, cache=cache, jobs=jobs)
+
+
+_image = None  # the image artist updated by draw_mandelbrot_progressive
+
+
+def draw_mandelbrot_progressive(C=0, power=1 + 5j, N=800,
+                                cx=0, cy=0, d=2.5, escape_radius=2, iter_num=100):
+    """
+    Show coarse image at once, then the full resolution one,
+    tiles are reused from `tile_cache` (process pool when `pool_jobs` is set)
+    """
+    global _image
+    import pylab as pl
+
+    first_draw = _image is None
+    with timeme() as t:
+        for smooth_mand, extent in render_progressive(C=C, power=power, N=N, cx=cx, cy=cy, d=d,
+                                                      escape_radius=escape_radius,
+                                                      iter_num=iter_num, jobs=pool_jobs):
+            if _image is None:
+                pl.gca().set_axis_off()
+                _image = pl.imshow(smooth_mand, extent=extent)
+            else:
+                _image.set_data(smooth_mand)
+                _image.set_extent(extent)
+                _image.autoscale()
+
+            _image.figure.canvas.draw_idle()
+            pl.pause(0.001)
+
+    print(t, 'tile cache: %d hits %d misses' % (tile_cache.hits, tile_cache.misses))
+    if first_draw:
+        pl.show()
 
 
 ################################################################################
@@ -224,6 +572,7 @@ def draw_MandelbrotSet(C=1 + 5j, power=2, N=800,
     param_dict = locals()
 
     if draw_func == draw_mandelbrot_mpich:
+        check_module('mpi4py')
         import mpi4py.MPI as MPI
         global comm
         comm = MPI.COMM_WORLD
@@ -255,6 +604,8 @@ def draw_MandelbrotSet(C=1 + 5j, power=2, N=800,
         param_dict['d'] = g_size
         draw_func(**param_dict)
 
+    import pylab as pl
+
     fig, ax = pl.subplots(1)
     # 注册鼠标事件
     fig.dpi = 25
@@ -292,24 +643,39 @@ def interactive():
                         help='Max number of iter times')
 
     parser.add_argument('-f', '--func', dest='draw_func',
-                        choices=['normal', 'mpich'],
+                        choices=['normal', 'mpich', 'pool', 'progressive'],
                         help='select kind of exec,default(normal)')
 
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='number of worker processes for `-f pool`, default cpu count')
+
+    parser.add_argument('--cache-mb', type=int,
+                        help='memory cap of the tile cache for `-f progressive`, default 256')
+
     args = parser.parse_args()
 
     global draw_func
+    global pool_jobs
     if args.draw_func is not None:
         if args.draw_func == 'normal':
             draw_func = draw_mandelbrot
         elif args.draw_func == 'mpich':
             draw_func = draw_mandelbrot_mpich
+        elif args.draw_func == 'pool':
+            draw_func = draw_mandelbrot_pool
+            pool_jobs = args.jobs
+        elif args.draw_func == 'progressive':
+            draw_func = draw_mandelbrot_progressive
+            pool_jobs = args.jobs
+            if args.cache_mb is not None:
+                tile_cache.maxbytes = args.cache_mb * 1024 * 1024
         else:
             raise Exception('args f error')
     else:
         draw_func = draw_mandelbrot
 
     from minghu6.algs.userdict import remove_key, remove_value
-    args = remove_value(remove_key(args.__dict__, 'draw_func'), None)
+    args = remove_value(remove_key(args.__dict__, ['draw_func', 'jobs', 'cache_mb']), None)
 
     return args
 
@@ -4,33 +4,149 @@
 """
 ################################################################################
 some method to calculate π
+
+the float estimators are NumPy-batched and generate samples chunk by chunk,
+so memory stays bounded however large N is.
+Monte Carlo can also run on a process pool, each worker on its own seeded stream.
+
+pi_digits gives arbitrary many decimal digits (Chudnovsky with binary splitting),
+bbp_hex_digits extracts hex digits at any position to spot check them.
 ################################################################################
 """
-import random
+import decimal
+import math
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
 
 __all__ = ['using_Monte_Carlo_method',
            'using_rectangles',
            'using_trapezoidal',
-           'random_sampling']
+           'using_simpson',
+           'random_sampling',
+           'monte_carlo',
+           'trapezoid',
+           'simpson',
+           'pi_digits',
+           'bbp_hex_digits',
+           'benchmark',
+           'benchmark_digits']
+
+CHUNK_SIZE = 1 << 20
+
+# name: (f, a, b), the integral of f over [a, b] is π
+INTEGRANDS = {
+    # half of the unit circle, twice
+    'circle': (lambda np, x: 2 * np.sqrt(np.maximum(1 - x * x, 0)), -1, 1),
+    # (4 * arctan(x))', smooth, converges much faster
+    'arctan': (lambda np, x: 4 / (1 + x * x), 0, 1),
+}
+
+
+def _split(N, jobs):
+    return [N // jobs + (1 if i < N % jobs else 0) for i in range(jobs)]
+
 
+def _count_in_circle(N, seed_seq, chunk_size=CHUNK_SIZE):
+    """
+    :param seed_seq: numpy.random.SeedSequence
+    :return: the number of random points in the unit quarter circle
+    """
+    import numpy as np
 
-def using_rectangles(N=int(10e4)):
+    rng = np.random.default_rng(seed_seq)
     n = 0
-    for i in range(N):
-        x = random.random()
-        y = random.random()
-        if x * x + y * y < 1:
-            n += 1
+    for lo in range(0, N, chunk_size):
+        xy = rng.random((2, min(chunk_size, N - lo)))
+        n += int(np.count_nonzero(xy[0] * xy[0] + xy[1] * xy[1] < 1))
+
+    return n
+
+
+def monte_carlo(N=int(10e4), seed=None, jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    :param N: samples
+    :param seed: int or None, same seed, jobs and chunk_size give the same result
+    :param jobs: None or 1 in current process, else split samples over a process pool
+    :param chunk_size: samples generated per batch
+    :return: float
+    """
+    import numpy as np
+
+    if N <= 0:
+        raise ValueError('N should be positive')
+
+    seed_seq = np.random.SeedSequence(seed)
+    if jobs is None or jobs <= 1:
+        n = _count_in_circle(N, seed_seq, chunk_size)
+    else:
+        sizes = _split(N, jobs)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            n = sum(executor.map(_count_in_circle, sizes, seed_seq.spawn(jobs),
+                                 [chunk_size] * jobs))
 
     return 4 * n / N
 
 
-def using_Monte_Carlo_method(N=int(10e4)):
-    return using_rectangles(N)
+def _integrate(N, integrand, weights, chunk_size):
+    """
+    x_j = a + j * h, j = 0..N, sum of weights(j) * f(x_j) chunk by chunk
+    """
+    import numpy as np
+
+    f, a, b = INTEGRANDS[integrand]
+    h = (b - a) / N
+    partial_sums = []
+    for lo in range(0, N + 1, chunk_size):
+        j = np.arange(lo, min(lo + chunk_size, N + 1), dtype=np.float64)
+        partial_sums.append(float(np.dot(weights(np, j, N), f(np, a + j * h))))
+
+    return math.fsum(partial_sums) * h
+
+
+def _trapezoid_weights(np, j, N):
+    w = np.ones_like(j)
+    w[(j == 0) | (j == N)] = 0.5
+    return w
+
+
+def _simpson_weights(np, j, N):
+    w = np.where(j % 2 == 1, 4 / 3, 2 / 3)
+    w[(j == 0) | (j == N)] = 1 / 3
+    return w
+
+
+def trapezoid(N=int(10e4), integrand='circle', chunk_size=CHUNK_SIZE):
+    """
+    :param N: intervals
+    :param integrand: key of INTEGRANDS
+    """
+    if N <= 0:
+        raise ValueError('N should be positive')
+
+    return _integrate(N, integrand, _trapezoid_weights, chunk_size)
+
+
+def simpson(N=int(10e4), integrand='circle', chunk_size=CHUNK_SIZE):
+    """
+    :param N: intervals, odd N is rounded up to even
+    :param integrand: key of INTEGRANDS
+    """
+    if N <= 0:
+        raise ValueError('N should be positive')
+
+    return _integrate(N + N % 2, integrand, _simpson_weights, chunk_size)
 
 
-def random_sampling(N=int(10e4)):
-    return using_rectangles(N)
+def using_rectangles(N=int(10e4), seed=None, jobs=None):
+    return monte_carlo(N, seed=seed, jobs=jobs)
+
+
+def using_Monte_Carlo_method(N=int(10e4), seed=None, jobs=None):
+    return monte_carlo(N, seed=seed, jobs=jobs)
+
+
+def random_sampling(N=int(10e4), seed=None, jobs=None):
+    return monte_carlo(N, seed=seed, jobs=jobs)
 
 
 def using_trapezoidal(N=int(10e4)):
@@ -39,24 +155,237 @@ def using_trapezoidal(N=int(10e4)):
     :return:
     """
 
-    def sub_sum():
-        for j in range(1, N):
-            x = -1 + j * 2 / N
-            yield (1 - x ** 2) ** 0.5
+    return trapezoid(N, 'circle')
 
-    return 4 * sum(sub_sum()) / N
 
+def using_simpson(N=int(10e4)):
+    return simpson(N, 'circle')
+
+
+################################################################################
+# Chudnovsky, binary splitting
+#
+# π = 426880 * sqrt(10005) * Q(0, N) / T(0, N)
+#
+# P, Q, T of the series are exact integers, they are multiplied as Decimal
+# (libmpdec uses number theoretic transform for huge operands, much faster than int)
+################################################################################
+
+_C3_24 = 640320 ** 3 // 24
+_DIGITS_PER_TERM = math.log10(640320 ** 3 / 1728)  # ~14.18
+_GUARD_DIGITS = 10
+_LEAF_TERMS = 32  # below this, split with small ints
+_PARALLEL_MIN_TERMS = 4096
+
+
+def _exact_context():
+    """integer arithmetic never rounds under this context"""
+    return decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+
+def _bs_int(a, b):
+    if b - a == 1:
+        if a == 0:
+            P = Q = 1
+        else:
+            P = (6 * a - 5) * (2 * a - 1) * (6 * a - 1)
+            Q = a * a * a * _C3_24
+        T = P * (13591409 + 545140134 * a)
+        if a & 1:
+            T = -T
+        return P, Q, T
+
+    m = (a + b) // 2
+    return _combine(_bs_int(a, m), _bs_int(m, b))
+
+
+def _combine(left, right):
+    P1, Q1, T1 = left
+    P2, Q2, T2 = right
+    return P1 * P2, Q1 * Q2, Q2 * T1 + P1 * T2
+
+
+def _bs(a, b):
+    """run under _exact_context"""
+    if b - a <= _LEAF_TERMS:
+        return tuple(Decimal(x) for x in _bs_int(a, b))
+
+    m = (a + b) // 2
+    return _combine(_bs(a, m), _bs(m, b))
 
-if __name__ == '__main__':
-    from minghu6.algs import timeme
 
-    with timeme.timeme() as tm1:
-        pi1 = using_rectangles(int(10e5))
-        print('using_rectangles', pi1)
+def _bs_range(a, b):
+    with decimal.localcontext(_exact_context()):
+        return _bs(a, b)
 
-    with timeme.timeme() as tm2:
-        pi2 = using_trapezoidal(int(10e5))
-        print('using_trapezoidal', pi2)
 
-    print('tm1: ', tm1)
-    print('tm2: ', tm2)
+def _chudnovsky_PQT(terms, jobs=None):
+    if jobs is None or jobs <= 1 or terms < _PARALLEL_MIN_TERMS:
+        return _bs_range(0, terms)
+
+    bounds = [terms * i // jobs for i in range(jobs + 1)]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        parts = list(executor.map(_bs_range, bounds[:-1], bounds[1:]))
+
+    with decimal.localcontext(_exact_context()):
+        while len(parts) > 1:  # combine as a balanced tree
+            parts = [_combine(parts[i], parts[i + 1]) if i + 1 < len(parts) else parts[i]
+                     for i in range(0, len(parts), 2)]
+
+    return parts[0]
+
+
+def _rsqrt(a, prec):
+    """1 / sqrt(a) by Newton iteration, only multiplications at full precision"""
+    ctx = _exact_context()
+    ctx.prec = 30
+    y = ctx.divide(1, ctx.sqrt(a))
+
+    precs = []
+    while prec > 30:
+        precs.append(prec)
+        prec = prec // 2 + 2
+
+    for prec in reversed(precs):
+        ctx.prec = prec + _GUARD_DIGITS
+        y = ctx.divide(ctx.multiply(y, ctx.subtract(3, ctx.multiply(a, ctx.multiply(y, y)))), 2)
+
+    return y
+
+
+def _pi_scaled(n, jobs=None):
+    """
+    :return: floor(π * 10^n) as an integral Decimal
+    """
+    terms = int(n / _DIGITS_PER_TERM) + 2
+    _, Q, T = _chudnovsky_PQT(terms, jobs)
+
+    ctx = _exact_context()
+    ctx.prec = n + 1 + _GUARD_DIGITS
+    sqrt_10005 = ctx.multiply(10005, _rsqrt(Decimal(10005), ctx.prec))
+    x = ctx.divide(ctx.multiply(ctx.multiply(Q, 426880), sqrt_10005), T)
+
+    return x.scaleb(n, _exact_context()).to_integral_value(decimal.ROUND_FLOOR, _exact_context())
+
+
+def _digit_blocks(x, ndigits, block_size, ctx):
+    """
+    split the integral Decimal x (ndigits digits, zero padded) into blocks from the left,
+    divide and conquer, so no str of the whole number is built
+    """
+    if ndigits <= block_size:
+        yield str(x).zfill(ndigits)
+        return
+
+    nblocks = -(-ndigits // block_size)
+    low_digits = ndigits - block_size * -(-nblocks // 2)
+    high = x.scaleb(-low_digits, ctx).to_integral_value(decimal.ROUND_FLOOR, ctx)
+    low = ctx.subtract(x, high.scaleb(low_digits, ctx))
+
+    yield from _digit_blocks(high, ndigits - low_digits, block_size, ctx)
+    yield from _digit_blocks(low, low_digits, block_size, ctx)
+
+
+def pi_digits(n, block_size=1000, jobs=None):
+    """
+    >>> ''.join(pi_digits(10))
+    '31415926535'
+    :param n: decimal places
+    :param block_size: digits per yielded str
+    :param jobs: None or 1 in current process, else split the series over a process pool
+    :return: generator of str, joined they are the n + 1 digits 3 1 4 1 5 ...
+    """
+    if n < 0:
+        raise ValueError('n should not be negative')
+    if block_size <= 0:
+        raise ValueError('block_size should be positive')
+
+    return _digit_blocks(_pi_scaled(n, jobs), n + 1, block_size, _exact_context())
+
+
+def _bbp_series(j, d, shift):
+    """
+    frac(16^d * sum(1 / (16^k * (8k + j)))) in fixed point of shift bits
+    """
+    mask = (1 << shift) - 1
+    s = 0
+    for k in range(d + 1):
+        r = 8 * k + j
+        s = (s + (pow(16, d - k, r) << shift) // r) & mask
+
+    k = d + 1
+    while True:
+        term = ((1 << shift) >> (4 * (k - d))) // (8 * k + j)
+        if term == 0:
+            break
+        s += term
+        k += 1
+
+    return s & mask
+
+
+def bbp_hex_digits(position, count=8):
+    """
+    Bailey-Borwein-Plouffe digit extraction, no previous digits needed
+
+    >>> bbp_hex_digits(1, 8)
+    '243F6A88'
+    :param position: 1 is the first hex digit after the point
+    :param count: number of hex digits
+    :return: str
+    """
+    if position < 1:
+        raise ValueError('position starts from 1')
+
+    shift = 4 * count + 32  # guard bits against the truncated terms
+    d = position - 1
+    x = (4 * _bbp_series(1, d, shift) - 2 * _bbp_series(4, d, shift)
+         - _bbp_series(5, d, shift) - _bbp_series(6, d, shift)) & ((1 << shift) - 1)
+
+    return '{0:0{1}X}'.format(x >> (shift - 4 * count), count)
+
+
+def benchmark(N_list=(10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7), jobs=None, seed=0):
+    """
+    print samples/s and error against math.pi for each method and N
+    jobs is not None means benchmark the Monte Carlo process pool too
+    """
+    from minghu6.algs.timeme import timeme
+
+    methods = [('monte_carlo', lambda N: monte_carlo(N, seed=seed)),
+               ('trapezoid', lambda N: trapezoid(N, 'circle')),
+               ('trapezoid(arctan)', lambda N: trapezoid(N, 'arctan')),
+               ('simpson', lambda N: simpson(N, 'circle')),
+               ('simpson(arctan)', lambda N: simpson(N, 'arctan'))]
+    if jobs is not None:
+        methods.insert(1, ('monte_carlo({0} jobs)'.format(jobs),
+                           lambda N: monte_carlo(N, seed=seed, jobs=jobs)))
+
+    for name, method in methods:
+        for N in N_list:
+            with timeme() as t:
+                value = method(N)
+
+            print('{0:<20} N={1:<12d} {2:>10.4f}s {3:>14.1f} samples/s  error={4:.3e}'.format(
+                name, N, t.total, N / max(t.total, 1e-9), abs(value - math.pi)))
+
+
+def benchmark_digits(n_list=(10 ** 4, 10 ** 5, 10 ** 6), jobs=None):
+    """
+    print time and digits/s of pi_digits for each n
+    """
+    from minghu6.algs.timeme import timeme
+
+    for n in n_list:
+        with timeme() as t:
+            tail = ''
+            for block in pi_digits(n, jobs=jobs):
+                tail = (tail + block)[-10:]
+
+        print('n={0:<10d} {1:>10.4f}s {2:>14.1f} digits/s  ...{3}'.format(
+            n, t.total, n / max(t.total, 1e-9), tail))
+
+
+if __name__ == '__main__':
+    benchmark()
+    benchmark_digits()
@@ -6,9 +6,15 @@
 """
 
 import random
+from functools import lru_cache
+from itertools import compress
+from math import isqrt
 
 __all__ = ['fast_exp_mod',
            'isprime',
+           'isprime_many',
+           'primes_up_to',
+           'primes_in_range',
            'find_prime_random',
            'simpleist_int_ratio']
 
@@ -73,19 +79,131 @@ def fast_exp_mod(b, e, m):
 
 #     return True
 
+
 def isprime(n):
-    """Primality test using 6k+-1 optimization."""
-    if n <= 3:
-        return n > 1
-    if n % 2 == 0 or n % 3 == 0:
+    """
+    table lookup for small n, deterministic Miller-Rabin for n < 3.3e24 (covers 64-bit),
+    Miller-Rabin with extra random bases above that
+    """
+    if n < _SMALL_LIMIT:
+        return n >= 2 and _small_table()[n] == 1
+
+    return _miller_rabin(n)
+
+
+_SMALL_LIMIT = 1 << 16
+
+# first 13 primes as bases are deterministic for n < 3317044064679887385961981
+# (up to 37 only for n < 318665857834031151167461)
+_MR_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+_MR_DETERMINISTIC_LIMIT = 3317044064679887385961981
+
+
+@lru_cache(maxsize=1)
+def _small_table():
+    return _sieve_table(_SMALL_LIMIT)
+
+
+def _sieve_table(limit):
+    """
+    :return: bytearray, table[i] == 1 if i is prime, for 0 <= i < limit
+    """
+    table = bytearray([1]) * limit
+    table[:2] = b'\x00\x00'[:limit]
+    for p in range(2, isqrt(limit - 1) + 1 if limit > 1 else 0):
+        if table[p]:
+            table[p * p::p] = bytes(len(range(p * p, limit, p)))
+
+    return table
+
+
+def _miller_rabin(n, extra_rounds=8):
+    if n < 2:
         return False
-    i = 5
-    while i ** 2 <= n:
-        if n % i == 0 or n % (i + 2) == 0:
+    for p in _MR_BASES:
+        if n % p == 0:
+            return n == p
+
+    q, k = n - 1, 0
+    while q & 1 == 0:
+        q >>= 1
+        k += 1
+
+    bases = list(_MR_BASES)
+    if n >= _MR_DETERMINISTIC_LIMIT:
+        bases.extend(random.randrange(2, n - 1) for _ in range(extra_rounds))
+
+    for a in bases:
+        x = pow(a, q, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(k - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
             return False
-        i += 6
+
     return True
 
+
+def _sieve_segments(lo, hi, segment_size):
+    """
+    :return: generator of (segment start, bytearray flags) covering [lo, hi)
+    """
+    lo = max(lo, 2)
+    if lo >= hi:
+        return
+
+    base_primes = list(compress(range(isqrt(hi - 1) + 1), _sieve_table(isqrt(hi - 1) + 1)))
+    for start in range(lo, hi, segment_size):
+        end = min(start + segment_size, hi)
+        size = end - start
+        segment = bytearray([1]) * size
+        for p in base_primes:
+            first = max(p * p, (start + p - 1) // p * p)
+            if first >= end:
+                continue
+            segment[first - start::p] = bytes(len(range(first - start, size, p)))
+
+        yield start, segment
+
+
+def primes_in_range(a, b, segment_size=1 << 18):
+    """
+    segmented sieve of Eratosthenes, memory is bounded by segment_size
+
+    :param a: start, inclusive
+    :param b: stop, exclusive (like range)
+    :param segment_size: numbers sieved per segment
+    :return: generator of primes p, a <= p < b
+    """
+    for start, segment in _sieve_segments(a, b, segment_size):
+        yield from compress(range(start, start + len(segment)), segment)
+
+
+def primes_up_to(n, segment_size=1 << 18):
+    """
+    >>> list(primes_up_to(20))
+    [2, 3, 5, 7, 11, 13, 17, 19]
+    :param n: inclusive
+    :return: generator of primes <= n
+    """
+    return primes_in_range(2, n + 1, segment_size)
+
+
+def isprime_many(iterable):
+    """
+    batch test, small numbers are looked up in the sieve table,
+    others go through Miller-Rabin (deterministic for 64-bit inputs)
+
+    :return: list of bool, same order as iterable
+    """
+    table = _small_table()
+    return [n >= 2 and table[n] == 1 if n < _SMALL_LIMIT else _miller_rabin(n)
+            for n in iterable]
+
+
 def find_prime_random(end, start=0):
     while True:
         # Select a random number n
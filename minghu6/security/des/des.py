@@ -32,7 +32,8 @@ __all__ = ['IP_table',
            'DES',
            'valid_key',
            'encryp_str',
-           'decryp_str']
+           'decryp_str',
+           'benchmark']
 
 # IP置换表
 IP_table = [58, 50, 42, 34, 26, 18, 10, 2,
@@ -415,10 +416,71 @@ def valid_key(key: str):
     return (key + 'saltsalt')[:8]
 
 
+def _rev16(x):
+    from minghu6.security.des.fastdes import REV8
+    return (REV8[x & 0xFF] << 8) | REV8[x >> 8]
+
+
 def encryp_str(M, key):
     """
     DES encrption
     format to 4 *, /u0020 space
+    (table-driven fastdes.LEGACY engine, same output as the bit list DES)
+    :param M:   str
+    :param key: 64 bit -- len(key)==8
+    :return:    C -- str
+    """
+    from minghu6.security.des.fastdes import LEGACY, REV8, encrypt_block
+
+    assert isinstance(M, str)
+    assert isinstance(key, str) and len(key) == 8
+
+    if len(M) % 4 != 0:
+        M = M + '\u0020' * (4 - len(M) % 4)
+
+    C = []
+    for i in range(0, len(M), 4):
+        block = 0
+        for char in M[i:i + 4]:
+            block = (block << 16) | _rev16(ord(char) & 0xFFFF)
+
+        block = encrypt_block(block, key, LEGACY)
+        C.extend(hex(b) for b in block.to_bytes(8, 'big').translate(REV8))
+
+    return ''.join(C)
+
+
+def decryp_str(C, key):
+    """
+    DES decrption
+    Must is  8 *
+    (table-driven fastdes.LEGACY engine, same output as the bit list DES)
+    :param C:   str
+    :param key: 64 bit -- len(key)==8
+    :return:    M -- str
+    """
+    from minghu6.security.des.fastdes import LEGACY, REV8, decrypt_block
+
+    assert isinstance(C, str)
+    assert isinstance(key, str) and len(key) == 8
+
+    C = bytes(int(i, base=16) & 0xFF for i in C.lower().split('0x')[1:])
+
+    assert len(C) % 8 == 0
+
+    M = []
+    C = C.translate(REV8)
+    for i in range(0, len(C), 8):
+        block = decrypt_block(int.from_bytes(C[i:i + 8], 'big'), key, LEGACY)
+        M.extend(chr(_rev16((block >> shift) & 0xFFFF)) for shift in (48, 32, 16, 0))
+
+    return ''.join(M)
+
+
+def _encryp_str_bitlist(M, key):
+    """
+    DES encrption on bit lists (the original implement, kept for benchmark)
+    format to 4 *, /u0020 space
     :param M:   str
     :param key: 64 bit -- len(key)==8
     :return:    C -- str
@@ -444,9 +506,9 @@ def encryp_str(M, key):
     return C
 
 
-def decryp_str(C, key):
+def _decryp_str_bitlist(C, key):
     """
-    DES decrption
+    DES decrption on bit lists (the original implement, kept for benchmark)
     Must is  8 *
     :param C:   str
     :param key: 64 bit -- len(key)==8
@@ -480,6 +542,29 @@ def decryp_str(C, key):
     return M
 
 
+def benchmark(n=200, nbytes=256 * 1024, key='12345678'):
+    """compare str encryption throughput of the bit list DES and fastdes"""
+    import os
+    from minghu6.algs.timeme import timeme
+    from minghu6.security.des import fastdes
+
+    M = 'DES 算法 benchmark ' * n
+    for name, encrypt_func, decrypt_func in (('bitlist', _encryp_str_bitlist, _decryp_str_bitlist),
+                                             ('fastdes', encryp_str, decryp_str)):
+        with timeme() as t:
+            C = encrypt_func(M, key)
+            assert decrypt_func(C, key).rstrip() == M.rstrip()
+
+        print('{0:<8s} {1:>10.4f}s {2:>12.1f} chars/s'.format(name, t.total, 2 * len(M) / max(t.total, 1e-9)))
+
+    data = os.urandom(nbytes)
+    for mode in ('ecb', 'cbc'):
+        with timeme() as t:
+            assert fastdes.decrypt(fastdes.encrypt(data, key, mode), key, mode) == data
+
+        print('{0:<8s} {1:>10.4f}s {2:>12.1f} bytes/s'.format(mode, t.total, 2 * len(data) / max(t.total, 1e-9)))
+
+
 def __test_basic():
     passwd = '12345678'
 
@@ -0,0 +1,397 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+################################################################################
+Table-driven DES on 64-bit integers
+
+a block is an int whose MSB is DES bit 1, IP/IP^-1 are done by byte lookup tables,
+S-box and P permutation are folded into 8 SP tables of 64 entries each,
+round keys are computed once per key (cached).
+
+two variants share the core:
+  STANDARD  FIPS 46-3 DES, used by the bytes API (encrypt/decrypt, ECB/CBC)
+  LEGACY    bit-exact with des.DES (LSB-first bit order, reversed S-box output,
+            its own key rotation), used by des.encryp_str/des.decryp_str
+################################################################################
+"""
+import mmap
+import os
+import struct
+from functools import lru_cache
+
+from minghu6.security.des.des import (IP_table, IP_table_, S, P_table,
+                                      compress_table1, compress_table2, createKeys)
+
+__all__ = ['STANDARD',
+           'LEGACY',
+           'round_keys',
+           'encrypt_block',
+           'decrypt_block',
+           'encrypt',
+           'decrypt',
+           'encrypt_stream',
+           'decrypt_stream',
+           'valid_key',
+           'pad',
+           'unpad',
+           'BLOCK_SIZE']
+
+STANDARD = 'standard'
+LEGACY = 'legacy'
+
+BLOCK_SIZE = 8
+SHIFT_SCHEDULE = [1, 1, 2, 2, 2, 2, 2, 2, 1, 2, 2, 2, 2, 2, 2, 1]
+
+# bit reversed byte, legacy bit order is LSB first in each byte
+REV8 = bytes(int('{0:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+def _permute(value, table, in_bits):
+    """out bit k (MSB first) = in bit table[k] (1-based, MSB first)"""
+    out = 0
+    for pos in table:
+        out = (out << 1) | ((value >> (in_bits - pos)) & 1)
+    return out
+
+
+def _byte_tables(table, in_bits):
+    """split the permutation by input byte: permute(v) = OR of tables[j][byte j of v]"""
+    return [[_permute(v << (in_bits - 8 - 8 * j), table, in_bits) for v in range(256)]
+            for j in range(in_bits // 8)]
+
+
+def _sp_tables(reverse_nibble=False):
+    tables = []
+    for k, s_box in enumerate(S):
+        table = []
+        for v in range(64):
+            row = ((v >> 4) & 2) | (v & 1)
+            col = (v >> 1) & 0xF
+            s = s_box[row * 16 + col]
+            if reverse_nibble:
+                s = int('{0:04b}'.format(s)[::-1], 2)
+            table.append(_permute(s << (28 - 4 * k), P_table, 32))
+        tables.append(table)
+    return tables
+
+
+_IP = _byte_tables(IP_table, 64)
+_FP = _byte_tables(IP_table_, 64)
+_SP = {STANDARD: _sp_tables(), LEGACY: _sp_tables(reverse_nibble=True)}
+
+
+def _split_key48(key48):
+    return tuple((key48 >> (42 - 6 * k)) & 0x3F for k in range(8))
+
+
+def _standard_round_keys(key):
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    if len(key) != 8:
+        raise ValueError('DES key must be 8 bytes, got %d' % len(key))
+
+    cd = _permute(int.from_bytes(key, 'big'), compress_table1, 64)
+    c, d = cd >> 28, cd & 0xFFFFFFF
+    keys = []
+    for shift in SHIFT_SCHEDULE:
+        c = ((c << shift) | (c >> (28 - shift))) & 0xFFFFFFF
+        d = ((d << shift) | (d >> (28 - shift))) & 0xFFFFFFF
+        keys.append(_split_key48(_permute((c << 28) | d, compress_table2, 56)))
+    return keys
+
+
+def _legacy_round_keys(key):
+    bits = createKeys(key)
+    keys = []
+    for i in range(16):
+        key48 = 0
+        for bit in bits[i * 48:(i + 1) * 48]:
+            key48 = (key48 << 1) | bit
+        keys.append(_split_key48(key48))
+    return keys
+
+
+@lru_cache(maxsize=256)
+def round_keys(key, variant=STANDARD):
+    """
+    :param key: 8 bytes (str is utf-8 encoded) for STANDARD, 8 chars str for LEGACY
+    :return: (encrypt round keys, decrypt round keys), each round key is 8 6-bit chunks
+    """
+    if variant == LEGACY:
+        keys = _legacy_round_keys(key)
+    else:
+        keys = _standard_round_keys(key)
+
+    return tuple(keys), tuple(reversed(keys))
+
+
+def _crypt_block(block, keys, sp):
+    ip0, ip1, ip2, ip3, ip4, ip5, ip6, ip7 = _IP
+    block = (ip0[block >> 56] | ip1[(block >> 48) & 0xFF] | ip2[(block >> 40) & 0xFF] |
+             ip3[(block >> 32) & 0xFF] | ip4[(block >> 24) & 0xFF] | ip5[(block >> 16) & 0xFF] |
+             ip6[(block >> 8) & 0xFF] | ip7[block & 0xFF])
+
+    sp0, sp1, sp2, sp3, sp4, sp5, sp6, sp7 = sp
+    l, r = block >> 32, block & 0xFFFFFFFF
+    for k0, k1, k2, k3, k4, k5, k6, k7 in keys:
+        # E expansion: 6-bit windows over [r32, r1, ..., r32, r1]
+        x = ((r & 1) << 33) | (r << 1) | (r >> 31)
+        l, r = r, l ^ (sp0[((x >> 28) & 0x3F) ^ k0] | sp1[((x >> 24) & 0x3F) ^ k1] |
+                       sp2[((x >> 20) & 0x3F) ^ k2] | sp3[((x >> 16) & 0x3F) ^ k3] |
+                       sp4[((x >> 12) & 0x3F) ^ k4] | sp5[((x >> 8) & 0x3F) ^ k5] |
+                       sp6[((x >> 4) & 0x3F) ^ k6] | sp7[(x & 0x3F) ^ k7])
+
+    block = (r << 32) | l
+    fp0, fp1, fp2, fp3, fp4, fp5, fp6, fp7 = _FP
+    return (fp0[block >> 56] | fp1[(block >> 48) & 0xFF] | fp2[(block >> 40) & 0xFF] |
+            fp3[(block >> 32) & 0xFF] | fp4[(block >> 24) & 0xFF] | fp5[(block >> 16) & 0xFF] |
+            fp6[(block >> 8) & 0xFF] | fp7[block & 0xFF])
+
+
+def encrypt_block(block, key, variant=STANDARD):
+    """:param block: 64-bit int"""
+    return _crypt_block(block, round_keys(key, variant)[0], _SP[variant])
+
+
+def decrypt_block(block, key, variant=STANDARD):
+    """:param block: 64-bit int"""
+    return _crypt_block(block, round_keys(key, variant)[1], _SP[variant])
+
+
+def pad(data):
+    """PKCS#7"""
+    n = BLOCK_SIZE - len(data) % BLOCK_SIZE
+    return bytes(data) + bytes([n]) * n
+
+
+def unpad(data):
+    if not data or len(data) % BLOCK_SIZE != 0:
+        raise ValueError('invalid padded data length %d' % len(data))
+
+    n = data[-1]
+    if not 1 <= n <= BLOCK_SIZE or data[-n:] != bytes([n]) * n:
+        raise ValueError('invalid padding')
+
+    return data[:-n]
+
+
+def _ecb(blocks, keys, sp):
+    return [_crypt_block(block, keys, sp) for block in blocks]
+
+
+def _cbc_encrypt(blocks, keys, sp, iv):
+    out = []
+    prev = iv
+    for block in blocks:
+        prev = _crypt_block(block ^ prev, keys, sp)
+        out.append(prev)
+    return out
+
+
+def _cbc_decrypt(blocks, keys, sp, iv):
+    out = []
+    prev = iv
+    for block in blocks:
+        out.append(_crypt_block(block, keys, sp) ^ prev)
+        prev = block
+    return out
+
+
+def valid_key(key):
+    """str or bytes of any length to 8 bytes key, like des.valid_key"""
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return (bytes(key) + b'saltsalt')[:BLOCK_SIZE]
+
+
+def _unpack(data):
+    return struct.unpack('>%dQ' % (len(data) // BLOCK_SIZE), data)
+
+
+def _pack(blocks):
+    return struct.pack('>%dQ' % len(blocks), *blocks)
+
+
+def encrypt(data, key, mode='cbc', iv=None, padding=True):
+    """
+    :param data: bytes
+    :param key: 8 bytes
+    :param mode: 'ecb' or 'cbc'
+    :param iv: 8 bytes for cbc, None means a random one is generated and prepended to the output
+    :param padding: PKCS#7 padding, if False len(data) must be multiple of 8
+    :return: bytes
+    """
+    if padding:
+        data = pad(data)
+    elif len(data) % BLOCK_SIZE != 0:
+        raise ValueError('data length %d is not multiple of %d' % (len(data), BLOCK_SIZE))
+
+    keys = round_keys(key)[0]
+    sp = _SP[STANDARD]
+    if mode == 'ecb':
+        return _pack(_ecb(_unpack(data), keys, sp))
+    elif mode == 'cbc':
+        prefix = b''
+        if iv is None:
+            iv = prefix = os.urandom(BLOCK_SIZE)
+        return prefix + _pack(_cbc_encrypt(_unpack(data), keys, sp, int.from_bytes(iv, 'big')))
+    else:
+        raise ValueError('unsupported mode %s' % mode)
+
+
+def decrypt(data, key, mode='cbc', iv=None, padding=True):
+    """
+    :param iv: None for cbc means the first 8 bytes of data are the iv
+    """
+    if mode == 'cbc' and iv is None:
+        iv, data = data[:BLOCK_SIZE], data[BLOCK_SIZE:]
+
+    if len(data) % BLOCK_SIZE != 0:
+        raise ValueError('data length %d is not multiple of %d' % (len(data), BLOCK_SIZE))
+
+    keys = round_keys(key)[1]
+    sp = _SP[STANDARD]
+    if mode == 'ecb':
+        blocks = _ecb(_unpack(data), keys, sp)
+    elif mode == 'cbc':
+        blocks = _cbc_decrypt(_unpack(data), keys, sp, int.from_bytes(iv, 'big'))
+    else:
+        raise ValueError('unsupported mode %s' % mode)
+
+    data = _pack(blocks)
+    if padding:
+        data = unpad(data)
+
+    return data
+
+
+def _iter_chunks(src, chunk_size, use_mmap=False):
+    if use_mmap:
+        try:
+            fileno = src.fileno()
+            size = os.fstat(fileno).st_size
+        except (AttributeError, OSError, ValueError):  # not a real file, e.g. BytesIO
+            use_mmap = False
+        else:
+            if size == 0:
+                return
+            with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as buf:
+                for start in range(0, size, chunk_size):
+                    yield buf[start:start + chunk_size]
+            return
+
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class _StreamCipher:
+    """carry the cbc chain between chunks"""
+
+    def __init__(self, key, mode, iv, decrypt):
+        if mode not in ('ecb', 'cbc'):
+            raise ValueError('unsupported mode %s' % mode)
+
+        self.mode = mode
+        self.keys = round_keys(key)[1 if decrypt else 0]
+        self.sp = _SP[STANDARD]
+        self.decrypt = decrypt
+        self.prev = None if iv is None else int.from_bytes(iv, 'big')
+
+    def update(self, data):
+        blocks = _unpack(data)
+        if self.mode == 'ecb':
+            return _pack(_ecb(blocks, self.keys, self.sp))
+
+        if self.decrypt:
+            out = _cbc_decrypt(blocks, self.keys, self.sp, self.prev)
+            if blocks:
+                self.prev = blocks[-1]
+        else:
+            out = _cbc_encrypt(blocks, self.keys, self.sp, self.prev)
+            if out:
+                self.prev = out[-1]
+
+        return _pack(out)
+
+
+def encrypt_stream(src, dst, key, mode='cbc', chunk_size=64 * 1024, iv=None,
+                   padding=True, use_mmap=False):
+    """
+    encrypt binary file object src into dst chunk by chunk (constant memory)
+
+    :param key: 8 bytes, see valid_key for a password
+    :param chunk_size: rounded down to multiple of 8
+    :param iv: for cbc, None means a random one is generated and written first
+    :param use_mmap: memory-map src instead of read() if it's a real file
+    :return: bytes written
+    """
+    chunk_size = max(chunk_size // BLOCK_SIZE, 1) * BLOCK_SIZE
+    written = 0
+    if mode == 'cbc' and iv is None:
+        iv = os.urandom(BLOCK_SIZE)
+        written += dst.write(iv)
+
+    cipher = _StreamCipher(key, mode, iv, decrypt=False)
+    carry = b''
+    for chunk in _iter_chunks(src, chunk_size, use_mmap):
+        data = carry + chunk if carry else chunk
+        n = len(data) // BLOCK_SIZE * BLOCK_SIZE
+        if n:
+            written += dst.write(cipher.update(data[:n]))
+        carry = bytes(data[n:])
+
+    if padding:
+        written += dst.write(cipher.update(pad(carry)))
+    elif carry:
+        raise ValueError('data length is not multiple of %d' % BLOCK_SIZE)
+
+    return written
+
+
+def decrypt_stream(src, dst, key, mode='cbc', chunk_size=64 * 1024, iv=None,
+                   padding=True, use_mmap=False):
+    """
+    decrypt binary file object src into dst chunk by chunk (constant memory)
+    the last block is held back until EOF for unpadding
+
+    :param iv: for cbc, None means the first 8 bytes of src are the iv
+    :return: bytes written
+    """
+    chunk_size = max(chunk_size // BLOCK_SIZE, 1) * BLOCK_SIZE
+    chunks = _iter_chunks(src, chunk_size, use_mmap)
+
+    carry = b''
+    if mode == 'cbc' and iv is None:
+        for chunk in chunks:
+            carry += chunk
+            if len(carry) >= BLOCK_SIZE:
+                break
+        if len(carry) < BLOCK_SIZE:
+            raise ValueError('missing iv')
+        iv, carry = carry[:BLOCK_SIZE], carry[BLOCK_SIZE:]
+
+    cipher = _StreamCipher(key, mode, iv, decrypt=True)
+    written = 0
+    keep = BLOCK_SIZE if padding else 0
+    for chunk in chunks:
+        data = carry + chunk if carry else chunk
+        n = len(data) // BLOCK_SIZE * BLOCK_SIZE - keep
+        if n > 0:
+            written += dst.write(cipher.update(data[:n]))
+            carry = bytes(data[n:])
+        else:
+            carry = bytes(data)
+
+    if len(carry) % BLOCK_SIZE != 0:
+        raise ValueError('data length is not multiple of %d' % BLOCK_SIZE)
+
+    last = cipher.update(carry)
+    if padding:
+        last = unpad(last)
+    written += dst.write(last)
+
+    return written
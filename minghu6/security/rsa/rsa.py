@@ -7,14 +7,42 @@ RSA Implemets
 ################################################################################
 """
 
+import base64
 import random
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 __all__ = ['encryp_str',
            'decryp_str',
            'encryption',
            'decryption',
+           'decryption_crt',
+           'encrypt_bytes',
+           'decrypt_bytes',
+           'encrypt_many',
+           'decrypt_many',
            'extendedGCD',
-           'selectE']
+           'selectE',
+           'is_probable_prime',
+           'gen_prime',
+           'generate_key',
+           'RSAKey',
+           'benchmark']
+
+RSAKey = namedtuple('RSAKey', ['n', 'e', 'd', 'p', 'q', 'dP', 'dQ', 'qInv'])
+
+
+def _small_primes(limit):
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b'\x00\x00'
+    for i in range(2, int(limit ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i in range(limit) if sieve[i]]
+
+
+SMALL_PRIMES = _small_primes(2000)
 
 
 def fast_exp_mod(b, e, m):
@@ -39,42 +67,108 @@ def fast_exp_mod(b, e, m):
     return result
 
 
-def isprime(n):
-    def prime_test(n):
-
-        if n < 2:
-            raise Exception('Argument Error')
-        elif n == 3:
-            return 'prime'
-
-        q = n - 1
-        k = 0
-        # Find k, q, satisfied 2^k * q = n - 1
-        while q % 2 == 0:
-            k += 1
-            q /= 2
-        a = random.randint(2, n - 2)
-        # If a^q mod n= 1, n maybe is a prime number
-        if fast_exp_mod(a, q, n) == 1:
-            return "inconclusive"
-        # If there exists j satisfy a ^ ((2 ^ j) * q) mod n == n-1, n maybe is a prime number
-        for j in range(0, k):
-            if fast_exp_mod(a, (2 ** j) * q, n) == n - 1:
-                return "inconclusive"
-        # a is not a prime number
-        return "composite"
-
-    if n % 2 == 0:
+def is_probable_prime(n, rounds=None):
+    """
+    small primes trial division, then Miller-Rabin on integers by built-in pow
+    :param rounds: random bases number, default enough for error < 2^-80 on RSA sizes
+    """
+    if n < 2:
         return False
-
-    # If n satisfy primeTest 10 times, then n should be a prime number
-    for i in range(10):
-        if prime_test(n) == "composite":
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < SMALL_PRIMES[-1] ** 2:
+        return True
+
+    # n - 1 = 2^k * q, q odd
+    q = n - 1
+    k = 0
+    while q & 1 == 0:
+        q >>= 1
+        k += 1
+
+    if rounds is None:
+        rounds = 5 if n.bit_length() >= 1024 else 40
+
+    for _ in range(rounds):
+        a = random.randrange(2, n - 1)
+        x = pow(a, q, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(k - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
             return False
 
     return True
 
 
+def _search_prime(bits, tries):
+    """
+    try `tries` random odd candidates of exactly `bits` bits (top two bits set, so p*q has 2*bits bits)
+    :return: prime or None
+    """
+    rng = random.SystemRandom()
+    for _ in range(tries):
+        n = rng.getrandbits(bits) | (3 << (bits - 2)) | 1
+        if is_probable_prime(n):
+            return n
+    return None
+
+
+def gen_prime(bits, jobs=None, batch=64):
+    """
+    :param jobs: None or 1 search in current process, else search candidates batch by batch in a process pool
+    """
+    if jobs is None or jobs <= 1:
+        while True:
+            n = _search_prime(bits, batch)
+            if n is not None:
+                return n
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = {executor.submit(_search_prime, bits, batch) for _ in range(jobs)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                n = future.result()
+                if n is not None:
+                    for other in pending:
+                        other.cancel()
+                    return n
+                pending.add(executor.submit(_search_prime, bits, batch))
+
+
+def generate_key(bits=2048, e=65537, jobs=None):
+    """
+    :param bits: bit length of n
+    :param jobs: worker processes for the prime search
+    :return: RSAKey, private part carries p, q, dP, dQ, qInv for CRT decryption
+    """
+    while True:
+        p = gen_prime(bits - bits // 2, jobs)
+        q = gen_prime(bits // 2, jobs)
+        if p == q:
+            continue
+
+        fn = (p - 1) * (q - 1)
+        if extendedGCD(e, fn)[2] != 1:
+            continue
+
+        if p < q:
+            p, q = q, p
+        d = pow(e, -1, fn)
+        return RSAKey(n=p * q, e=e, d=d, p=p, q=q,
+                      dP=d % (p - 1), dQ=d % (q - 1), qInv=pow(q, -1, p))
+
+
+def isprime(n):
+    """kept for compatibility, use is_probable_prime"""
+    return is_probable_prime(n)
+
+
 def find_prime(key_half_length):
     while True:
         # Select a random number n
@@ -84,12 +178,14 @@ def find_prime(key_half_length):
 
 
 def extendedGCD(a, b):
-    if (b == 0):
-        return 1, 0, a
-    else:
-        x, y, q = extendedGCD(b, a % b)
-        x, y = y, (x - (a // b) * y)
-        return x, y, q
+    """iterative, return (x, y, gcd) satisfied a*x + b*y = gcd"""
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while b != 0:
+        q = a // b
+        a, b = b, a - q * b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return x0, y0, a
 
 
 def selectE(fn, key_half_length):
@@ -145,16 +241,123 @@ def output_key(n, e, d):
 
 def encryption(M, e, n):
     # RSA C = M^e mod n
-    return fast_exp_mod(M, e, n)
+    return pow(M, e, n)
 
 
 def decryption(C, d, n):
     # RSA M = C^d mod n
-    return fast_exp_mod(C, d, n)
+    return pow(C, d, n)
+
+
+def decryption_crt(C, key):
+    """
+    M = C^d mod n by Chinese Remainder Theorem, about 3-4x faster than decryption
+    :param key: RSAKey
+    """
+    m1 = pow(C, key.dP, key.p)
+    m2 = pow(C, key.dQ, key.q)
+    h = (key.qInv * (m1 - m2)) % key.p
+    return m2 + h * key.q
+
+
+_BLOCK_MIN_BITS = 17
+
+
+def _block_size(n):
+    """:return: (plain chunk bytes, cipher block bytes)"""
+    k = (n.bit_length() + 7) // 8
+    if n.bit_length() < _BLOCK_MIN_BITS:
+        raise ValueError('n is too small for block mode, need at least %d bits' % _BLOCK_MIN_BITS)
+    return k - 2, k
+
+
+def _decrypt_int(C, d, n):
+    """d can be RSAKey, then decrypt by CRT"""
+    if isinstance(d, RSAKey):
+        return decryption_crt(C, d)
+    return decryption(C, d, n)
+
+
+def encrypt_bytes(data, e, n):
+    """
+    pack data into integers just under n (a 0x01 marker byte + k-2 bytes, k = bytes of n),
+    encrypt block-wise, every cipher block is k bytes
+    :return: bytes
+    """
+    chunk_size, k = _block_size(n)
+    return b''.join(
+        encryption(int.from_bytes(b'\x01' + data[i:i + chunk_size], 'big'), e, n).to_bytes(k, 'big')
+        for i in range(0, len(data), chunk_size))
+
+
+def decrypt_bytes(data, d, n):
+    """
+    :param d: int, or RSAKey (decrypt by CRT)
+    """
+    chunk_size, k = _block_size(n)
+    if len(data) % k != 0:
+        raise ValueError('cipher length %d is not multiple of block size %d' % (len(data), k))
+
+    M = []
+    for i in range(0, len(data), k):
+        block = _decrypt_int(int.from_bytes(data[i:i + k], 'big'), d, n)
+        M.append(block.to_bytes((block.bit_length() + 7) // 8, 'big')[1:])  # drop the marker byte
+
+    return b''.join(M)
+
+
+def _encrypt_str_block(M, e, n):
+    if n.bit_length() < _BLOCK_MIN_BITS:  # toy keys, the old format (each char must be < n)
+        return _encryp_str_per_char(M, e, n)
+    return base64.b64encode(encrypt_bytes(M.encode('utf-8'), e, n)).decode('ascii')
+
+
+def _decrypt_str_block(C, d, n):
+    return decrypt_bytes(base64.b64decode(C), d, n).decode('utf-8')
+
+
+def encrypt_many(messages, e, n, jobs=None, chunksize=16):
+    """
+    :param messages: iterable of str or bytes
+    :param jobs: None or 1 in current process, else by a process pool (worth it for large inputs)
+    :return: list of str (base64, same as encryp_str) or bytes, same type as each message
+    """
+    return _map_many(_encrypt_one, messages, e, n, jobs, chunksize)
+
+
+def decrypt_many(ciphers, d, n, jobs=None, chunksize=16):
+    """
+    :param ciphers: iterable of str (from encryp_str, both formats) or bytes (from encrypt_bytes)
+    :param d: int, or RSAKey (decrypt by CRT)
+    """
+    return _map_many(_decrypt_one, ciphers, d, n, jobs, chunksize)
+
+
+def _encrypt_one(M, e, n):
+    if isinstance(M, str):
+        return _encrypt_str_block(M, e, n)
+    return encrypt_bytes(M, e, n)
+
+
+def _decrypt_one(C, d, n):
+    if isinstance(C, str):
+        return decryp_str(C, d, n)
+    return decrypt_bytes(C, d, n)
+
+
+def _map_many(func, items, key, n, jobs, chunksize):
+    items = list(items)
+    if jobs is None or jobs <= 1 or len(items) <= 1:
+        return [func(item, key, n) for item in items]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(func, items, [key] * len(items), [n] * len(items), chunksize=chunksize))
 
 
 def encryp_str(M, e, n):
     """
+    block mode: utf-8 bytes are packed into blocks just under n, output is base64
+    (n < 17 bits falls back to the old one modexp per char format)
 
     :param M: Plain Text
     :param e: (E, N) Public Key
@@ -164,29 +367,69 @@ def encryp_str(M, e, n):
 
     assert isinstance(M, str)
 
-    C = ''.join([hex(encryption(ord(u), e, n)) for u in M])
-
-    return C
-    pass
+    return _encrypt_str_block(M, e, n)
 
 
 def decryp_str(C, d, n):
     """
+    decrypt both the block mode (base64) and the old one modexp per char format (0x..0x..)
 
     :param C: Crypt Message
-    :param d: (D, E) Private Key
+    :param d: (D, E) Private Key, or RSAKey to decrypt by CRT
     :param n: (D, E) Private Key
     :return:
     """
 
     assert isinstance(C, str)
 
+    if _PER_CHAR_PATTERN.fullmatch(C.lower()) is not None:
+        return _decryp_str_per_char(C, d, n)
+
+    return _decrypt_str_block(C, d, n)
+
+
+_PER_CHAR_PATTERN = re.compile(r'(0x[0-9a-f]+)+')
+
+
+def _encryp_str_per_char(M, e, n):
+    """the old format, one modexp per char, hex tokens joined by `0x`"""
+
+    assert isinstance(M, str)
+
+    C = ''.join([hex(encryption(ord(u), e, n)) for u in M])
+
+    return C
+
+
+def _decryp_str_per_char(C, d, n):
+
+    assert isinstance(C, str)
+
     C = C.lower().split('0x')[1:]
 
-    M = ''.join([chr(decryption(int(i, base=16), d, n)) for i in C])
+    M = ''.join([chr(_decrypt_int(int(i, base=16), d, n)) for i in C])
 
     return M
-    pass
+
+
+def benchmark(sizes=(512, 1024, 2048), n=3, jobs=None):
+    """print keys/s of generate_key and decryption/s of plain vs CRT for each key size"""
+    from minghu6.algs.timeme import timeme
+
+    for bits in sizes:
+        with timeme() as t:
+            keys = [generate_key(bits, jobs=jobs) for _ in range(n)]
+        print('{0:>5d} bits keygen   {1:>10.4f}s {2:>10.3f} keys/s'.format(bits, t.total, n / max(t.total, 1e-9)))
+
+        key = keys[0]
+        C = encryption(random.randrange(key.n), key.e, key.n)
+        for name, func in (('plain', lambda: decryption(C, key.d, key.n)),
+                           ('crt', lambda: decryption_crt(C, key))):
+            with timeme() as t:
+                for _ in range(20):
+                    func()
+            print('{0:>5d} bits decrypt {1:<5s} {2:>10.4f}s {3:>10.1f} ops/s'.format(
+                bits, name, t.total, 20 / max(t.total, 1e-9)))
 
 
 def __test_basic():
@@ -221,6 +464,11 @@ def __lab_test():
     m = decryption(C, d, n)
     print('m: ', m)
 
+    X = 'Hello'  # n is too small for block mode, per char
+    C = encryp_str(X, e, n)
+    print('C: ', C)
+    print('M: ', decryp_str(C, d, n))
+
 
 def __test_str():
     (n, e, d) = key_generation(64)
@@ -15,6 +15,7 @@ from minghu6.http.request import headers
 from minghu6.etc.importer import check_module
 from minghu6.algs.operator import getone
 from minghu6.algs.decorator import cli_handle_exception
+from minghu6.algs.metrics import timed
 from minghu6.text.pattern import han
 import minghu6
 
@@ -67,6 +68,7 @@ def build_img_dict():
     return img_dict
 
 
+@timed('cjg.search_in_img_dict')
 def search_in_img_dict(img_dict, img_url):
     while True:
         try:
@@ -69,6 +69,7 @@ from math import floor
 import minghu6
 from color import color
 from docopt import docopt
+from minghu6.algs.metrics import timed
 from minghu6.algs.var import each_same
 from minghu6.etc.cmd import exec_cmd, CommandRunner
 from minghu6.etc.fileecho import guess_charset
@@ -172,6 +173,7 @@ def get_video_audio_info_site_injson(json_obj):
     return video_site, audio_site
 
 
+@timed('ffmpeg_fix.info')
 def info(fn, list_all=False):
     json_obj = load_video_info_json(fn)
 
@@ -256,6 +258,7 @@ def info(fn, list_all=False):
         color.print_info(buf.getvalue())
 
 
+@timed('ffmpeg_fix.convert')
 def convert(fn, output, size: str = None, rate: (int, float) = None, fps: (int, float) = None):
     if not assert_output_has_ext(output):
         color.print_err('Failed.')
@@ -316,6 +319,7 @@ def convert(fn, output, size: str = None, rate: (int, float) = None, fps: (int,
         path2uuid(fn_tmp, d=True)
 
 
+@timed('ffmpeg_fix.merge')
 def merge(pattern_list, output, type, **other_kwargs):
     isprefix = other_kwargs.get('isprefix', False)
     if not assert_output_has_ext(output):
@@ -475,6 +479,7 @@ def merge(pattern_list, output, type, **other_kwargs):
             path2uuid(fn, d=True)
 
 
+@timed('ffmpeg_fix.cut')
 def cut(fn, output, start_time, end_time, debug=False):
     if output is None:
         output_tmp = inplace_output(fn)
@@ -525,6 +530,7 @@ def cut(fn, output, start_time, end_time, debug=False):
             os.remove(fn_tmp)
 
 
+@timed('ffmpeg_fix.extract')
 def extract(fn, output, type, **other_kwargs):
     if not assert_output_has_ext(output):
         color.print_err('Failed.')
@@ -560,6 +566,7 @@ def extract(fn, output, type, **other_kwargs):
         color.print_ok('extract Done.')
 
 
+@timed('ffmpeg_fix.compress')
 def compress(pattern_list, output_postfix, media_type, **other_kwargs):
     input_file_list = []
 
@@ -5,31 +5,63 @@
 
 Usage:
   find [--path=<start-path>] <pattern>... [--exec=<exec-program>] [--regex=<regex-match>]
-                                          [--dry]
+                                          [--jobs=<N>] [--batch=<N>] [--dry]
+                                          [--exclude-dir=<dir-pattern>]... [--threads=<N>]
+                                          [--gitignore | --indexed]
 
 Options:
   pattern                   such as "*.c" "*.py"
   -p --path=<start-path>    find start from startdir(default os.curdir)
   -e --exec=<exec-program>  exec other command by pipe like -exec "xxx %s ", %s:file-name
   -r --regex=<regex-match>  use regex match
+  -j --jobs=<N>             run N exec commands at once [default: 1]
+  -b --batch=<N>            xargs-style, pass up to N files to one exec command,
+                            {} is replaced by all of them (appended if there is no {})
   --dry        dry run
+  -x --exclude-dir=<dir-pattern>  don't enter dirs matching it, can be repeated
+  --gitignore               skip what .gitignore files in the tree ignore
+  -t --threads=<N>          scan directories on N threads, output is unordered [default: 1]
+  --indexed                 answer from the metadata index (updated incrementally)
 
 Examples:
   find -p . "*.enfp" -e "echo {} | sed 's/.enfp.*//' | xargs -0 mv {}"  # repair broken filename caused by virus.
+  find "*.py" -e "wc -l {}" -b 100 -j 4
 """
 import os
+import shlex
+from itertools import islice
 
 import minghu6
 import minghu6.etc.cmd as cmd
+from color import color
 from docopt import docopt
 from minghu6.etc.find import find
 
 
 def handle_exec_string(raw_s: str, fn: str) -> str:
-    raw_s = raw_s.replace('{}', f'"{fn}"')
+    raw_s = raw_s.replace('{}', shlex.quote(fn))
 
     return raw_s
 
+
+def handle_exec_batch(raw_s: str, fns: list) -> str:
+    quoted = ' '.join(shlex.quote(fn) for fn in fns)
+    if '{}' in raw_s:
+        return raw_s.replace('{}', quoted)
+
+    return f'{raw_s} {quoted}'
+
+
+def _batched(iterable, n):
+    iterable = iter(iterable)
+    while True:
+        batch = list(islice(iterable, n))
+        if not batch:
+            break
+
+        yield batch
+
+
 def cli():
     arguments = docopt(__doc__, version=minghu6.__version__)
     if arguments['--path'] is None:
@@ -39,20 +71,45 @@ def cli():
 
     start_path = os.path.abspath(start_path)
 
-    for fn in find(arguments['<pattern>'], start_path,
-                   regex_match=arguments['--regex']):
-        if arguments['--exec'] is not None:
-            if os.path.isfile(fn):
-                exec_cmd_completely = handle_exec_string(arguments['--exec'], fn)
-                if arguments['--dry']:
-                    print(exec_cmd_completely)
-                    return
-                else:
-                    print(fn)
-                info, err = cmd.exec_cmd(exec_cmd_completely)
-                print('\n'.join(info), '\n'.join(err))
-        else:
+    found = find(arguments['<pattern>'], start_path, regex_match=arguments['--regex'],
+                 exclude_dirs=arguments['--exclude-dir'] or None, gitignore=arguments['--gitignore'],
+                 threads=int(arguments['--threads']), indexed=arguments['--indexed'])
+    if arguments['--exec'] is None:
+        for fn in found:
             print(fn)
+        return
+
+    files = (fn for fn in found if os.path.isfile(fn))
+    if arguments['--batch'] is None:
+        groups = ([fn] for fn in files)
+        make_cmd = lambda group: handle_exec_string(arguments['--exec'], group[0])
+    else:
+        groups = _batched(files, int(arguments['--batch']))
+        make_cmd = lambda group: handle_exec_batch(arguments['--exec'], group)
+
+    if arguments['--dry']:
+        for group in groups:
+            print(make_cmd(group))
+        return
+
+    submitted = {}  # index of command -> files, until its result is printed
+
+    def commands():
+        for i, group in enumerate(groups):
+            submitted[i] = group
+            yield make_cmd(group)
+
+    stat = cmd.RunManyStat()
+    for result in cmd.run_many(commands(), jobs=int(arguments['--jobs']), ordered=True, stat=stat):
+        print('\n'.join(submitted.pop(result.index)))
+        info, err = result.decode()
+        print('\n'.join(info), '\n'.join(err))
+        result.close()
+
+    if stat.returncode != 0:
+        color.print_warn(str(stat))
+
+    return stat.returncode
 
 
 if __name__ == '__main__':
@@ -11,6 +11,7 @@ from sys import exc_info
 
 import pprint
 from minghu6.algs.pprint import print_num
+from minghu6.etc.walk import walk
 
 
 def shell_interactive():
@@ -36,6 +37,16 @@ def shell_interactive():
     parser.add_argument('-pat', '--pattern',
                         help='regular matching file name')
 
+    parser.add_argument('-x', '--exclude-dir', dest='exclude_dirs', action='append',
+                        help='don\'t enter dirs matching it (fnmatch), can be repeated')
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--gitignore', action='store_true',
+                       help='skip what .gitignore files in the tree ignore')
+
+    group.add_argument('--indexed', action='store_true',
+                       help='answer from the metadata index (updated incrementally)')
+
     args = parser.parse_args()
 
     from minghu6.algs.userdict import remove_value
@@ -48,7 +59,10 @@ def file_search(trace=0,
                 extname='',
                 quick=True,
                 pattern='.*',
-                inner=False):
+                inner=False,
+                exclude_dirs=None,
+                gitignore=False,
+                indexed=False):
     '''
     
     '''
@@ -59,40 +73,50 @@ def file_search(trace=0,
         except UnicodeEncodeError:
             print(arg.encode())  # try origin str
 
-    visited = set()
     allsizes = []
     pattern_c = re.compile(pattern)  # speed up
 
-    for (thisDir, subHere, fileHere) in os.walk(dirname):
-        if trace: tryprint(thisDir)
-        thisDir = os.path.normpath(thisDir)
-        fixname = os.path.normcase(thisDir)
-        if fixname in visited:  # has visited
-            tryprint('skipping  => ' + thisDir)
-        else:
-            visited.add(fixname)
-            for filename in fileHere:
-                fullname = os.path.join(thisDir, filename)
-                if filename.endswith(extname) and pattern_c.findall(filename) != list():
-                    ## filename matching
-
-                    if trace > 1: tryprint('+++' + filename)
-
-                    try:
-                        bytesize = os.path.getsize(fullname)  # return file's size
-                        bytesize //= 1024  # as a KB form
-
-                        if quick == False:
-                            linesize = sum(+1 for line in open(fullname, 'rb'))  # return line's number
-                        else:
-                            linesize = 0
-
-                    except Exception:
-                        print('error', exc_info()[0])
-                    else:
-                        allsizes.append([bytesize,
-                                         linesize,
-                                         fullname])
+    if indexed:
+        from minghu6.etc.fsindex import fs_index
+        if not quick:
+            fs_index.count_lines(dirname, exclude_dirs=exclude_dirs)  # fill entry.lines
+        # sizes of files grown in place need the re-stat too
+        entries = fs_index.entries(dirname, exclude_dirs=exclude_dirs, dirs=bool(trace), update=quick,
+                                   check_files=True)
+    else:
+        # symlinked dirs aren't entered, no dir is visited twice
+        entries = walk(dirname, exclude_dirs=exclude_dirs, gitignore=gitignore, dirs=bool(trace))
+
+    for entry in entries:
+        if entry.is_dir():
+            tryprint(entry.path)
+            continue
+
+        filename = entry.name
+        fullname = os.path.normpath(entry.path)
+        if filename.endswith(extname) and pattern_c.search(filename) is not None:
+            ## filename matching
+
+            if trace > 1: tryprint('+++' + filename)
+
+            try:
+                bytesize = entry.stat().st_size  # return file's size
+                bytesize //= 1024  # as a KB form
+
+                if quick == False and getattr(entry, 'lines', None) is not None:
+                    linesize = entry.lines
+                elif quick == False:
+                    with open(fullname, 'rb') as fp:
+                        linesize = sum(+1 for line in fp)  # return line's number
+                else:
+                    linesize = 0
+
+            except Exception:
+                print('error', exc_info()[0])
+            else:
+                allsizes.append([bytesize,
+                                 linesize,
+                                 fullname])
 
     """
     print the maxsize of file and maxlinesize of file
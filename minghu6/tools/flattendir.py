@@ -7,6 +7,7 @@ from collections import OrderedDict
 
 from color import print_normal, print_error, print_warning, print_italic
 from minghu6.algs.func import flatten
+from minghu6.etc.walk import walk
 from minghu6.io.stdio import askyesno
 from shell_op import Op
 
@@ -22,8 +23,13 @@ def list_not_dir_fn_of_dir(dst):
 
 
 class FlattenDir:
-    def __init__(self, dst):
+    def __init__(self, dst, indexed=False):
+        """
+        :param dst:
+        :param indexed: list files from minghu6.etc.fsindex, updated incrementally first
+        """
         self.dst = dst
+        self.indexed = indexed
         self.regular_files = None
         self.fn_path_map = None
         self.top_dir_not_dir_fns = list_not_dir_fn_of_dir(self.dst)
@@ -31,18 +37,26 @@ class FlattenDir:
     def _find_regular_files(self):
         self.fn_path_map = OrderedDict()
         
-        for (thisDir, subsHere, filesHere) in os.walk(self.dst):
-            if thisDir == self.dst:
+        if self.indexed:
+            from minghu6.etc.fsindex import fs_index
+            walker = fs_index.entries
+        else:
+            walker = walk
+
+        # walk dst itself, so symlinked dirs are never entered, not even the top level ones
+        top = os.path.abspath(self.dst)
+        for entry in walker(self.dst):
+            fn, fullname = entry.name, entry.path
+            # files right in dst stay where they are
+            if os.path.dirname(os.path.abspath(fullname)) == top:
                 continue
-            for fn in filesHere:
-                fullname = os.path.join(thisDir, fn)
-                
-                if fn not in self.fn_path_map:
-                    self.fn_path_map[fn] = []
-                
-                self.fn_path_map[fn].append(fullname)
-                
-                yield fullname
+
+            if fn not in self.fn_path_map:
+                self.fn_path_map[fn] = []
+
+            self.fn_path_map[fn].append(fullname)
+
+            yield fullname
     
     def print_regular_files(self):
         for filepath in flatten(self._find_regular_files()):
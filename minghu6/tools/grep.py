@@ -4,27 +4,43 @@
 """GREP
 
 Usage:
-  grep -i=<input-pattern> <file-pattern>... [-l]
+  grep -i=<input-pattern> <file-pattern>... [-l] [-j=<jobs>] [--no-cache]
+                                            [--exclude-dir=<dir-pattern>]... [--gitignore | --indexed]
 
 Options:
   -i=<input-pattern>  input pattern to search (regex match)
   <file-pattern>      file to search (fnmatch)
   -l                  list detail information
+  -j=<jobs>           number of worker processes [default: 1]
+  --no-cache          don't use the charset detection cache
+  --exclude-dir=<dir-pattern>  don't enter dirs matching it (fnmatch), can be repeated
+  --gitignore         skip what .gitignore files in the tree ignore
+  --indexed           list files from the metadata index (updated incrementally)
 
 """
+import sys
+
 import minghu6
 # TODO http://stackoverflow.com/questions/26659142/cat-grep-and-cut-translated-to-python
 from docopt import docopt
+from minghu6.algs.metrics import timing
+from minghu6.etc.grep import GrepStat
 from minghu6.etc.shell_tools import grep
 
 
-def main(i, file_patterns, l=False):
-    for result in grep(i, file_patterns):
-        if l:
-            print('%s %d' % (result.path, result.line))
-            print(result.content)
-        else:
-            print(result.content)
+def main(i, file_patterns, l=False, jobs=1, use_cache=True, exclude_dirs=None, gitignore=False,
+         indexed=False):
+    stat = GrepStat()
+    with timing('grep'):
+        for result in grep(i, file_patterns, jobs=jobs, stat=stat, use_cache=use_cache,
+                           exclude_dirs=exclude_dirs, gitignore=gitignore, indexed=indexed):
+            if l:
+                print('%s %d' % (result.path, result.line))
+                print(result.content)
+            else:
+                print(result.content)
+
+    print(stat, file=sys.stderr)
 
 
 def cli():
@@ -32,7 +48,11 @@ def cli():
     i = arguments['-i']
     file_patterns = arguments['<file-pattern>']
     l = arguments['-l']
-    main(i, file_patterns, l)
+    jobs = int(arguments['-j'])
+    use_cache = not arguments['--no-cache']
+    main(i, file_patterns, l, jobs, use_cache,
+         exclude_dirs=arguments['--exclude-dir'] or None, gitignore=arguments['--gitignore'],
+         indexed=arguments['--indexed'])
 
 
 if __name__ == '__main__':
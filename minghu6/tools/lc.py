@@ -8,6 +8,7 @@ count file lines in dir
 import os
 
 from argparse import ArgumentParser
+from minghu6.etc.walk import walk
 
 
 def count_lines_file(fname, ignore_blank=False):
@@ -20,23 +21,28 @@ def count_lines_file(fname, ignore_blank=False):
     return n
 
 
-def count_lines_dir(dir, ext=None, ignore_blank=False):
+def count_lines_dir(dir, ext=None, ignore_blank=False, exclude_dirs=None, gitignore=False, indexed=False):
     """
 
     :param dir:
     :param ext:the file type which will be counted,
                default None means all type will be included
                you can customized by point a list for ext such as ['.py','.c','.cpp','.bat','.sh']
+    :param exclude_dirs: [fnmatch pattern, ...], such dirs are not entered
+    :param gitignore: skip what .gitignore files in the tree ignore
+    :param indexed: use the line counts kept in minghu6.etc.fsindex, count only new/changed files
 
     :return:
     """
+    if indexed:
+        from minghu6.etc.fsindex import fs_index
+        return sum(fs_index.count_lines(dir, ext, ignore_blank, exclude_dirs).values())
+
     n = 0
     # print(dir,ext,ignore_blank)
-    for rootdir, subdirs, files in os.walk(dir):
-
-        for name in files:
-            if (ext is None) or (os.path.splitext(name)[1] in ext):
-                n += count_lines_file(os.path.join(rootdir, name), ignore_blank)
+    for entry in walk(dir, exclude_dirs=exclude_dirs, gitignore=gitignore):
+        if (ext is None) or (os.path.splitext(entry.name)[1] in ext):
+            n += count_lines_file(entry.path, ignore_blank)
 
     return n
 
@@ -55,6 +61,16 @@ def shell_interactive():
     parser.add_argument('-ib', '--ignore-blank', dest='ignore_blank', action='store_true',
                         help='ignore blank lines during line count')
 
+    parser.add_argument('-x', '--exclude-dir', dest='exclude_dirs', action='append',
+                        help='don\'t enter dirs matching it (fnmatch), can be repeated')
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--gitignore', action='store_true',
+                       help='skip what .gitignore files in the tree ignore')
+
+    group.add_argument('--indexed', action='store_true',
+                       help='use the line counts of the metadata index, count only new/changed files')
+
     args = parser.parse_args()
 
     if args.dir in (None, '.'):
@@ -67,7 +83,8 @@ def shell_interactive():
 
 def cli():
     args = shell_interactive()
-    n = count_lines_dir(dir=args.dir, ext=args.ext, ignore_blank=args.ignore_blank)
+    n = count_lines_dir(dir=args.dir, ext=args.ext, ignore_blank=args.ignore_blank,
+                        exclude_dirs=args.exclude_dirs, gitignore=args.gitignore, indexed=args.indexed)
     print(n)
 
 
@@ -14,12 +14,18 @@ q              # quit
 h              # for help
 
 Usage:
+  pwd_keeper encrypt <src> <dst> [--password=<master-pwd>] [--mode=<mode>] [--mmap]
+  pwd_keeper decrypt <src> <dst> [--password=<master-pwd>] [--mode=<mode>]
   pwd_keeper <path> [--password=<master-pwd>] [--username=<username>]
 
 Options:
   <path>                      account file path to connect
+  encrypt                     encrypt a file (such as backup of account file) by DES
+  decrypt                     decrypt a file encrypted by `encrypt`
   -u --username=<username>    your account name for pwd_keeper, using fo check account file
   -p --password=<master-pwd>  master password
+  -m --mode=<mode>            ecb or cbc [default: cbc]
+  --mmap                      memory-map the source file
 
 """
 
@@ -29,7 +35,7 @@ import getpass
 import minghu6
 from docopt import docopt
 from minghu6.etc.config import SmallConfig
-from minghu6.security.des import des
+from minghu6.security.des import des, fastdes
 from color import color
 from minghu6.text.seq_enh import split_whitespace, split_blankline
 
@@ -131,6 +137,28 @@ def desensitization_pwd(pwd):
     return pwd
     
 
+def crypt_file(src, dst, pwd, decrypt=False, mode='cbc', use_mmap=False):
+    """
+    encrypt/decrypt file src into dst with the master password, in constant memory
+    written to a temp file beside dst first, dst is only replaced on success (wrong key, bad padding)
+    """
+    import tempfile
+
+    key = fastdes.valid_key(pwd)
+    crypt_stream = fastdes.decrypt_stream if decrypt else fastdes.encrypt_stream
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(dst), suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(dst)))
+    try:
+        with os.fdopen(fd, 'wb') as fw, open(src, 'rb') as fr:
+            result = crypt_stream(fr, fw, key, mode=mode, use_mmap=use_mmap)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return result
+
+
 def main(path, pwd, check_username=False, username=None):
     if pwd is None:
         pwd = getpass.getpass('Input your master password: ')
@@ -225,6 +253,21 @@ def cli():
     path = arguments['<path>']
     master_pwd = arguments['--password']
 
+    if arguments['encrypt'] or arguments['decrypt']:
+        if master_pwd is None:
+            master_pwd = getpass.getpass('Input your master password: ')
+        try:
+            n = crypt_file(arguments['<src>'], arguments['<dst>'], master_pwd,
+                           decrypt=arguments['decrypt'], mode=arguments['--mode'],
+                           use_mmap=arguments['--mmap'])
+        except FileNotFoundError:
+            color.print_err('%s not found' % arguments['<src>'])
+        except ValueError as ex:  # bad padding means wrong password or broken file
+            color.print_err(ex)
+        else:
+            color.print_ok('%d bytes written to %s' % (n, arguments['<dst>']))
+        return
+
     if arguments['--username'] is not None:
         main(path, master_pwd, check_username=True, username=arguments['--username'])
     else:
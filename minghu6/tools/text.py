@@ -4,8 +4,8 @@
 """Text
 
 Usage:
-  text charset <filename>
-  text convert <filename> <to_charset> [--from_charset=<from_charset>] --output=<output>
+  text charset <filename> [--no-cache]
+  text convert <filename> <to_charset> [--from_charset=<from_charset>] --output=<output> [--no-cache]
   text merge   <filename>... --output=<output>
   text merge   --regex=<regular-expression> --output=<output>
 
@@ -14,6 +14,7 @@ Options:
   <to_encoding>                    target charset
   -o --output=<output>             don't write back, give a output path
   -r --regex=<regular-expression>  specific files by a regular expression
+  --no-cache                       don't use the charset detection cache
 
 """
 import os
@@ -32,6 +33,7 @@ def cli():
     arguments = docopt(__doc__, version=minghu6.__version__)
 
     path_list = arguments['<filename>']
+    use_cache = not arguments['--no-cache']
     try:
         fr_list = []
         [fr_list.append(open(path, 'rb')) for path in path_list]
@@ -43,7 +45,7 @@ def cli():
 
         if arguments['charset']:
             fr = fr_list[0]
-            result = fileecho.guess_charset(fr)
+            result = fileecho.guess_charset(fr, use_cache=use_cache)
             encoding, confidence = result['encoding'], result['confidence']
             if encoding is None:
                 color.print_err('unknown')
@@ -58,7 +60,7 @@ def cli():
             to_charset = arguments['<to_charset>']
             from_charset = arguments['--from_charset']
             if from_charset is None:
-                result = fileecho.guess_charset(fr)
+                result = fileecho.guess_charset(fr, use_cache=use_cache)
                 encoding, confidence = result['encoding'], result['confidence']
                 if confidence is None:
                     color.print_err('unknown from_charset, '
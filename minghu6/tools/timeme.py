@@ -6,18 +6,175 @@ time  count the running total time(default `xxx s`)
 
 Usage:
   time <command-to-run> [--unit=<unit>]
+  time <command-to-run>... [--runs=<runs>] [--warmup=<warmup>] [--unit=<unit>]
+                           [--export-json=<path>] [--export-csv=<path>]
 
 Options:
-  <command-to-run>  such as `time "python3 -m minghu6.tools.head a.txt"`
-  --unit=<unit>     ms, s, min, h
+  <command-to-run>      such as `time "python3 -m minghu6.tools.head a.txt"`
+  --unit=<unit>         ms, s, min, h
+  --runs=<runs>         benchmark mode, run each command <runs> times, output is discarded
+                        (default 10 when more than one command is given)
+  --warmup=<warmup>     untimed runs before the benchmark [default: 0]
+  --export-json=<path>  write the benchmark results as JSON
+  --export-csv=<path>   write the benchmark summary as CSV
 
 """
+import csv
+import json
+import os
+import statistics
+import subprocess
+import time
+
 import minghu6
 from docopt import docopt
 from minghu6.algs.timeme import timeme
 from minghu6.etc.cmd import exec_cmd
 from color import color
 
+__all__ = ['benchmark_command',
+           'compare',
+           'export_json',
+           'export_csv']
+
+UNIT_FACTOR = {'ms': 1000,
+               's': 1,
+               'min': 1 / 60,
+               'h': 1 / (60 * 60)}
+
+CSV_FIELDS = ['command', 'runs', 'mean', 'stddev', 'median', 'min', 'max',
+              'user', 'system', 'max_rss_kb']
+
+
+def _exit_code(status):
+    """os.waitstatus_to_exitcode (python 3.9+): -signal if killed"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_once(command):
+    """
+    run command with output discarded
+    :return: (wall ns, exit code, user s, system s, max rss KB),
+             the last three are None without os.wait4 (Windows),
+             on Linux max rss is at least the size of this process at fork time
+    """
+    start = time.perf_counter_ns()
+    proc = subprocess.Popen(command, shell=True,
+                            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    if hasattr(os, 'wait4'):
+        # rusage of this child (and its waited descendants), like RUSAGE_CHILDREN for one run
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter_ns() - start
+        proc.returncode = _exit_code(status)
+        return elapsed, proc.returncode, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss
+
+    returncode = proc.wait()
+    return time.perf_counter_ns() - start, returncode, None, None, None
+
+
+def benchmark_command(command, runs=10, warmup=0):
+    """
+    :return: dict of the summary (seconds) and every run
+    """
+    if runs < 1:
+        raise ValueError('runs should be at least 1')
+
+    for _ in range(warmup):
+        _run_once(command)
+
+    records = [_run_once(command) for _ in range(runs)]
+    times = [record[0] / 1e9 for record in records]
+    users = [record[2] for record in records if record[2] is not None]
+    systems = [record[3] for record in records if record[3] is not None]
+    rss = [record[4] for record in records if record[4] is not None]
+
+    return {'command': command,
+            'runs': runs,
+            'mean': statistics.mean(times),
+            'stddev': statistics.stdev(times) if runs > 1 else 0.0,
+            'median': statistics.median(times),
+            'min': min(times),
+            'max': max(times),
+            'user': statistics.mean(users) if users else None,
+            'system': statistics.mean(systems) if systems else None,
+            'max_rss_kb': max(rss) if rss else None,
+            'times': times,
+            'exit_codes': [record[1] for record in records]}
+
+
+def compare(results):
+    """
+    :return: (index of the fastest, [(ratio, ratio stddev) of each result against the fastest])
+    """
+    fastest = min(range(len(results)), key=lambda i: results[i]['mean'])
+    base = results[fastest]
+
+    ratios = []
+    for result in results:
+        ratio = result['mean'] / base['mean']
+        error = ratio * ((result['stddev'] / result['mean']) ** 2 +
+                         (base['stddev'] / base['mean']) ** 2) ** 0.5
+        ratios.append((ratio, error))
+
+    return fastest, ratios
+
+
+def export_json(results, path):
+    with open(path, 'w') as f:
+        json.dump({'results': results}, f, indent=2)
+
+
+def export_csv(results, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _fmt(seconds, unit):
+    return '{0:.4f} {1}'.format(seconds * UNIT_FACTOR[unit], unit)
+
+
+def print_result(i, result, unit='s'):
+    color.print_info('Benchmark {0}: {1}'.format(i + 1, result['command']))
+    color.print_info('  Time (mean ± σ):     {0} ± {1}'.format(
+        _fmt(result['mean'], unit), _fmt(result['stddev'], unit)))
+    color.print_info('  Range (min … max):   {0} … {1}    median {2}    {3} runs'.format(
+        _fmt(result['min'], unit), _fmt(result['max'], unit), _fmt(result['median'], unit), result['runs']))
+    if result['user'] is not None:
+        color.print_info('  User: {0}, System: {1}, max RSS: {2} KB'.format(
+            _fmt(result['user'], unit), _fmt(result['system'], unit), result['max_rss_kb']))
+
+    failed = sum(1 for code in result['exit_codes'] if code != 0)
+    if failed:
+        color.print_warn('  {0} of {1} runs exited with non-zero code'.format(failed, result['runs']))
+
+
+def bench(commands, runs=10, warmup=0, unit='s', json_path=None, csv_path=None):
+    results = []
+    for i, command in enumerate(commands):
+        results.append(benchmark_command(command, runs, warmup))
+        print_result(i, results[-1], unit)
+
+    if len(results) > 1:
+        fastest, ratios = compare(results)
+        color.print_ok('Summary')
+        color.print_ok('  {0} ran'.format(results[fastest]['command']))
+        for i, (ratio, error) in enumerate(ratios):
+            if i != fastest:
+                color.print_ok('    {0:.2f} ± {1:.2f} times faster than {2}'.format(
+                    ratio, error, results[i]['command']))
+
+    if json_path is not None:
+        export_json(results, json_path)
+    if csv_path is not None:
+        export_csv(results, csv_path)
+
+    return results
+
 
 def main(command, unit='s'):
     with timeme(unit=unit) as t:
@@ -36,7 +193,15 @@ def cli():
     else:
         unit = 's'
 
-    main(arguments['<command-to-run>'], unit=unit)
+    commands = arguments['<command-to-run>']
+    json_path, csv_path = arguments['--export-json'], arguments['--export-csv']
+    if len(commands) == 1 and arguments['--runs'] is None and json_path is None and csv_path is None:
+        main(commands[0], unit=unit)
+        return
+
+    runs = int(arguments['--runs']) if arguments['--runs'] is not None else 10
+    bench(commands, runs=runs, warmup=int(arguments['--warmup']), unit=unit,
+          json_path=json_path, csv_path=csv_path)
 
 
 if __name__ == '__main__':
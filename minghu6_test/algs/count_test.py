@@ -13,9 +13,36 @@ def test_Peak():
     p1 = count.Peak(l1)
     res_high = p1.get_peak(count.Peak.HIGH, count.Peak.SORTED_RELATIVE_DISTANCE)
 
-    assert res_high[0].index == 4
-    assert res_high[1].index == 7
+    # the plateau 2, 2 inside a descent isn't a peak, so index 7 is a low one
+    assert [peak.index for peak in res_high] == [10, 4]
+    assert [peak.index for peak in p1.get_peak(count.Peak.LOW, count.Peak.SORTED_NATIVE_INDEX)] == [7]
+
+    # NumPy and plain iterable path agree
+    p2 = count.Peak(iter(l1))
+    assert p2.get_peak(count.Peak.HIGH, count.Peak.SORTED_RELATIVE_DISTANCE, max_num=1) == res_high[:1]
+
+    # the first item isn't a peak, only the base of the first relative distance
+    for data in ([5, 1, 4], iter([5, 1, 4])):
+        p3 = count.Peak(data)
+        assert p3.get_peak(count.Peak.HIGH) == []
+        assert p3.get_peak(count.Peak.LOW) == [(1, 1, 4)]
+        assert p3.get_peak(count.Peak.LOW, count.Peak.SORTED_ABSOLUTE_VALUE, max_num=1) == [(1, 1, 4)]
+
+
+def test_PeakStream():
+    import doctest
+    doctest.run_docstring_examples(count.PeakStream, {'PeakStream': count.PeakStream, 'Peak': count.Peak})
+
+    l1 = [0, 0, 1, 3, 5, 2, 2, 1, 3, 6, 9, 5, 2]
+    stream = count.PeakStream(top_k=2)
+    high_peaks = []
+    for i in range(0, len(l1), 3):
+        high_peaks.extend(stream.feed(l1[i:i + 3])[1])
+
+    assert [peak.index for peak in high_peaks] == [4, 10]
+    assert stream.get_peak(count.Peak.HIGH) == count.Peak(l1).get_peak(count.Peak.HIGH)
 
 
 if __name__ == '__main__':
     test_Peak()
+    test_PeakStream()
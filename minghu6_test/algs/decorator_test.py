@@ -64,6 +64,58 @@ def test_handle_excpetion():
     from minghu6.algs.decorator import handle_exception
     doctest.run_docstring_examples(handle_exception, locals())
 
+    @handle_exception({Exception: lambda ex: 'exception', (KeyError, IndexError): lambda ex: 'lookup'})
+    def get(d, k):
+        """get item"""
+        return d[k]
+
+    assert get({}, 'a') == get([], 1) == 'lookup'
+    assert get(None, 1) == 'exception'
+    assert get({'a': 1}, 'a') == 1
+    assert get.__name__ == 'get' and get.__doc__ == 'get item' and get.__wrapped__ is not None
+
+
+def test_handle_exception_async():
+    import asyncio
+    from minghu6.algs.decorator import handle_exception, cli_handle_exception
+
+    async def async_handler(ex):
+        return 'handled ' + type(ex).__name__
+
+    @handle_exception(async_handler, ZeroDivisionError)
+    async def div(a, b):
+        return a / b
+
+    assert asyncio.run(div(4, 2)) == 2
+    assert asyncio.run(div(1, 0)) == 'handled ZeroDivisionError'
+
+    handled = []
+
+    @cli_handle_exception(handled.append, [ValueError])
+    async def parse(s):
+        return int(s)
+
+    assert asyncio.run(parse('3')) == 3
+    assert asyncio.run(parse('x')) is None and isinstance(handled[0], ValueError)
+
+
+def test_cli_handle_exception():
+    from minghu6.algs.decorator import cli_handle_exception
+
+    def cli_handler(ex):
+        raise SystemExit(str(ex))
+
+    @cli_handle_exception(cli_handler, ZeroDivisionError)
+    def f():
+        1 / 0
+
+    try:
+        f()
+    except SystemExit as ex:
+        assert ex.__context__ is None  # the old exception stack is cleaned
+    else:
+        assert False, 'There should be an Exception'
+
 
 def test_ignore():
     from minghu6.algs.decorator import ignore
@@ -72,7 +124,13 @@ def test_ignore():
     def f1():
         1 / 0
 
-    f1()
+    assert f1() is None
+
+    @ignore
+    def f2():
+        return 2
+
+    assert f2() == 2
 
 
 def test_skip():
@@ -182,6 +240,98 @@ def test_to_class():
     result1 = ClassA(1, 2, 3).get_result()
     assert result1 == (6, 6), result1
 
+
+def test_memoize():
+    import doctest
+    import time
+    from minghu6.algs.decorator import memoize
+    doctest.run_docstring_examples(memoize, locals())
+
+    calls = []
+
+    @memoize(maxsize=2, ttl=0.2)
+    def f(x):
+        calls.append(x)
+        return x * 2
+
+    assert [f(1), f(1), f(2), f(3), f(1)] == [2, 2, 4, 6, 2]
+    assert calls == [1, 2, 3, 1]  # 1 was evicted by 3
+    info = f.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 4, 2, 2)
+
+    time.sleep(0.25)
+    f(1)
+    assert calls == [1, 2, 3, 1, 1]  # expired
+
+    @memoize(typed=True)
+    def g(x):
+        calls.append(x)
+        return x
+
+    g(1)
+    g(1.0)
+    assert g.cache_info().misses == 2
+
+    g.cache_clear()
+    assert g.cache_info().currsize == 0
+
+
+def test_disk_memoize():
+    import os
+    import tempfile
+    from minghu6.algs.decorator import disk_memoize
+
+    path = os.path.join(tempfile.mkdtemp(), 'memoize.db')
+    calls = []
+
+    def probe(name):
+        calls.append(name)
+        return {'name': name, 'size': len(name)}
+
+    cached_probe = disk_memoize(path)(probe)
+    assert cached_probe('a.mp4') == cached_probe('a.mp4') == {'name': 'a.mp4', 'size': 5}
+    assert calls == ['a.mp4']
+
+    # another "process": a new wrapper over the same store file
+    assert disk_memoize(path)(probe)('a.mp4') == {'name': 'a.mp4', 'size': 5}
+    assert calls == ['a.mp4']
+
+    small_probe = disk_memoize(path, max_bytes=2000)(probe)
+    for i in range(200):
+        small_probe(str(i))
+    assert small_probe.store.bytes() < 2000 + 64 * 100
+    assert small_probe.cache_info().evictions > 0
+
+    # a fresh hit doesn't write the db
+    cached_probe('b.mp4')
+    changes = cached_probe.store._conn.total_changes
+    cached_probe('b.mp4')
+    assert cached_probe.store._conn.total_changes == changes
+
+
+def test_disk_memoize_set_args():
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    root = tempfile.mkdtemp()
+    path, log = os.path.join(root, 'memoize.db'), os.path.join(root, 'calls.log')
+    code = '\n'.join(['from minghu6.algs.decorator import disk_memoize',
+                      '@disk_memoize({0!r})'.format(path),
+                      'def f(names, d):',
+                      '    open({0!r}, "a").write("x")'.format(log),
+                      '    return len(names)',
+                      'assert f(frozenset("abcdefgh"), {"k": {"x", "y", "z"}}) == 8'])
+
+    # set order differs with the str hash seed
+    for seed in ('1', '2', '3'):
+        subprocess.check_call([sys.executable, '-c', code], env=dict(os.environ, PYTHONHASHSEED=seed))
+
+    with open(log) as f:
+        assert f.read() == 'x'
+
+
 if __name__ == '__main__':
     test_require_vars()
     test_exception_handler()
@@ -192,3 +342,8 @@ if __name__ == '__main__':
     test_timer()
     test_to_class()
     test_handle_excpetion()
+    test_handle_exception_async()
+    test_cli_handle_exception()
+    test_memoize()
+    test_disk_memoize()
+    test_disk_memoize_set_args()
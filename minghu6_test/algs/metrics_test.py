@@ -0,0 +1,65 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+
+
+def test_histogram():
+    import random
+    from minghu6.algs.metrics import Histogram
+
+    values = [random.randrange(10 ** 9) for _ in range(10000)]
+    hist = Histogram()
+    for value in values:
+        hist.record(value)
+
+    values.sort()
+    for p in (50, 95, 99):
+        exact = values[-(-len(values) * p // 100) - 1]
+        assert exact <= hist.percentile(p) <= exact * 1.04
+
+    assert hist.percentile(100) == hist.max == values[-1]
+    assert Histogram().percentile(50) is None
+
+
+def test_timed():
+    import json
+    import os
+    import tempfile
+    from minghu6.algs.metrics import Registry
+
+    registry = Registry()
+
+    @registry.timed('f')
+    def f(x):
+        return x * 2
+
+    assert f(1) == 2
+    assert registry.names() == []  # disabled
+
+    registry.enabled = True
+    for i in range(10):
+        f(i)
+    with registry.timing('block') as t:
+        sum(range(1000))
+    assert t.total >= 0
+
+    data = registry.to_dict()
+    assert data['f']['wall']['count'] == 10 and data['block']['cpu']['count'] == 1
+    assert data['f']['wall']['p50'] <= data['f']['wall']['p99'] <= data['f']['wall']['max']
+
+    text = registry.to_prometheus()
+    assert 'minghu6_wall_seconds{name="f",quantile="0.95"}' in text
+    assert 'minghu6_cpu_seconds_count{name="block"} 1' in text
+
+    path = os.path.join(tempfile.mkdtemp(), 'metrics.json')
+    registry.write(path)
+    with open(path) as fp:
+        assert json.load(fp)['f']['wall']['count'] == 10
+
+
+if __name__ == '__main__':
+    test_histogram()
+    test_timed()
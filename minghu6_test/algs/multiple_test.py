@@ -0,0 +1,84 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+
+
+def test_multiple_meta():
+    from minghu6.algs.multiple import MultipleMeta
+
+    class Spam(metaclass=MultipleMeta):
+        def bar(self, x: int, y: int):
+            return 'int', x + y
+
+        def bar(self, s: str, n: int = 0):
+            return 'str', s * (n or 1)
+
+    spam = Spam()
+    assert spam.bar(2, 3) == ('int', 5)
+    assert spam.bar('ab') == ('str', 'ab')
+    assert spam.bar('ab', 2) == ('str', 'abab')
+    assert spam.bar('ab', n=3) == ('str', 'ababab')
+    assert spam.bar(s='a', n=2) == ('str', 'aa')
+    assert spam.bar(True, y=1) == ('int', 2)  # bool is int
+
+    try:
+        spam.bar(1.0, 2)
+    except TypeError:
+        pass
+    else:
+        assert False
+
+
+def test_redefinition():
+    from minghu6.algs.multiple import MultipleMeta
+
+    class Spam(metaclass=MultipleMeta):
+        def f(self, x: int):
+            return 'old'
+
+        def f(self, y: int) -> int:  # same types, renamed: the later one wins
+            return 'new'
+
+    assert Spam().f(1) == 'new'
+
+
+def test_mro_dispatch():
+    from minghu6.algs.multiple import MultiMethod
+
+    class A: pass
+    class B(A): pass
+    class C(B): pass
+
+    def f_a(self, x: A, y: A):
+        return 'aa'
+
+    def f_b(self, x: B, y: A):
+        return 'ba'
+
+    def f_ab(self, x: A, y: B):
+        return 'ab'
+
+    f = MultiMethod('f')
+    f.register(f_a)
+    f.register(f_b)
+    assert f(None, C(), A()) == 'ba'
+    assert f(None, A(), C()) == 'aa'
+    assert f.dispatch(C, C) is f_b
+
+    f.register(f_ab)  # invalidates the cache
+    assert f(None, A(), C()) == 'ab'
+    try:
+        f(None, C(), C())
+    except TypeError as ex:
+        assert 'Ambiguous' in str(ex)
+    else:
+        assert False
+
+
+if __name__ == '__main__':
+    test_multiple_meta()
+    test_redefinition()
+    test_mro_dispatch()
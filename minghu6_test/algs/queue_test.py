@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+
+
+def test_indexed_heap():
+    from minghu6.algs.queue import IndexedHeap
+
+    heap = IndexedHeap([('a', 5), ('b', 3), ('c', 8)])
+    heap.push('d', 1)
+    assert 'b' in heap and 'x' not in heap
+    assert heap.peek() == ('d', 1)
+
+    heap.change('c', 0)
+    heap.decrease_key('a', 2)
+    assert heap.delete('d') == 1
+    assert [heap.pop() for _ in range(len(heap))] == [('c', 0), ('a', 2), ('b', 3)]
+    assert heap.is_empty()
+
+    # a duplicate item leaves the heap untouched
+    heap = IndexedHeap([('a', 5), ('b', 3)])
+    try:
+        heap.push_many([('c', 1), ('a', 0)])
+    except KeyError:
+        pass
+    else:
+        assert False
+    assert len(heap) == 2 and 'c' not in heap and heap.peek() == ('b', 3)
+
+
+def test_priority_queue():
+    from minghu6.algs.queue import PriorityQueue
+
+    pq = PriorityQueue()
+    pq.push('a', 1)
+    pq.push('b', 3)
+    pq.push('a', 5)
+    pq.push_many([('c', 3), ('d', 0)])
+
+    assert pq.contains('a')
+    assert pq.delete('a') == [(-5, 2, 'a'), (-1, 0, 'a')]
+    assert not pq.contains('a')
+
+    pq.change('d', 10)
+    assert [pq.pop() for _ in range(3)] == ['d', 'b', 'c']  # FIFO for the same priority
+    assert pq.is_empty()
+
+
+if __name__ == '__main__':
+    test_indexed_heap()
+    test_priority_queue()
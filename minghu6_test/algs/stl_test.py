@@ -10,13 +10,67 @@ def test_lower_bound():
     doctest.run_docstring_examples(lower_bound, locals())
 
     assert lower_bound([1, 2, 3, 4], 3) == 2
+    assert lower_bound([], 3) == 0
+    assert lower_bound([(1, 'a'), (3, 'b')], 2, key=lambda x: x[0]) == 1
 
 
 def test_upper_bound():
     from minghu6.algs.stl import upper_bound
     doctest.run_docstring_examples(upper_bound, locals())
 
+    assert upper_bound([1, 2, 3, 4], 4) == 4
+    assert upper_bound([], 3) == 0
+
+
+def test_sorted_list():
+    import bisect
+    import random
+    from minghu6.algs.stl import SortedList
+    doctest.run_docstring_examples(SortedList, locals())
+
+    values = [random.randrange(1000) for _ in range(3000)]
+    sl = SortedList(load=16)
+    for v in values:
+        sl.add(v)
+    for v in values[::3]:
+        sl.remove(v)
+        values.remove(v)
+    values.sort()
+
+    assert list(sl) == values
+    assert sl[100] == values[100] and sl[-1] == values[-1]
+    assert sl.bisect_left(500) == bisect.bisect_left(values, 500)
+    assert list(sl.irange(100, 200)) == [v for v in values if 100 <= v <= 200]
+    assert list(sl.searchsorted([0, 500, 999], 'right')) == [bisect.bisect_right(values, k)
+                                                            for k in (0, 500, 999)]
+
+    by_len = SortedList(['ccc', 'a', 'bb', 'dd'], key=len)
+    assert list(by_len) == ['a', 'bb', 'dd', 'ccc']
+    assert list(by_len.searchsorted([2, 3])) == [1, 3]
+
+    # equal keys keep the insertion order, bulk update as add
+    by_len = SortedList(['old'], key=len)
+    by_len.update(['new', 'one'])
+    assert list(by_len) == ['old', 'new', 'one']
+    by_len.add('two')
+    by_len.update(['six'])
+    assert list(by_len) == ['old', 'new', 'one', 'two', 'six']
+
+
+def test_sorted_dict():
+    from minghu6.algs.stl import SortedDict
+    doctest.run_docstring_examples(SortedDict, locals())
+
+    d = SortedDict({'b': 2, 'a': 1})
+    d.update(c=3, aa=0)
+    del d['b']
+    assert list(d.items()) == [('a', 1), ('aa', 0), ('c', 3)]
+    assert d.popitem() == ('c', 3)
+    assert list(d.irange('a', 'b')) == ['a', 'aa']
+
 
 if __name__ == '__main__':
     test_lower_bound()
     test_upper_bound()
+    test_sorted_list()
+    test_sorted_dict()
@@ -84,6 +84,31 @@ def test_custom_bytes_str():
     assert cs2.extra_attrs['status'] == 'N', cs2.extra_attrs
 
 
+def test_custom_operators():
+    # +, *, % and [] are forwarded at class level, the result is rewrapped sharing extra_attrs
+    cs = var.CustomStr('ab')
+    cs.extra_attrs['status'] = 'Y'
+    for result, expected in [(cs + 'c', 'abc'), (cs * 2, 'abab'), (2 * cs, 'abab'),
+                             (cs[0], 'a'), (cs[::-1], 'ba')]:
+        assert type(result) is var.CustomStr and str.__eq__(result, expected)
+        assert result.extra_attrs is cs.extra_attrs
+
+    fmt = var.CustomStr('%s!')
+    assert type(fmt % 'x') is var.CustomStr and str.__eq__(fmt % 'x', 'x!')
+
+    cb = var.CustomBytes(b'ab')
+    cb.extra_attrs['status'] = 'N'
+    for result, expected in [(cb + b'c', b'abc'), (cb * 2, b'abab'), (2 * cb, b'abab'), (cb[:1], b'a'),
+                             (var.CustomBytes(b'%d') % 3, b'3')]:
+        assert type(result) is var.CustomBytes and bytes.__eq__(result, expected)
+    assert (cb + b'c').extra_attrs is cb.extra_attrs
+
+    # the rest is the plain str/bytes behaviour
+    assert cb[0] == 97
+    assert type('c' + cs) is str and 'c' + cs == 'cab'
+    assert 'a' in cs and len(cs) == 2 and list(cs) == ['a', 'b']
+
+
 if __name__ == '__main__':
     test_allis()
     test_each_same()
@@ -92,3 +117,4 @@ if __name__ == '__main__':
     test_custom_str()
     test_custom_bytes()
     test_custom_bytes_str()
+    test_custom_operators()
@@ -0,0 +1,108 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import sys
+
+
+def _commands(mux):
+    script = 'import sys\nfor i in range(3): print(i)\nsys.stderr.write("err\\n")\nsys.stdout.write("tail")\nsys.exit(3)'
+    mux.add([sys.executable, '-c', script], key='a')
+    mux.add([sys.executable, '-c', 'import time; time.sleep(10)'], key='slow', timeout=.3)
+
+    return mux
+
+
+def _check_events(mux, events):
+    by_key = {}
+    for key, tag, data in events:
+        by_key.setdefault(key, []).append((tag, data))
+
+    # stdout and stderr interleave in any order, each one keeps its own order
+    assert [data for tag, data in by_key['a'] if tag == 'stdout'] == [b'0\n', b'1\n', b'2\n', b'tail']
+    assert [data for tag, data in by_key['a'] if tag == 'stderr'] == [b'err\n']
+    assert by_key['a'][-1] == ('exit', 3)
+    assert by_key['slow'][0] == ('timeout', None)
+    assert by_key['slow'][1][0] == 'exit' and by_key['slow'][1][1] != 0
+    assert mux.returncodes['a'] == 3
+
+
+def test_command_mux():
+    from minghu6.etc.cmd import CommandMux
+
+    mux = _commands(CommandMux())
+    _check_events(mux, list(mux))
+
+    mux = CommandMux(lines=False)
+    mux.add([sys.executable, '-c', 'print("a" * 100000)'])
+    assert b''.join(data for _, tag, data in mux if tag == 'stdout').strip() == b'a' * 100000
+
+
+def test_command_mux_async():
+    import asyncio
+    from minghu6.etc.cmd import CommandMux
+
+    async def collect(mux):
+        return [event async for event in mux]
+
+    mux = _commands(CommandMux())
+    _check_events(mux, asyncio.run(collect(mux)))
+
+
+def test_command_mux_cancel():
+    import time
+    from minghu6.etc.cmd import CommandMux
+
+    mux = CommandMux()
+    mux.add([sys.executable, '-c', 'import time; print("start", flush=True); time.sleep(10)'], key='k')
+    start = time.time()
+    events = iter(mux)
+    assert next(events) == ('k', 'stdout', b'start\n')
+    mux.cancel('k')
+    assert [tag for _, tag, _ in events] == ['exit']
+    assert time.time() - start < 5
+
+
+def test_command_runner():
+    from minghu6.etc.cmd import CommandRunner
+
+    lines = list(CommandRunner.run('"{0}" -c "for i in range(1000): print(i)"'.format(sys.executable)))
+    assert lines == [('stdout', str(i)) for i in range(1000)]
+
+
+
+def test_run_many():
+    from minghu6.etc.cmd import run_many, RunManyStat
+
+    # later commands finish first
+    cmds = [[sys.executable, '-c', 'import time, sys; time.sleep({0}); print({1}); sys.exit({1} % 2)'.format(
+        (5 - i) * .05, i)] for i in range(5)]
+
+    stat = RunManyStat()
+    results = list(run_many(cmds, jobs=5, ordered=True, stat=stat))
+    assert [result.index for result in results] == list(range(5))
+    assert [result.stdout.strip() for result in results] == [b'0', b'1', b'2', b'3', b'4']
+    assert [result.returncode for result in results] == [0, 1, 0, 1, 0]
+    assert stat.total == 5 and len(stat.failed) == 2 and stat.returncode == 123
+
+    # completion order, which one comes first depends on the machine load
+    results = list(run_many(cmds, jobs=5))
+    assert sorted(result.index for result in results) == list(range(5))
+    assert sorted(result.stdout.strip() for result in results) == [b'0', b'1', b'2', b'3', b'4']
+
+    # output beyond spill_size goes to a temp file, still read back whole
+    big = [sys.executable, '-c', 'import sys; sys.stdout.write("x" * 100000)']
+    result, = run_many([big], spill_size=1000)
+    assert result.stdout == b'x' * 100000
+    assert result.decode()[0] == ['x' * 100000]
+    result.close()
+
+
+if __name__ == '__main__':
+    test_command_mux()
+    test_command_mux_async()
+    test_command_mux_cancel()
+    test_command_runner()
+    test_run_many()
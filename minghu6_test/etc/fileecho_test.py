@@ -0,0 +1,54 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import os
+import tempfile
+
+
+def test_charset_cache():
+    from minghu6.etc import fileecho
+    from minghu6.etc.fileecho import CharsetCache
+
+    with tempfile.TemporaryDirectory() as root:
+        cache = CharsetCache(path=os.path.join(root, 'charset.db'))
+        old_cache, fileecho.charset_cache = fileecho.charset_cache, cache
+        try:
+            fn = os.path.join(root, 'a.txt')
+            with open(fn, 'wb') as f:
+                f.write('中文内容\n第二行\n'.encode('utf-8'))
+
+            with open(fn, 'rb') as f:
+                result = fileecho.guess_charset(f)
+            with open(fn, 'rb') as f:
+                assert fileecho.guess_charset(f) == result
+            assert cache.stat() == {'hits': 1, 'misses': 1}
+
+            # persisted: a fresh memo layer still hits the table
+            cache._memo.clear()
+            changes = cache._conn.total_changes
+            with open(fn, 'rb') as f:
+                assert fileecho.guess_charset(f) == result
+            assert cache.hits == 2
+            assert cache._conn.total_changes == changes  # fresh atime isn't written back
+
+            # modified file is a miss
+            with open(fn, 'ab') as f:
+                f.write(b'abc\n')
+            with open(fn, 'rb') as f:
+                fileecho.guess_charset(f)
+            assert cache.misses == 2
+
+            with open(fn, 'rb') as f:
+                fileecho.guess_charset(f, use_cache=False)
+            assert cache.stat() == {'hits': 2, 'misses': 2}
+        finally:
+            fileecho.charset_cache = old_cache
+            if cache._conn is not None:
+                cache._conn.close()
+
+
+if __name__ == '__main__':
+    test_charset_cache()
@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import os
+import tempfile
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _age_dirs(root):
+    """dir mtimes well in the past, so the index trusts them"""
+    old = os.stat(root).st_mtime - 3600
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (old, old))
+
+
+def test_fs_index():
+    from minghu6.etc.fsindex import FsIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'tree')
+        _write(os.path.join(root, 'a.py'), 'a\n\nb\n')
+        _write(os.path.join(root, 'big.txt'), 'x' * 1000)
+        _write(os.path.join(root, 'src', 'c.py'), 'c\n')
+        _write(os.path.join(root, 'build', 'd.py'), 'd\n' * 10)
+        _age_dirs(root)
+
+        index = FsIndex(os.path.join(tmp, 'index.db'))
+        assert index.update(root) == (3, 3)
+        assert index.update(root) == (3, 0)  # nothing changed, nothing listed
+
+        rel = lambda paths: sorted(os.path.relpath(path, root) for path in paths)
+        assert rel(index.paths(root, '*.py')) == ['a.py', os.path.join('build', 'd.py'), os.path.join('src', 'c.py')]
+        assert rel(index.paths(root, '*.py', exclude_dirs='build', dirs=True)) == ['a.py', os.path.join('src', 'c.py')]
+        assert [entry.name for entry in index.largest(root, 2)] == ['big.txt', 'd.py']
+        assert index.count_lines(root, ['.py']) == {'.py': 14}
+        assert index.count_lines(root, ['.py'], ignore_blank=True) == {'.py': 13}
+
+        # add, remove, rewrite in place
+        _write(os.path.join(root, 'src', 'e.py'), 'e\n')
+        os.remove(os.path.join(root, 'build', 'd.py'))
+        os.rmdir(os.path.join(root, 'build'))
+        _write(os.path.join(root, 'a.py'), 'a\n')
+        _age_dirs(root)
+
+        assert index.update(root) == (2, 2)  # root and src
+        assert rel(index.paths(root, '*.py')) == ['a.py', os.path.join('src', 'c.py'), os.path.join('src', 'e.py')]
+        assert index.count_lines(root) == {'.py': 3, '.txt': 1}
+
+        # a file grown in place, its dir mtime unchanged
+        with open(os.path.join(root, 'src', 'c.py'), 'a') as f:
+            f.write('c' * 2000)
+        assert index.update(root) == (2, 0)
+        assert [entry.name for entry in index.largest(root, 1)] == ['c.py']
+
+
+def test_unreadable_dir():
+    import stat
+    from minghu6.etc import fsindex
+    from minghu6.etc.fsindex import FsIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'tree')
+        locked = os.path.join(root, 'locked')
+        _write(os.path.join(root, 'a.py'), 'a\n')
+        _write(os.path.join(locked, 'b.py'), 'b\n')
+        _age_dirs(root)
+
+        index = FsIndex(os.path.join(tmp, 'index.db'))
+        rel = lambda paths: sorted(os.path.relpath(path, root) for path in paths)
+
+        # root (or Windows) can list it anyway: fail the listing by hand then
+        real_scandir = os.scandir
+
+        def scandir(path):
+            if os.path.abspath(path) == locked and os.access(locked, os.R_OK):
+                raise PermissionError(13, 'Permission denied', path)
+            return real_scandir(path)
+
+        fsindex.os.scandir = scandir
+        os.chmod(locked, 0)
+        try:
+            assert rel(index.paths(root, dirs=True)) == ['a.py', 'locked']
+            assert rel(index.paths(root, dirs=True)) == ['a.py', 'locked']
+        finally:
+            os.chmod(locked, stat.S_IRWXU)
+            fsindex.os.scandir = real_scandir
+
+        # readable again, listed though its mtime (chmod doesn't touch it) is the same
+        assert rel(index.paths(root, dirs=True)) == ['a.py', 'locked', os.path.join('locked', 'b.py')]
+        assert index.update(root) == (2, 0)
+
+
+def test_indexed_tools():
+    from minghu6.etc import fsindex
+    from minghu6.etc.find import findlist
+    from minghu6.etc.grep import walk_files
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, 'tree')
+        _write(os.path.join(root, 'a.py'), 'a\n')
+        _write(os.path.join(root, 'sub', 'b.py'), 'b\n')
+
+        old_index = fsindex.fs_index
+        fsindex.fs_index = fsindex.FsIndex(os.path.join(tmp, 'index.db'))
+        try:
+            assert findlist('*', root, dosort=True, indexed=True) == findlist('*', root, dosort=True)
+            assert sorted(walk_files(['*.py'], root, indexed=True)) == sorted(walk_files(['*.py'], root))
+        finally:
+            fsindex.fs_index = old_index
+
+
+if __name__ == '__main__':
+    test_fs_index()
+    test_unreadable_dir()
+    test_indexed_tools()
@@ -0,0 +1,108 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import os
+import tempfile
+
+
+def _make_tree(root):
+    with open(os.path.join(root, 'a.txt'), 'wb') as f:
+        f.write(b'hello world\nfoo bar\nhello\n')
+
+    os.mkdir(os.path.join(root, 'sub'))
+    with open(os.path.join(root, 'sub', 'b.txt'), 'wb') as f:
+        f.write('第一行\nfoo hello\n'.encode('utf-8'))
+
+    open(os.path.join(root, 'empty.txt'), 'wb').close()
+
+
+def test_grep():
+    from minghu6.etc.grep import GrepStat
+    from minghu6.etc.shell_tools import grep
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+
+        stat = GrepStat()
+        result = sorted((r.path, r.line, r.content)
+                        for r in grep('hello', ['*.txt'], startdir=root, stat=stat))
+        assert result == [('a.txt', 1, 'hello world\n'),
+                          ('a.txt', 3, 'hello\n'),
+                          ('b.txt', 2, 'foo hello\n')], result
+        assert stat.files == 3
+
+        # a match spanning lines in the buffer must not be reported
+        assert list(grep(r'bar\s+hello', ['a.txt'], startdir=root)) == []
+
+
+def test_grep_non_ascii():
+    from minghu6.etc.shell_tools import grep
+
+    with tempfile.TemporaryDirectory() as root:
+        # long enough for the charset to be detected as utf-8
+        with open(os.path.join(root, 'c.txt'), 'wb') as f:
+            f.write('第一行\n中文内容的第二行，用来识别编码\nfoo hello\n'.encode('utf-8'))
+
+        # \w, . and classes are unicode aware on text, as line by line search is
+        assert [(r.path, r.line) for r in grep(r'^\w+$', ['c.txt'], startdir=root)] == [('c.txt', 1)]
+        assert [r.line for r in grep(r'^第.行', ['c.txt'], startdir=root)] == [1]
+        assert [r.line for r in grep(r'[，]', ['c.txt'], startdir=root)] == [2]
+        assert [r.line for r in grep(r'(?i)FOO H', ['c.txt'], startdir=root)] == [3]
+
+
+def test_grep_line_breaks():
+    from minghu6.etc.shell_tools import grep
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'd.txt'), 'wb') as f:
+            f.write('第一行\r\n中文\x0c内容的第二行，用来识别编码\rhello\nfoo hello'.encode('utf-8'))
+
+        # only '\n' ends a line, for both the raw buffer and the decoded text search
+        expected = [('d.txt', 2, '中文\x0c内容的第二行，用来识别编码\rhello\n'), ('d.txt', 3, 'foo hello')]
+        for pattern in ('hello', r'\w+ hello|\rhello'):
+            assert sorted((r.path, r.line, r.content) for r in grep(pattern, ['d.txt'], startdir=root)) == \
+                   expected, pattern
+
+
+def test_grep_jobs():
+    from minghu6.etc.shell_tools import grep
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+
+        serial = list(grep('^foo', ['*.txt'], startdir=root))
+        parallel = list(grep('^foo', ['*.txt'], startdir=root, jobs=2))
+        assert serial == parallel
+        assert [r.line for r in serial] == [2, 2]
+
+
+def test_grep_jobs_metrics():
+    from minghu6.algs.metrics import registry
+    from minghu6.etc.grep import grep_files
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        paths = [os.path.join(root, 'a.txt'), os.path.join(root, 'sub', 'b.txt')] * 3
+
+        enabled = registry.enabled
+        registry.enabled = True
+        registry.drain()
+        try:
+            list(grep_files('^foo', paths, jobs=2))
+            data = registry.to_dict()
+        finally:
+            registry.enabled = enabled
+            registry.drain()
+
+        assert data['grep.grep_file']['wall']['count'] == 6  # recorded in the workers
+
+
+if __name__ == '__main__':
+    test_grep()
+    test_grep_non_ascii()
+    test_grep_line_breaks()
+    test_grep_jobs()
+    test_grep_jobs_metrics()
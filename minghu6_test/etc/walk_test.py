@@ -0,0 +1,74 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import os
+import tempfile
+
+
+def _make_tree(root, names):
+    for name in names:
+        path = os.path.join(root, *name.split('/'))
+        if name.endswith('/'):
+            os.makedirs(path, exist_ok=True)
+            continue
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(name)
+
+
+def _relpaths(root, paths):
+    return sorted(os.path.relpath(path, root).replace(os.sep, '/') for path in paths)
+
+
+def test_walk():
+    from minghu6.etc.walk import walk_paths
+    from minghu6.etc.find import findlist
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, ['a.py', 'b.txt', 'src/c.py', 'src/d.PY', 'src/test_e.py',
+                          'node_modules/f.py', 'node_modules/g/h.py', 'empty.py/'])
+
+        assert _relpaths(root, walk_paths(root, '*.py')) == \
+               ['a.py', 'node_modules/f.py', 'node_modules/g/h.py', 'src/c.py', 'src/test_e.py']
+        assert _relpaths(root, walk_paths(root, ['*.py', '*.txt'], exclude_dirs='node_*', dirs=True)) == \
+               ['a.py', 'b.txt', 'empty.py', 'src/c.py', 'src/test_e.py']
+        assert _relpaths(root, walk_paths(root, r'test_\w+\.py', regex=True)) == ['src/test_e.py']
+        # each regex keeps its inline flags and groups
+        assert _relpaths(root, walk_paths(root, [r'(?i)D\.py', r'(\w)\1\.py'], regex=True)) == ['src/d.PY']
+        assert _relpaths(root, walk_paths(root, [r'(?P<n>a)\.py', r'(?P<n>b)\.txt'], regex=True)) == \
+               ['a.py', 'b.txt']
+        assert _relpaths(root, walk_paths(root, '*.py', threads=4)) == _relpaths(root, walk_paths(root, '*.py'))
+
+        # etc.find matches dirs too, as before
+        assert _relpaths(root, findlist(['src', 'g'], root)) == ['node_modules/g', 'src']
+
+
+def test_gitignore():
+    from minghu6.etc.walk import walk_paths, GitIgnore
+
+    ignore = GitIgnore(['# comment', '*.log', '!keep.log', 'build/', '/top.txt', 'docs/**/*.tmp'])
+    assert ignore.ignored('a/b.log', False)
+    assert not ignore.ignored('keep.log', False)
+    assert ignore.ignored('src/build', True) and not ignore.ignored('src/build', False)
+    assert ignore.ignored('top.txt', False) and not ignore.ignored('src/top.txt', False)
+    assert ignore.ignored('docs/x/y/z.tmp', False) and ignore.ignored('docs/z.tmp', False)
+
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root, ['.gitignore', 'a.log', 'keep.log', 'build/x.py', 'src/build/y.py', 'src/ok.py',
+                          'src/sub/.gitignore', 'src/sub/a.py', 'src/sub/keep.py', '.git/config'])
+        with open(os.path.join(root, '.gitignore'), 'w') as f:
+            f.write('*.log\n!keep.log\nbuild/\n')
+        with open(os.path.join(root, 'src', 'sub', '.gitignore'), 'w') as f:
+            f.write('*.py\n!keep.py\n')
+
+        assert _relpaths(root, walk_paths(root, gitignore=True)) == \
+               ['.gitignore', 'keep.log', 'src/ok.py', 'src/sub/.gitignore', 'src/sub/keep.py']
+
+
+if __name__ == '__main__':
+    test_walk()
+    test_gitignore()
@@ -0,0 +1,81 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+
+
+def test_engines():
+    import numpy as np
+    from minghu6.graphic.draw_mandelbrot import (mandelbrot_tile, mandelbrot_array,
+                                                 mandelbrot_array_pool, escape_time)
+
+    N, cx, cy, d = 50, -0.5, 0.1, 1.5
+    whole = mandelbrot_tile(cx - d, cx + d, cy - d, cy + d, N, N, C=None, iter_num=50)
+
+    tiled, extent = mandelbrot_array(C=None, N=N, cx=cx, cy=cy, d=d, iter_num=50, tile_size=16)
+    assert extent == [cx - d, cx + d, cy + d, cy - d]
+    pool, _ = mandelbrot_array_pool(C=None, N=N, cx=cx, cy=cy, d=d, iter_num=50, tile_size=16, jobs=2)
+
+    assert tiled.shape == pool.shape == (N, N)
+    assert np.allclose(tiled, whole) and np.array_equal(tiled, pool)
+
+    # 0 never escapes, 2 escapes at once
+    assert escape_time(np.array([0j, 2 + 0j]), C=None, iter_num=50)[0] == 50
+    assert escape_time(np.array([0j, 2 + 0j]), C=None, iter_num=50)[1] < 2
+
+
+def test_tile_cache():
+    import numpy as np
+    from minghu6.graphic.draw_mandelbrot import TileCache
+
+    tile = np.zeros((8, 8))  # 512 bytes
+    cache = TileCache(maxbytes=3 * tile.nbytes)
+    for key in 'abc':
+        cache.put(key, tile.copy())
+    assert cache.get('a') is not None  # a is the most recent now
+    cache.put('d', tile.copy())
+
+    assert len(cache) == 3 and cache.nbytes == 3 * tile.nbytes
+    assert cache.get('b') is None and cache.get('c') is not None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.put('c', np.zeros((4, 4)))  # replaced, size updated
+    assert cache.nbytes == 2 * tile.nbytes + 128
+
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_cached_render():
+    import numpy as np
+    from minghu6.graphic.draw_mandelbrot import (TileCache, mandelbrot_array_cached, mandelbrot_tile,
+                                                 render_progressive)
+
+    cache = TileCache()
+    kwargs = dict(C=None, N=100, iter_num=30, tile_size=32, cache=cache)
+    first, extent = mandelbrot_array_cached(cx=-0.5, cy=0, d=1.5, **kwargs)
+    x0, x1, y1, y0 = extent
+    assert np.allclose(first, mandelbrot_tile(x0, x1, y0, y1, first.shape[1], first.shape[0],
+                                              C=None, iter_num=30))
+
+    # a small pan reuses every tile, so does zooming in and back out
+    misses = cache.misses
+    mandelbrot_array_cached(cx=-0.45, cy=0.05, d=1.5, **kwargs)
+    assert cache.misses == misses
+    mandelbrot_array_cached(cx=-0.5, cy=0, d=0.75, **kwargs)
+    misses = cache.misses
+    again, _ = mandelbrot_array_cached(cx=-0.5, cy=0, d=1.5, **kwargs)
+    assert cache.misses == misses and np.array_equal(again, first)
+
+    # coarse first, then the full resolution
+    shapes = [image.shape for image, _ in render_progressive(C=None, N=100, cx=-0.5, cy=0, d=1.5,
+                                                             iter_num=30, cache=cache)]
+    assert len(shapes) == 2 and shapes[0][0] < shapes[1][0]
+
+
+if __name__ == '__main__':
+    test_engines()
+    test_tile_cache()
+    test_cached_render()
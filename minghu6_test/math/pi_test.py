@@ -0,0 +1,66 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+
+
+def test_monte_carlo():
+    import math
+    from minghu6.math.pi import monte_carlo
+
+    assert abs(monte_carlo(10 ** 5, seed=0) - math.pi) < 0.05
+    assert monte_carlo(10 ** 4, seed=1, chunk_size=1000) == monte_carlo(10 ** 4, seed=1, chunk_size=1000)
+    assert abs(monte_carlo(10 ** 4, seed=1, jobs=2) - math.pi) < 0.1
+
+
+def test_integrate():
+    import math
+    from minghu6.math.pi import trapezoid, simpson, using_trapezoidal
+
+    assert abs(trapezoid(1000, chunk_size=7) - trapezoid(1000)) < 1e-12
+    assert abs(using_trapezoidal(10 ** 4) - math.pi) < 1e-5
+    assert abs(simpson(1000, 'arctan') - math.pi) < 1e-12
+    assert abs(simpson(999, 'arctan', chunk_size=10) - math.pi) < 1e-12
+
+
+def test_pi_digits():
+    from minghu6.math import pi
+    from minghu6.math.pi import pi_digits
+
+    assert ''.join(pi_digits(0)) == '3'
+    assert list(pi_digits(20, block_size=8)) == ['31415926', '53589793', '23846']
+
+    digits = ''.join(pi_digits(3000, block_size=97))
+    assert len(digits) == 3001
+    assert digits[995:1001] == '201989'  # the 995th..1000th decimals
+
+    # 3000 digits is ~212 terms, under the cut-off of the process pool split
+    old_min_terms, pi._PARALLEL_MIN_TERMS = pi._PARALLEL_MIN_TERMS, 16
+    try:
+        assert ''.join(pi_digits(3000, jobs=2)) == digits
+        assert ''.join(pi_digits(3000, jobs=3)) == digits
+    finally:
+        pi._PARALLEL_MIN_TERMS = old_min_terms
+
+
+def test_bbp_hex_digits():
+    from minghu6.math.pi import bbp_hex_digits, pi_digits
+
+    assert bbp_hex_digits(1) == '243F6A88'
+    assert bbp_hex_digits(9, 6) == '85A308'
+
+    # spot check the decimal digits against the hex ones
+    n = 1500
+    x = int(''.join(pi_digits(n)))
+    for position in (1, 300, 1001):
+        hex_digits = x * 16 ** (position + 7) // 10 ** n % 16 ** 8
+        assert '{0:08X}'.format(hex_digits) == bbp_hex_digits(position)
+
+
+if __name__ == '__main__':
+    test_monte_carlo()
+    test_integrate()
+    test_pi_digits()
+    test_bbp_hex_digits()
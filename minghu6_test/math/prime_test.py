@@ -11,5 +11,31 @@ def test_gcd():
     assert gcd(1920, 1080) == 120
 
 
+def test_primes_up_to():
+    from minghu6.math.prime import primes_up_to, primes_in_range
+
+    assert list(primes_up_to(30)) == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    assert list(primes_up_to(1)) == []
+    # small segment, crosses many segment borders
+    assert list(primes_up_to(10000, segment_size=97)) == list(primes_up_to(10000))
+    assert list(primes_in_range(1000000, 1000100)) == [1000003, 1000033, 1000037, 1000039,
+                                                       1000081, 1000099]
+
+
+def test_isprime_many():
+    from minghu6.math.prime import isprime_many, isprime, primes_up_to
+
+    primes = set(primes_up_to(100000))
+    assert isprime_many(range(100000)) == [i in primes for i in range(100000)]
+    # 3215031751 is a strong pseudoprime to bases 2, 3, 5, 7
+    assert isprime_many([2 ** 61 - 1, 2 ** 64 - 59, 2 ** 64 - 1, 3215031751]) == [True, True, False, False]
+    assert isprime(2 ** 89 - 1)
+    # strong pseudoprime to bases 2..37, 399165290221 * 798330580441
+    assert not isprime(318665857834031151167461)
+
+
+
 if __name__ == '__main__':
     test_gcd()
+    test_primes_up_to()
+    test_isprime_many()
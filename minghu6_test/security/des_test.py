@@ -0,0 +1,70 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import io
+
+
+def test_known_answer():
+    from minghu6.security.des import fastdes
+
+    # FIPS 46 worked example and the NBS "Now is t" vector
+    assert fastdes.encrypt_block(0x0123456789ABCDEF, bytes.fromhex('133457799BBCDFF1')) == 0x85E813540F0AB405
+    assert fastdes.decrypt_block(0x85E813540F0AB405, bytes.fromhex('133457799BBCDFF1')) == 0x0123456789ABCDEF
+
+    key = bytes.fromhex('0123456789ABCDEF')
+    assert fastdes.encrypt(b'Now is t', key, 'ecb', padding=False) == bytes.fromhex('3FA40E8A984D4815')
+
+    # FIPS 81 CBC example
+    plain = b'Now is the time for all '
+    cipher = bytes.fromhex('E5C7CDDE872BF27C43E934008C389C0F683788499A7C05F6')
+    iv = bytes.fromhex('1234567890ABCDEF')
+    assert fastdes.encrypt(plain, key, 'cbc', iv=iv, padding=False) == cipher
+    assert fastdes.decrypt(cipher, key, 'cbc', iv=iv, padding=False) == plain
+
+
+def test_legacy_str():
+    from minghu6.security.des import des
+
+    key = des.valid_key('pwd')
+    for text in ['', 'abc', 'Hello, world', '明文 and ascii \u0000￿']:
+        cipher = des.encryp_str(text, key)
+        assert cipher == des._encryp_str_bitlist(text, key)
+        assert des.decryp_str(cipher, key) == des._decryp_str_bitlist(cipher, key)
+        assert des.decryp_str(cipher, key).rstrip(' ') == text.rstrip(' ')
+
+
+def test_stream():
+    from minghu6.security.des import fastdes
+
+    key = fastdes.valid_key('password')
+    for size in (0, 1, 7, 8, 9, 23, 1000):
+        data = bytes(range(256)) * 4
+        data = data[:size]
+        for mode in ('ecb', 'cbc'):
+            iv = b'\x01' * 8 if mode == 'cbc' else None
+            expected = fastdes.encrypt(data, key, mode, iv=iv)
+
+            for chunk_size in (1, 8, 13, 64 * 1024):
+                src, dst = io.BytesIO(data), io.BytesIO()
+                fastdes.encrypt_stream(src, dst, key, mode, chunk_size=chunk_size, iv=iv)
+                assert dst.getvalue() == expected, (size, mode, chunk_size)
+
+                src, out = io.BytesIO(dst.getvalue()), io.BytesIO()
+                fastdes.decrypt_stream(src, out, key, mode, chunk_size=chunk_size, iv=iv)
+                assert out.getvalue() == data, (size, mode, chunk_size)
+
+        # random iv written first
+        src, dst, out = io.BytesIO(data), io.BytesIO(), io.BytesIO()
+        fastdes.encrypt_stream(src, dst, key, chunk_size=5)
+        assert fastdes.decrypt(dst.getvalue(), key) == data
+        fastdes.decrypt_stream(io.BytesIO(dst.getvalue()), out, key, chunk_size=3)
+        assert out.getvalue() == data
+
+
+if __name__ == '__main__':
+    test_known_answer()
+    test_legacy_str()
+    test_stream()
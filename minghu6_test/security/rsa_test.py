@@ -0,0 +1,89 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import random
+
+
+def test_is_probable_prime():
+    from minghu6.math.prime import primes_up_to
+    from minghu6.security.rsa.rsa import is_probable_prime
+
+    primes = set(primes_up_to(5000))
+    assert [n for n in range(5000) if is_probable_prime(n)] == sorted(primes)
+    # Carmichael numbers and a strong pseudoprime to bases 2, 3, 5, 7
+    assert not any(is_probable_prime(n) for n in (561, 41041, 825265, 3215031751))
+    assert is_probable_prime(2 ** 127 - 1) and not is_probable_prime(2 ** 128 + 1)
+
+
+def test_generate_key():
+    from minghu6.security.rsa.rsa import generate_key, encryption, decryption, decryption_crt
+
+    key = generate_key(256)
+    assert key.n.bit_length() == 256 and key.p * key.q == key.n
+    assert key.e * key.d % ((key.p - 1) * (key.q - 1)) == 1
+
+    rng = random.Random(0)
+    for M in [0, 1, 2, key.n - 1] + [rng.randrange(key.n) for _ in range(20)]:
+        C = encryption(M, key.e, key.n)
+        assert C == pow(M, key.e, key.n)
+        assert decryption_crt(C, key) == decryption(C, key.d, key.n) == pow(C, key.d, key.n) == M
+
+
+def test_bytes():
+    from minghu6.security.rsa.rsa import generate_key, encrypt_bytes, decrypt_bytes
+
+    key = generate_key(128)
+    k = (key.n.bit_length() + 7) // 8
+    for data in [b'', b'\x00', b'\x00\x00abc', b'\x00' * 40, bytes(range(256)), b'\xff' * (k - 2)]:
+        cipher = encrypt_bytes(data, key.e, key.n)
+        assert len(cipher) % k == 0
+        assert decrypt_bytes(cipher, key.d, key.n) == data
+        assert decrypt_bytes(cipher, key, key.n) == data  # by CRT
+
+    try:
+        decrypt_bytes(b'\x00' * (k + 1), key.d, key.n)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_many():
+    from minghu6.security.rsa.rsa import generate_key, encrypt_many, decrypt_many, encryp_str
+
+    key = generate_key(128)
+    messages = ['Hello, 明文', '', b'\x00bytes', b'']
+    for jobs in (None, 2):
+        ciphers = encrypt_many(messages, key.e, key.n, jobs=jobs)
+        assert [type(c) for c in ciphers] == [str, str, bytes, bytes]
+        assert decrypt_many(ciphers, key, key.n, jobs=jobs) == messages
+        assert decrypt_many(ciphers, key.d, key.n, jobs=jobs) == messages
+
+    assert decrypt_many([encryp_str('abc', key.e, key.n)], key.d, key.n) == ['abc']
+
+
+def test_small_modulus():
+    from minghu6.security.rsa.rsa import key_generation, encryp_str, decryp_str, encrypt_bytes
+
+    n, e, d = key_generation(pq_pair=(47, 59))  # 12 bits, too small for block mode
+    C = encryp_str('Hello', e, n)
+    assert C.startswith('0x')  # the old per char format
+    assert decryp_str(C, d, n) == 'Hello'
+
+    try:
+        encrypt_bytes(b'abc', e, n)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+if __name__ == '__main__':
+    test_is_probable_prime()
+    test_generate_key()
+    test_bytes()
+    test_many()
+    test_small_modulus()
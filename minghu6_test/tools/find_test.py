@@ -0,0 +1,27 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import subprocess
+
+
+def test_handle_exec():
+    from minghu6.tools.find import handle_exec_string, handle_exec_batch
+
+    names = ['a"b.txt', '$HOME.txt', '`id`.txt', "it's.txt"]
+    assert handle_exec_string('echo {}', 'plain.txt') == 'echo plain.txt'
+    assert handle_exec_batch('echo', ['a.txt', 'b c.txt']) == "echo a.txt 'b c.txt'"
+
+    # no expansion, the shell sees the names as they are
+    for name in names:
+        out = subprocess.check_output(handle_exec_string('printf %s {}', name), shell=True)
+        assert out.decode() == name
+
+    out = subprocess.check_output(handle_exec_batch('printf "%s\\n" {}', names), shell=True)
+    assert out.decode().splitlines() == names
+
+
+if __name__ == '__main__':
+    test_handle_exec()
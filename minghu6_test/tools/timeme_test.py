@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+# !/usr/bin/env python3
+
+"""
+
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+
+
+def _py(code):
+    return '"{0}" -c "{1}"'.format(sys.executable, code)
+
+
+def test_benchmark_command():
+    from minghu6.tools.timeme import benchmark_command
+
+    result = benchmark_command(_py('import sys; sys.exit(3)'), runs=3, warmup=1)
+    assert result['runs'] == 3 and len(result['times']) == 3
+    assert result['exit_codes'] == [3, 3, 3]
+    assert result['min'] <= result['median'] <= result['max']
+    assert result['min'] <= result['mean'] <= result['max']
+
+    if hasattr(os, 'wait4'):
+        assert result['user'] is not None and result['max_rss_kb'] > 0
+
+        # the shell itself killed by a signal
+        killed = benchmark_command('kill -TERM $$', runs=1)
+        assert killed['exit_codes'] == [-15] and killed['stddev'] == 0.0
+
+    try:
+        benchmark_command('true', runs=0)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_compare():
+    from minghu6.tools.timeme import compare
+
+    results = [{'mean': 2.0, 'stddev': 0.2}, {'mean': 1.0, 'stddev': 0.0}, {'mean': 3.0, 'stddev': 0.0}]
+    fastest, ratios = compare(results)
+    assert fastest == 1
+    assert ratios[1] == (1.0, 0.0) and ratios[2] == (3.0, 0.0)
+    assert ratios[0][0] == 2.0 and abs(ratios[0][1] - 0.2) < 1e-12
+
+
+def test_export():
+    from minghu6.tools.timeme import export_json, export_csv, CSV_FIELDS
+
+    results = [{'command': 'a', 'runs': 2, 'mean': 1.5, 'stddev': 0.5, 'median': 1.5, 'min': 1.0,
+                'max': 2.0, 'user': None, 'system': None, 'max_rss_kb': None,
+                'times': [1.0, 2.0], 'exit_codes': [0, 0]}]
+
+    with tempfile.TemporaryDirectory() as root:
+        json_path, csv_path = os.path.join(root, 'a.json'), os.path.join(root, 'a.csv')
+        export_json(results, json_path)
+        export_csv(results, csv_path)
+
+        with open(json_path) as f:
+            assert json.load(f) == {'results': results}
+
+        with open(csv_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert list(rows[0]) == CSV_FIELDS  # times and exit_codes are left out
+        assert rows[0]['command'] == 'a' and float(rows[0]['mean']) == 1.5 and rows[0]['user'] == ''
+
+
+if __name__ == '__main__':
+    test_benchmark_command()
+    test_compare()
+    test_export()
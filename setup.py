@@ -57,6 +57,7 @@ setup(
                             'text-py=minghu6.tools.text:cli',
                             'find_max-py=minghu6.tools.find_max:cli',
                             'find-py=minghu6.tools.find:cli',
+                            'grep-py=minghu6.tools.grep:cli',
                             'timeme=minghu6.tools.timeme:cli',
                             'daemon=minghu6.tools.daemon:cli',
                             'auto-resume=minghu6.tools.auto_resume:cli'